@@ -0,0 +1,140 @@
+import os
+import time
+import argparse
+import statistics
+import tempfile
+import torch
+from GenerateTrinketImage import TrinketImageGenerator
+
+BENCHMARK_NAMES = ["Echopearl", "Ashen Reliquary", "Drowned Bell", "Heretic's Censer", "Gilded Maw"]
+
+class ImageBenchmark:
+    """
+    A class for measuring the latency of the generate_image path.
+
+    The generator runs with the configured image settings, optionally
+    overridden from the command line, and saves its icons to a temporary
+    folder so the mod output is left untouched. Each thread count in the
+    sweep reuses the same loaded pipeline.
+    """
+
+    def __init__(self, config_path, overrides, save_dir):
+        """
+        Initialize the ImageBenchmark.
+
+        Args:
+            config_path (str): Path to the configuration file.
+            overrides (dict): Image settings that replace the configured ones.
+            save_dir (str): Folder the generated icons are written to.
+        """
+        self.generator = TrinketImageGenerator(config_path)
+        cpu_overrides = overrides.pop('cpu', {})
+        candidate_overrides = overrides.pop('candidates', {})
+        self.generator.image_settings.update(overrides)
+        self.generator.image_settings.setdefault('cpu', {}).update(cpu_overrides)
+        self.generator.image_settings.setdefault('candidates', {}).update(candidate_overrides)
+        self.generator.device = self.generator._resolve_device(self.generator.image_settings.get('device', 'auto'))
+        self.generator.save_dir = save_dir
+
+    def load(self):
+        """
+        Load the pipeline.
+
+        Returns:
+            float: The load time in seconds.
+        """
+        start = time.perf_counter()
+        self.generator._initialize_pipeline()
+        return time.perf_counter() - start
+
+    def run(self, num_images, warmup=1, num_threads=None):
+        """
+        Generate icons and time every call to generate_image, including writing the icon.
+
+        Args:
+            num_images (int): Number of timed icons.
+            warmup (int): Untimed icons generated first, e.g. to trigger compilation.
+            num_threads (int): Torch CPU threads for this run, or None to keep the current count.
+
+        Returns:
+            dict: Latency statistics of the run.
+        """
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        for i in range(warmup):
+            self.generator.generate_image(BENCHMARK_NAMES[i % len(BENCHMARK_NAMES)])
+        self.generator.icon_writer.flush()
+
+        latencies = []
+        for i in range(num_images):
+            start = time.perf_counter()
+            self.generator.generate_image(BENCHMARK_NAMES[i % len(BENCHMARK_NAMES)])
+            # generate_image only queues the PNG write, so wait for it to count the encode as well
+            self.generator.icon_writer.flush()
+            latencies.append(time.perf_counter() - start)
+
+        latencies.sort()
+        return {
+            'threads': torch.get_num_threads(),
+            'images': num_images,
+            'mean_s': statistics.mean(latencies),
+            'p50_s': statistics.median(latencies),
+            'p95_s': latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+            'images_per_min': 60 * num_images / sum(latencies),
+        }
+
+def print_report(generator, load_s, results):
+    """
+    Print the latency of every benchmark run.
+
+    Args:
+        generator (TrinketImageGenerator): The benchmarked generator.
+        load_s (float): Pipeline load time in seconds.
+        results (list): Statistics dictionaries returned by ImageBenchmark.run.
+    """
+    settings = generator.image_settings
+    print(f"Device {generator.device}, dtype {str(generator.pipe.dtype).replace('torch.', '')}, "
+          f"{settings.get('num_inference_steps', 30)} steps at {settings.get('width', 512)}x{settings.get('height', 768)}, "
+          f"{settings.get('candidates', {}).get('count', 1)} candidates per icon, "
+          f"pipeline loaded in {load_s:.1f}s")
+    print(f"{'threads':>8}{'images':>8}{'mean (s)':>10}{'p50 (s)':>10}{'p95 (s)':>10}{'img/min':>9}")
+    for result in results:
+        print(f"{result['threads']:>8}{result['images']:>8}{result['mean_s']:>10.2f}{result['p50_s']:>10.2f}"
+              f"{result['p95_s']:>10.2f}{result['images_per_min']:>9.2f}")
+
+def main():
+    """
+    Main function to benchmark icon generation latency, e.g. on CPU-only nodes.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the latency of trinket icon generation")
+    parser.add_argument("-n", "--num_images", type=int, default=3, help="Number of timed icons per run (default: 3)")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed icons before each run (default: 1)")
+    parser.add_argument("--device", help="Override the configured device (auto, cuda, mps or cpu)")
+    parser.add_argument("--dtype", help="Override the configured dtype (auto, float32, bfloat16 or float16)")
+    parser.add_argument("--steps", type=int, help="Override the configured number of inference steps")
+    parser.add_argument("--threads", type=int, nargs="+", help="CPU thread counts to sweep, e.g. --threads 4 8 16")
+    parser.add_argument("--compile", action="store_true", help="Compile the UNet with torch.compile on CPU")
+    parser.add_argument("--candidates", type=int, help="Override the number of candidate seeds rendered per icon")
+    parser.add_argument("--png-baseline", action="store_true", help="Also encode every icon with default PNG settings and report the savings (adds to the timings)")
+    args = parser.parse_args()
+
+    overrides = {key: value for key, value in (
+        ('device', args.device), ('dtype', args.dtype), ('num_inference_steps', args.steps)) if value is not None}
+    if args.compile:
+        overrides['cpu'] = {'compile': True}
+    if args.candidates is not None:
+        overrides['candidates'] = {'count': args.candidates}
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as save_dir:
+        benchmark = ImageBenchmark(os.path.join(script_dir, 'config.json'), overrides, save_dir)
+        benchmark.generator.icon_writer.measure_baseline = args.png_baseline
+        load_s = benchmark.load()
+        results = [benchmark.run(args.num_images, args.warmup, threads) for threads in (args.threads or [None])]
+        # Every write must finish before the temporary folder is removed
+        benchmark.generator.icon_writer.close()
+        print_report(benchmark.generator, load_s, results)
+        benchmark.generator.icon_writer.print_stats()
+
+if __name__ == "__main__":
+    main()
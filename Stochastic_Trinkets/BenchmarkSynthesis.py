@@ -0,0 +1,454 @@
+import os
+import io
+import re
+import ast
+import json
+import time
+import copy
+import random
+import argparse
+import statistics
+import threading
+from collections import Counter, defaultdict
+from contextlib import redirect_stdout
+from GenerateTrinketProperties import TrinketDataLoader, AIModelManager, TrinketPropertyGenerator, TrinketFactory
+from OllamaTransport import EndpointPool
+
+class FakeOllamaEndpoint:
+    """
+    A stand-in for OllamaEndpoint that answers every trinket role without a server.
+
+    Replies are drawn from the real vocabularies, with a configurable share of
+    invalid replies per role. Token counts are estimated from the text length
+    and durations follow a simple load + prefill + decode latency model, so the
+    returned counters look like the ones Ollama reports; every call counts in
+    estimated_calls, since no tokenizer is involved. Every call also sleeps
+    for its simulated duration times time_scale, so concurrent calls overlap in
+    wall-clock time as they would on a server.
+    """
+
+    def __init__(self, data_loader, invalid_rates, load_ms=800, prefill_tps=1500, decode_tps=40, seed=0, time_scale=0.01):
+        """
+        Initialize the FakeOllamaEndpoint.
+
+        Args:
+            data_loader (TrinketDataLoader): Source of the vocabularies and effect bounds.
+            invalid_rates (dict): Probability of an invalid reply, per role name.
+            load_ms (float): Simulated model load time per call, in milliseconds.
+            prefill_tps (float): Simulated prompt evaluation speed, in tokens per second.
+            decode_tps (float): Simulated generation speed, in tokens per second.
+            seed (int): Seed for the reply generator.
+            time_scale (float): Fraction of the simulated duration every call sleeps for.
+        """
+        self.url = "fake://ollama"
+        self.healthy = True
+        self.in_flight = 0
+        self.completed = 0
+        self.last_health_check = 0.0
+        self.invalid_rates = invalid_rates
+        self.load_ms = load_ms
+        self.prefill_tps = prefill_tps
+        self.decode_tps = decode_tps
+        self.time_scale = time_scale
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._modelfiles = {}
+        self.estimated_calls = 0
+
+        self.hero_classes = data_loader.get_hero_classes()
+        self.rarities = data_loader.get_trinket_rarities()
+        self.effect_bounds = data_loader.get_effect_bounds()
+        self.words = sorted({word for trinket_id in data_loader.get_unique_ids() for word in trinket_id.split('_') if len(word) > 3})
+
+    def _track(self, delta):
+        with self._lock:
+            self.in_flight += delta
+
+    def check_health(self, timeout=2.0):
+        return True
+
+    def close(self):
+        pass
+
+    def create(self, model, modelfile, timeout=None, cancel_token=None):
+        self._modelfiles[model] = modelfile
+        return {'status': 'success'}
+
+    def chat(self, model, messages, options=None, keep_alive=None, timeout=None, cancel_token=None, on_chunk=None, format=None):
+        user_content = messages[-1]['content']
+        with self._lock:
+            invalid = self.random.random() < self.invalid_rates.get(model, 0.0)
+            content = getattr(self, f"_reply_{model[len('DD_trinket_'):]}")(user_content, invalid)
+
+        done = True
+        if on_chunk is not None:
+            # Feed the reply a few characters at a time, like a token stream
+            for end in range(3, len(content) + 3, 3):
+                if on_chunk(content[:end]):
+                    content, done = content[:end], False
+                    break
+
+        prompt_tokens = self._count_tokens(self._modelfiles.get(model, "")) + self._count_tokens(user_content)
+        eval_tokens = self._count_tokens(content)
+        prompt_ns = int(prompt_tokens / self.prefill_tps * 1e9)
+        eval_ns = int(eval_tokens / self.decode_tps * 1e9)
+        self.completed += 1
+        self.estimated_calls += 1
+        return self._simulate({
+            'message': {'role': 'assistant', 'content': content},
+            'done': done,
+            'prompt_eval_count': prompt_tokens,
+            'eval_count': eval_tokens,
+            'prompt_eval_duration': prompt_ns,
+            'eval_duration': eval_ns,
+            'total_duration': int(self.load_ms * 1e6) + prompt_ns + eval_ns,
+        })
+
+    def _simulate(self, response):
+        time.sleep(response.get('total_duration', 0) / 1e9 * self.time_scale)
+        return response
+
+    @staticmethod
+    def _count_tokens(text):
+        # Roughly four characters per token for English text on Llama tokenizers
+        return len(text) // 4 + 1
+
+    def _pick_name(self):
+        return " ".join(word.title() for word in self.random.sample(self.words, 2))
+
+    def _pick_stats(self):
+        return self.random.sample(sorted(self.effect_bounds), self.random.randint(1, 5))
+
+    def _reply_namer(self, user_content, invalid):
+        return self._pick_name()
+
+    def _reply_class_namer(self, user_content, invalid):
+        if invalid:
+            return f"The {self.random.choice(self.hero_classes)} would suit this trinket best."
+        return self.random.choice(self.hero_classes + ['every_class'])
+
+    def _reply_rarity_namer(self, user_content, invalid):
+        if invalid:
+            return "Rarity: legendary"
+        return self.random.choice(self.rarities)
+
+    def _reply_stat_namer(self, user_content, invalid):
+        stats = [f"{self.random.choice('+-')}{stat}" for stat in self._pick_stats()]
+        if invalid:
+            stats.append("+Luck")
+        return repr(stats)
+
+    def _reply_stat_tuner(self, user_content, invalid):
+        if invalid:
+            return "Here is the completed dictionary you asked for."
+        stats = ast.literal_eval(user_content[user_content.index('{'):user_content.index('}') + 1])
+        tuned = {}
+        for stat, sign in stats.items():
+            low, high = self.effect_bounds[stat]
+            if sign == '-' and low < 0:
+                tuned[stat] = f"{self.random.randint(low, -1)}"
+            else:
+                tuned[stat] = f"+{self.random.randint(max(1, low), high)}"
+        return repr(tuned)
+
+    def _reply_synthesizer(self, user_content, invalid):
+        modelfile = self._modelfiles.get('DD_trinket_synthesizer', "")
+        fixed_rarity = re.search(r"The rarity of the trinket is (\w+), write it exactly", modelfile)
+        stats = {}
+        for stat in self._pick_stats():
+            low, high = self.effect_bounds[stat]
+            stats[stat] = self.random.randint(low, high)
+        trinket = {
+            'name': self._pick_name(),
+            'class': self.random.choice(self.hero_classes + ['every_class']),
+            'rarity': fixed_rarity.group(1) if fixed_rarity else self.random.choice(self.rarities),
+            'stats': stats
+        }
+        if invalid:
+            # Overshoot the bound of one stat, the most common way a combined reply goes wrong
+            stat = next(iter(stats))
+            trinket['stats'][stat] = self.effect_bounds[stat][1] * 2
+        return json.dumps(trinket)
+
+class RecordedOllamaEndpoint(FakeOllamaEndpoint):
+    """
+    A stand-in for OllamaEndpoint that replays replies recorded from a real server.
+
+    The recording is a JSONL file with one chat response per line, tagged with
+    its role. Replies for each role are replayed in order and wrap around, and
+    sleep for their recorded duration times time_scale. If a prompt is longer
+    or shorter than when it was recorded, its prompt tokens and prefill time
+    are extrapolated from the recorded tokens per character rather than
+    tokenized, and the call counts in estimated_calls.
+    """
+
+    def __init__(self, recording_path, time_scale=0.01):
+        """
+        Initialize the RecordedOllamaEndpoint.
+
+        Args:
+            recording_path (str): Path of the JSONL recording.
+            time_scale (float): Fraction of the recorded duration every call sleeps for.
+        """
+        self.url = "recorded://ollama"
+        self.time_scale = time_scale
+        self.healthy = True
+        self.in_flight = 0
+        self.completed = 0
+        self.last_health_check = 0.0
+        self._lock = threading.Lock()
+        self._modelfiles = {}
+        self.estimated_calls = 0
+        self.recordings = defaultdict(list)
+        self.positions = Counter()
+        with open(recording_path, 'r') as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    self.recordings[record.pop('role')].append(record)
+
+    def chat(self, model, messages, options=None, keep_alive=None, timeout=None, cancel_token=None, on_chunk=None, format=None):
+        if not self.recordings[model]:
+            raise KeyError(f"No recorded replies for {model}")
+        with self._lock:
+            record = dict(self.recordings[model][self.positions[model] % len(self.recordings[model])])
+            self.positions[model] += 1
+        self.completed += 1
+
+        prompt_chars = record.pop('prompt_chars', 0)
+        chars = len(self._modelfiles.get(model, "")) + len(messages[-1]['content'])
+        if prompt_chars and chars != prompt_chars and record.get('prompt_eval_count'):
+            # The prompt differs from the recorded one, so estimate the prompt counters from
+            # the tokens per character and prefill speed the server showed for the recorded prompt
+            with self._lock:
+                self.estimated_calls += 1
+            recorded_tokens = record['prompt_eval_count']
+            recorded_ns = record.get('prompt_eval_duration', 0)
+            tokens = max(1, round(chars * recorded_tokens / prompt_chars))
+            prompt_ns = int(recorded_ns * tokens / recorded_tokens)
+            record['prompt_eval_count'] = tokens
+            record['prompt_eval_duration'] = prompt_ns
+            record['total_duration'] = record.get('total_duration', 0) + prompt_ns - recorded_ns
+        return self._simulate(record)
+
+class RecordingEndpointPool(EndpointPool):
+    """
+    An EndpointPool that appends every chat response it routes to a JSONL recording.
+    """
+
+    def __init__(self, endpoints, recording_path, health_check_interval=30.0):
+        super().__init__(endpoints, health_check_interval)
+        self.recording_path = recording_path
+        self._recording_lock = threading.Lock()
+        self._modelfiles = {}
+        for endpoint in endpoints:
+            endpoint.create = self._recorded_create(endpoint.create)
+            endpoint.chat = self._recorded(endpoint.chat)
+
+    def _recorded_create(self, create):
+        def recorded_create(model, modelfile, **kwargs):
+            self._modelfiles[model] = modelfile
+            return create(model, modelfile, **kwargs)
+        return recorded_create
+
+    def _recorded(self, chat):
+        def recorded_chat(model, messages, **kwargs):
+            response = chat(model, messages, **kwargs)
+            record = {key: value for key, value in response.items() if key in
+                      ('message', 'done', 'prompt_eval_count', 'eval_count', 'prompt_eval_duration', 'eval_duration', 'total_duration')}
+            # Lets a replay rescale the prompt counters when the prompts have changed since
+            record['prompt_chars'] = len(self._modelfiles.get(model, "")) + len(messages[-1]['content'])
+            with self._recording_lock, open(self.recording_path, 'a') as file:
+                file.write(json.dumps({'role': model, **record}) + "\n")
+            return response
+        return recorded_chat
+
+class SynthesisBenchmark:
+    """
+    A class for comparing the chained and combined trinket synthesis modes.
+
+    Both modes run the real TrinketFactory code against the same backend. The
+    per-trinket latency is wall-clock time, so concurrent hedged candidates are
+    counted once; the token counts are taken from the counters the backend
+    reports, and every finished trinket is checked against the vocabularies
+    and effect bounds.
+    """
+
+    def __init__(self, data_loader, endpoint_factory, time_scale=1.0):
+        """
+        Initialize the SynthesisBenchmark.
+
+        Args:
+            data_loader (TrinketDataLoader): The data loader for the configured mod resources.
+            endpoint_factory (callable): Creates a fresh EndpointPool for each mode.
+            time_scale (float): How much faster than real time the backend runs. Measured
+                latencies are divided by it, and hedging delays multiplied by it.
+        """
+        self.data_loader = data_loader
+        self.endpoint_factory = endpoint_factory
+        self.time_scale = time_scale
+
+    def run_mode(self, mode, num_trinkets, compact_prompts=None):
+        """
+        Generate trinkets in one synthesis mode and collect their statistics.
+
+        Args:
+            mode (str): 'chain' or 'combined'.
+            num_trinkets (int): Number of trinkets to generate.
+            compact_prompts (bool): Override the 'compact_prompts' setting, or None to keep it.
+
+        Returns:
+            dict: Latency, call, token and validity statistics of the run.
+        """
+        self.data_loader.config['trinket_settings']['synthesis_mode'] = mode
+        label = mode
+        if compact_prompts is not None:
+            self.data_loader.config['trinket_settings']['compact_prompts'] = compact_prompts
+            self.data_loader._prompt_tables.clear()
+            label = f"{mode}/{'compact' if compact_prompts else 'raw'}"
+        ai_manager = AIModelManager(self._scaled_settings())
+        ai_manager.endpoint_pool = self.endpoint_factory()
+        property_generator = TrinketPropertyGenerator(self.data_loader, ai_manager)
+        factory = TrinketFactory(self.data_loader, property_generator)
+
+        latencies, calls, prompt_tokens, prefill, eval_tokens, valid = [], [], [], [], [], 0
+        for _ in range(num_trinkets):
+            before = self._totals(ai_manager)
+            start = time.perf_counter()
+            with redirect_stdout(io.StringIO()):
+                trinket = factory.create_trinket()
+            latencies.append((time.perf_counter() - start) / self.time_scale)
+            after = self._totals(ai_manager)
+            calls.append(after['calls'] - before['calls'])
+            prompt_tokens.append(after['prompt_eval_count'] - before['prompt_eval_count'])
+            prefill.append((after['prompt_eval_duration'] - before['prompt_eval_duration']) / 1e9)
+            eval_tokens.append(after['eval_count'] - before['eval_count'])
+            valid += self._is_valid(trinket)
+
+        latencies.sort()
+        return {
+            'mode': label,
+            'trinkets': num_trinkets,
+            'mean_s': statistics.fmean(latencies),
+            'p50_s': latencies[len(latencies) // 2],
+            'p95_s': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            'calls': statistics.fmean(calls),
+            'prompt_tokens': statistics.fmean(prompt_tokens),
+            'prefill_s': statistics.fmean(prefill),
+            'eval_tokens': statistics.fmean(eval_tokens),
+            'valid_rate': valid / num_trinkets,
+            'estimated_calls': sum(getattr(endpoint, 'estimated_calls', 0) for endpoint in ai_manager.endpoint_pool.endpoints),
+            'roles': {role: dict(usage) for role, usage in ai_manager.usage.items()}
+        }
+
+    def _scaled_settings(self):
+        # A backend running faster than real time hedges after proportionally shorter delays
+        settings = copy.deepcopy(self.data_loader.ollama_settings)
+        for role_settings in settings.values():
+            if isinstance(role_settings, dict) and 'hedge' in role_settings:
+                role_settings['hedge']['delay'] = float(role_settings['hedge'].get('delay', 0)) * self.time_scale
+        return settings
+
+    @staticmethod
+    def _totals(ai_manager):
+        totals = Counter()
+        for usage in ai_manager.usage.values():
+            totals.update(usage)
+        return totals
+
+    def _is_valid(self, trinket):
+        hero_classes = self.data_loader.get_hero_classes()
+        effect_bounds = self.data_loader.get_effect_bounds()
+        if trinket['class'] not in hero_classes and trinket['class'] != 'every_class':
+            return False
+        if trinket['rarity'] not in self.data_loader.get_trinket_rarities():
+            return False
+        for stat, value in trinket['stats'].items():
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return False
+            low, high = effect_bounds.get(stat, (0, -1))
+            if not low <= value <= high:
+                return False
+        return True
+
+def print_report(results):
+    """
+    Print a side-by-side report of the benchmark results.
+
+    Args:
+        results (list): Statistics dictionaries returned by SynthesisBenchmark.run_mode.
+    """
+    # Prompt counters that were not tokenized are marked with a '~'
+    estimated_keys = ('prompt_tokens', 'prefill_s')
+    rows = [
+        ('Trinkets', 'trinkets', '{:.0f}'),
+        ('Mean latency (s)', 'mean_s', '{:.2f}'),
+        ('p50 latency (s)', 'p50_s', '{:.2f}'),
+        ('p95 latency (s)', 'p95_s', '{:.2f}'),
+        ('LLM calls / trinket', 'calls', '{:.2f}'),
+        ('Prompt tokens / trinket', 'prompt_tokens', '{:.0f}'),
+        ('Prefill (s) / trinket', 'prefill_s', '{:.2f}'),
+        ('Eval tokens / trinket', 'eval_tokens', '{:.0f}'),
+        ('Valid trinkets', 'valid_rate', '{:.1%}'),
+    ]
+    # Columns fit the longest mode label, e.g. 'combined/compact', with two spaces between them
+    width = max(14, max(len(result['mode']) for result in results) + 2)
+    print(f"{'':<26}" + "".join(f"{result['mode']:>{width}}" for result in results))
+    for label, key, fmt in rows:
+        print(f"{label:<26}" + "".join(
+            f"{('~' if key in estimated_keys and result['estimated_calls'] else '') + fmt.format(result[key]):>{width}}" for result in results))
+    if any(result['estimated_calls'] for result in results):
+        print("~ Estimated from the prompt length, not tokenized: the fake backend assumes four characters per token, "
+              "a replay extrapolates prompts that changed since the recording from the recorded tokens per character.")
+
+    print("\nCalls per trinket by role (1.00 means every first reply was valid), prompt tokens and prefill per call:")
+    for result in results:
+        marker = '~' if result['estimated_calls'] else ''
+        for role, usage in sorted(result['roles'].items()):
+            print(f"  {result['mode']:<18}{role:<28}{usage['calls'] / result['trinkets']:.2f} calls / trinket"
+                  f"{marker + format(usage['prompt_eval_count'] / usage['calls'], '.0f'):>8} prompt tokens"
+                  f"{marker + format(usage['prompt_eval_duration'] / usage['calls'] / 1e6, '.0f'):>8} ms prefill")
+
+def main():
+    """
+    Main function to benchmark the chained and combined synthesis modes.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the chained and combined trinket synthesis modes")
+    parser.add_argument("-n", "--num_trinkets", type=int, default=200, help="Number of trinkets per mode (default: 200)")
+    parser.add_argument("--replay", help="Replay a JSONL recording instead of using the fake backend")
+    parser.add_argument("--record", help="Run against the configured Ollama endpoints and append every reply to this JSONL file")
+    parser.add_argument("--invalid-rate", type=float, default=0.15, help="Fake backend: invalid reply rate of each chained role (default: 0.15)")
+    parser.add_argument("--combined-invalid-rate", type=float, default=0.25, help="Fake backend: invalid reply rate of the combined role (default: 0.25)")
+    parser.add_argument("--seed", type=int, default=0, help="Fake backend: random seed (default: 0)")
+    parser.add_argument("--time-scale", type=float, default=0.01, help="Fake and replay backends: fraction of the simulated latency actually waited for (default: 0.01)")
+    parser.add_argument("--compare-prompts", action="store_true", help="Run every mode with raw and compact prompts")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    data_loader = TrinketDataLoader(os.path.join(script_dir, 'config.json'))
+
+    time_scale = args.time_scale
+    if args.record:
+        time_scale = 1.0
+
+        def endpoint_factory():
+            pool = EndpointPool.from_settings(data_loader.ollama_settings)
+            return RecordingEndpointPool(pool.endpoints, args.record, pool.health_check_interval)
+    elif args.replay:
+        def endpoint_factory():
+            return EndpointPool([RecordedOllamaEndpoint(args.replay, time_scale=time_scale)])
+    else:
+        invalid_rates = {role: args.invalid_rate for role in data_loader.ollama_settings if role.startswith('DD_trinket_')}
+        invalid_rates['DD_trinket_synthesizer'] = args.combined_invalid_rate
+
+        def endpoint_factory():
+            return EndpointPool([FakeOllamaEndpoint(data_loader, invalid_rates, seed=args.seed, time_scale=time_scale)])
+
+    benchmark = SynthesisBenchmark(data_loader, endpoint_factory, time_scale)
+    variants = (False, True) if args.compare_prompts else (None,)
+    print_report([benchmark.run_mode(mode, args.num_trinkets, compact) for mode in ('chain', 'combined') for compact in variants])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import os
+import json
+import errno
+import hashlib
+import argparse
+import shutil
+import time
+
+# ioctl request number for FICLONE (share all extents of a file) on Linux
+FICLONE = 0x40049409
+
+class ModDeployer:
+    """
+    A class for incrementally deploying mod files into the game directory.
+
+    Instead of copying the whole mod tree on every launch, this class keeps a
+    manifest of the content hashes of every file it has placed in the game
+    directory. Only new or changed files are placed on deploy, and restoring
+    only touches the files listed in the manifest, putting back the vanilla
+    version from the backup folder or deleting the files the deployment created.
+
+    The first time a game file is overwritten, it is snapshotted into the backup
+    folder unless a copy is already there, so an incomplete backup cannot make
+    restore lose a file the game ships with.
+
+    Hard links are only used when 'hardlink' is configured explicitly: the game
+    file then shares its data with the mod source, so anything that edits the
+    game file in place edits the mod tree too.
+    """
+
+    LINK_MODES = ("reflink", "hardlink", "copy")
+    AUTO_LINK_MODES = ("reflink", "copy")
+
+    def __init__(self, mod_root, source_paths, game_dir, vanilla_backup_dir, manifest_path, link_mode="auto"):
+        """
+        Initialize the ModDeployer.
+
+        Args:
+            mod_root (str): Root folder of the mod tree; paths below it mirror the game directory.
+            source_paths (list): Files or folders under mod_root that should be deployed.
+            game_dir (str): The game directory the mod files are placed into.
+            vanilla_backup_dir (str): Folder holding an untouched copy of the game files.
+            manifest_path (str): Path of the JSON manifest of deployed files.
+            link_mode (str): One of 'auto', 'reflink', 'hardlink' or 'copy'.
+        """
+        self.mod_root = os.path.abspath(mod_root)
+        self.source_paths = [os.path.abspath(path) for path in source_paths]
+        self.game_dir = os.path.abspath(game_dir)
+        self.vanilla_backup_dir = os.path.abspath(vanilla_backup_dir)
+        self.manifest_path = os.path.abspath(manifest_path)
+        self.link_modes = self._resolve_link_modes(link_mode)
+
+    @classmethod
+    def from_config(cls, config_path):
+        """
+        Create a ModDeployer from the 'mod_output' and 'deploy_settings' sections of the config.
+
+        Args:
+            config_path (str): Path to the configuration file.
+
+        Returns:
+            ModDeployer: A deployer for the configured mod outputs.
+        """
+        with open(config_path, 'r') as config_file:
+            config = json.load(config_file)
+
+        base_dir = os.path.dirname(os.path.abspath(config_path))
+        settings = config['deploy_settings']
+
+        def resolve(path):
+            return os.path.normpath(os.path.join(base_dir, path))
+
+        return cls(
+            mod_root=resolve(settings['mod_root']),
+            source_paths=[resolve(path) for path in config['file_paths']['mod_output'].values()],
+            game_dir=resolve(settings['game_dir']),
+            vanilla_backup_dir=resolve(settings['vanilla_backup_dir']),
+            manifest_path=resolve(settings['manifest']),
+            link_mode=settings.get('link_mode', 'auto')
+        )
+
+    def _resolve_link_modes(self, link_mode):
+        """
+        Get the ordered list of placement strategies to attempt.
+
+        Args:
+            link_mode (str): The configured link mode.
+
+        Returns:
+            list: Placement strategies, best first. 'copy' is always the last resort.
+        """
+        if link_mode == 'auto':
+            return list(self.AUTO_LINK_MODES)
+        if link_mode not in self.LINK_MODES:
+            raise ValueError(f"Unrecognized link mode: {link_mode}. Expected 'auto' or one of {self.LINK_MODES}.")
+        return [link_mode] if link_mode == 'copy' else [link_mode, 'copy']
+
+    def deploy(self):
+        """
+        Place every new or changed mod file into the game directory.
+
+        Files that were deployed previously but no longer exist in the mod
+        tree are restored to their vanilla state.
+
+        Returns:
+            dict: Counts of 'placed', 'unchanged' and 'restored' files.
+        """
+        manifest = self._load_manifest()
+        deployed = manifest['files']
+        sources = self._collect_sources()
+        stats = {'placed': 0, 'unchanged': 0, 'restored': 0}
+
+        for rel_path, src_path in sources.items():
+            dst_path = self._game_path(rel_path)
+            src_stat = os.stat(src_path)
+            entry = deployed.get(rel_path)
+
+            if entry and entry['size'] == src_stat.st_size and entry['mtime_ns'] == src_stat.st_mtime_ns:
+                digest = entry['hash']
+            else:
+                digest = self._hash_file(src_path)
+
+            if entry is None:
+                # First placement: remember whether the game shipped this file, and keep its original
+                created = not os.path.lexists(dst_path)
+                if not created:
+                    self._backup_file(rel_path, src_path)
+            else:
+                created = entry.get('created', False)
+
+            if entry and entry['hash'] == digest and self._is_in_place(dst_path, src_stat):
+                stats['unchanged'] += 1
+            else:
+                self._place(src_path, dst_path)
+                stats['placed'] += 1
+
+            deployed[rel_path] = {'hash': digest, 'size': src_stat.st_size, 'mtime_ns': src_stat.st_mtime_ns, 'created': created}
+
+        for rel_path in [path for path in deployed if path not in sources]:
+            self._restore_file(rel_path, deployed[rel_path])
+            del deployed[rel_path]
+            stats['restored'] += 1
+
+        self._save_manifest(manifest)
+        return stats
+
+    def restore(self):
+        """
+        Restore every file listed in the manifest to its vanilla state.
+
+        Returns:
+            dict: Counts of 'restored', 'removed' and 'kept' files.
+        """
+        manifest = self._load_manifest()
+        stats = {'restored': 0, 'removed': 0, 'kept': 0}
+
+        for rel_path, entry in manifest['files'].items():
+            stats[self._restore_file(rel_path, entry)] += 1
+
+        manifest['files'] = {}
+        self._save_manifest(manifest)
+        return stats
+
+    def _collect_sources(self):
+        """
+        Collect all deployable files under the configured mod output paths.
+
+        Returns:
+            dict: Mapping of game-relative POSIX paths to absolute source paths.
+        """
+        sources = {}
+        for path in self.source_paths:
+            if os.path.isdir(path):
+                for dir_path, _, file_names in os.walk(path):
+                    for file_name in file_names:
+                        self._add_source(sources, os.path.join(dir_path, file_name))
+            elif os.path.isfile(path):
+                self._add_source(sources, path)
+        return sources
+
+    def _add_source(self, sources, path):
+        rel_path = os.path.relpath(path, self.mod_root)
+        if rel_path.startswith(os.pardir):
+            raise ValueError(f"Mod output {path} is outside of the mod root {self.mod_root}.")
+        sources[rel_path.replace(os.sep, '/')] = path
+
+    def _game_path(self, rel_path):
+        return os.path.join(self.game_dir, *rel_path.split('/'))
+
+    @staticmethod
+    def _hash_file(path):
+        with open(path, 'rb') as file:
+            return hashlib.file_digest(file, 'sha1').hexdigest()
+
+    @staticmethod
+    def _is_in_place(dst_path, src_stat):
+        # Every placement strategy keeps the source's mtime, so a game file that was
+        # replaced or edited since (even with one of the same size) gets placed again
+        try:
+            dst_stat = os.stat(dst_path)
+        except FileNotFoundError:
+            return False
+        return dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+
+    def _backup_path(self, rel_path):
+        return os.path.join(self.vanilla_backup_dir, *rel_path.split('/'))
+
+    def _backup_file(self, rel_path, src_path):
+        """
+        Snapshot a game file into the backup folder before it is overwritten for the first time.
+
+        Args:
+            rel_path (str): Game-relative POSIX path of the file.
+            src_path (str): The mod file that is about to replace it.
+        """
+        dst_path = self._game_path(rel_path)
+        backup_path = self._backup_path(rel_path)
+        if os.path.isfile(backup_path) or os.path.samefile(src_path, dst_path):
+            return
+        self._place(dst_path, backup_path, link_modes=['copy'])
+        print(f"Backed up vanilla {rel_path} before overwriting it.")
+
+    def _restore_file(self, rel_path, entry):
+        """
+        Put back the vanilla version of a game file, or delete it if the deployment created it.
+
+        The vanilla file is always copied, never linked, so later writes to the
+        game file cannot change the backup. A game file with neither a backup nor
+        a 'created' mark in the manifest is left alone.
+
+        Args:
+            rel_path (str): Game-relative POSIX path of the file.
+            entry (dict): The manifest entry of the file.
+
+        Returns:
+            str: 'restored', 'removed' or 'kept'.
+        """
+        dst_path = self._game_path(rel_path)
+        backup_path = self._backup_path(rel_path)
+        if os.path.isfile(backup_path):
+            self._place(backup_path, dst_path, link_modes=['copy'])
+            return 'restored'
+        if entry.get('created', False):
+            if os.path.lexists(dst_path):
+                os.remove(dst_path)
+            return 'removed'
+        print(f"No vanilla backup of {rel_path}, which the game shipped. Leaving the deployed file in place.")
+        return 'kept'
+
+    def _place(self, src_path, dst_path, link_modes=None):
+        """
+        Atomically place a file at the destination, using the cheapest supported strategy.
+
+        The file is first created under a temporary name and then moved over the
+        destination, so an existing hard link is replaced rather than written through.
+
+        Args:
+            src_path (str): The file to place.
+            dst_path (str): Where the file should end up.
+            link_modes (list): Strategies to use instead of the configured ones, e.g. ['copy'].
+        """
+        if link_modes is None and os.path.exists(dst_path) and os.path.samefile(src_path, dst_path):
+            # Already hard linked, and renaming onto the same inode would be a no-op
+            return
+
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        tmp_path = f"{dst_path}.deploytmp"
+
+        for mode in list(link_modes or self.link_modes):
+            if os.path.lexists(tmp_path):
+                os.remove(tmp_path)
+            try:
+                getattr(self, f"_place_{mode}")(src_path, tmp_path)
+            except OSError as e:
+                if mode == 'copy':
+                    raise
+                # The filesystem does not support this strategy, so stop trying it for this run
+                print(f"{mode} not supported ({e.strerror}), falling back.")
+                self.link_modes.remove(mode)
+                continue
+            os.replace(tmp_path, dst_path)
+            return
+
+    @staticmethod
+    def _place_reflink(src_path, dst_path):
+        try:
+            import fcntl
+        except ImportError:
+            raise OSError(errno.EOPNOTSUPP, "reflinks are not available on this platform")
+        with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            except OSError:
+                dst.close()
+                os.remove(dst_path)
+                raise
+        shutil.copystat(src_path, dst_path)
+
+    @staticmethod
+    def _place_hardlink(src_path, dst_path):
+        os.link(src_path, dst_path)
+
+    @staticmethod
+    def _place_copy(src_path, dst_path):
+        shutil.copy2(src_path, dst_path)
+
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path) and os.path.getsize(self.manifest_path) > 0:
+            try:
+                with open(self.manifest_path, 'r') as file:
+                    manifest = json.load(file)
+                if manifest.get('game_dir') == self.game_dir:
+                    return manifest
+                print(f"Manifest {self.manifest_path} belongs to another game directory. Starting a new one.")
+            except json.JSONDecodeError:
+                print(f"Error reading {self.manifest_path}. File might be corrupted. Starting a new manifest.")
+        return {'game_dir': self.game_dir, 'files': {}}
+
+    def _save_manifest(self, manifest):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(manifest, file, indent=3)
+        os.replace(tmp_path, self.manifest_path)
+
+def main():
+    """
+    Main function to deploy the mod to, or restore vanilla files in, the game directory.
+    """
+    parser = argparse.ArgumentParser(description="Incrementally deploy the Stochastic Trinkets mod files")
+    parser.add_argument("action", choices=["deploy", "restore"], help="Deploy changed mod files, or restore the vanilla game files")
+    parser.add_argument("-c", "--config", default=None, help="Path to the configuration file (default: config.json next to this script)")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    config_path = args.config or os.path.join(script_dir, 'config.json')
+
+    deployer = ModDeployer.from_config(config_path)
+    start = time.perf_counter()
+    stats = deployer.deploy() if args.action == 'deploy' else deployer.restore()
+    elapsed = time.perf_counter() - start
+
+    summary = ", ".join(f"{count} {label}" for label, count in stats.items())
+    print(f"{args.action.capitalize()} finished in {elapsed:.2f}s: {summary}.")
+
+if __name__ == "__main__":
+    main()
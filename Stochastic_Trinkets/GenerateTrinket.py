@@ -1,66 +1,117 @@
 import os
 import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from GenerateTrinketProperties import TrinketDataLoader, AIModelManager, TrinketPropertyGenerator, TrinketFactory
-from ParseTrinketFiles import ConfigManager, EffectTypeManager, TrinketProcessor, StringFileManager
 from GenerateTrinketImage import TrinketImageGenerator
+from ResidencyManager import ResidencyManager
+from TrinketCatalog import TrinketCatalog
 
 class TrinketGenerator:
     """
     A class to generate trinkets with various properties and process them.
 
     This class orchestrates the trinket generation process, including creating
-    trinket properties, processing buffs, generating string files, and creating
-    trinket images.
+    trinket properties, recording them in the trinket catalog, creating trinket
+    images, and exporting the catalog to the mod files.
     """
 
-    def __init__(self, config_path):
+    def __init__(self, config_path, use_catalog=True):
         """
         Initialize the TrinketGenerator with necessary components.
 
         Args:
             config_path (str): Path to the configuration file.
+            use_catalog (bool): Whether to open the trinket catalog. Without it, only
+                generate_batches can be used, e.g. by the pool daemon.
         """
-        self.config_manager = ConfigManager(config_path)
-        self.effect_type_manager = EffectTypeManager(self.config_manager)
-        self.trinket_processor = TrinketProcessor(self.config_manager, self.effect_type_manager)
-        self.string_file_manager = StringFileManager(self.config_manager)
-        self.image_generator = TrinketImageGenerator(config_path)
-
         self.data_loader = TrinketDataLoader(config_path)
         self.ai_manager = AIModelManager(self.data_loader.ollama_settings)
+
+        self.catalog = TrinketCatalog(config_path, ai_manager=self.ai_manager) if use_catalog else None
+        self.image_generator = TrinketImageGenerator(config_path)
         self.property_generator = TrinketPropertyGenerator(self.data_loader, self.ai_manager)
         self.trinket_factory = TrinketFactory(self.data_loader, self.property_generator)
+        self.residency = ResidencyManager(self.data_loader.config.get('residency_settings', {}),
+                                          self.image_generator, self.ai_manager)
 
     def generate_trinket(self):
         """
         Generate a complete trinket with properties, buffs, and image.
 
-        This method creates trinket properties, generates string files,
-        processes trinket buffs and entries, and creates a trinket image.
+        This method creates trinket properties and an image, records them in
+        the trinket catalog and exports the catalog to the mod files.
 
         Returns:
             dict: A dictionary containing the generated trinket properties.
         """
-        trinket_properties = self.trinket_factory.create_trinket()
-        
-        trinket_id = trinket_properties['name'].replace(" ", "_").replace("'", "").lower()
-        self.string_file_manager.generate_string_file(trinket_id, trinket_properties['name'])
-
-        buff_names = self.trinket_processor.parse_gen_trinket_buffs(
-            json.dumps(trinket_properties['stats']), 
-            trinket_properties['name']
-        )
-        self.trinket_processor.parse_gen_trinket_entry(
-            trinket_properties['name'],
-            trinket_properties['class'],
-            trinket_properties['rarity'],
-            buff_names
-        )
-
-        self.image_generator.generate_image(trinket_properties['name'])
-
-        return trinket_properties
+        return list(self.generate_trinkets(1))[0]
+
+    def generate_trinkets(self, num_trinkets, jobs=1):
+        """
+        Generate several trinkets, record them in the catalog and export the mod files.
+
+        The mod files are exported once, after the last trinket.
+
+        Args:
+            num_trinkets (int): Number of trinkets to generate.
+            jobs (int): Number of trinket property pipelines to run at once.
+
+        Yields:
+            dict: The properties of each trinket, batch by batch.
+        """
+        for batch in self.generate_batches(num_trinkets, jobs):
+            for trinket_properties, image_path in batch:
+                self.catalog.add_trinket(trinket_properties, image_path)
+                yield trinket_properties
+        self.image_generator.icon_writer.flush()
+        self.catalog.export_mod_files()
+
+    def generate_batches(self, num_trinkets, jobs=1, cancel=None):
+        """
+        Generate trinkets in phases, running up to `jobs` LLM pipelines concurrently.
+
+        Trinkets are generated in batches of the residency 'phase_batch_size':
+        first the properties of the whole batch (a text phase), then all of
+        its images (an image phase), so the residency manager only has to swap
+        the LLM and diffusion stages once per batch. The property pipelines
+        are spread across the configured Ollama endpoints. Nothing is recorded
+        in the catalog, and icons may still be queued in the icon writer.
+
+        If `cancel` is given, it is checked before every trinket and every
+        image. Once it returns True, no further work is started; trinkets that
+        are already complete are still yielded and the rest are dropped.
+
+        Args:
+            num_trinkets (int): Number of trinkets to generate.
+            jobs (int): Number of trinket property pipelines to run at once.
+            cancel (callable): Returns True when generation should stop, or None.
+
+        Yields:
+            list: The (properties, image path) pairs of each batch.
+        """
+        cancelled = cancel or (lambda: False)
+
+        def create_trinket():
+            return None if cancelled() else self.trinket_factory.create_trinket()
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            for batch_start in range(0, num_trinkets, self.residency.batch_size):
+                batch_size = min(self.residency.batch_size, num_trinkets - batch_start)
+                with self.residency.text_phase():
+                    futures = [executor.submit(create_trinket) for _ in range(batch_size)]
+                    batch = [future.result() for future in as_completed(futures)]
+                batch = [trinket_properties for trinket_properties in batch if trinket_properties is not None]
+                pairs = []
+                with self.residency.image_phase():
+                    for trinket_properties in batch:
+                        if cancelled():
+                            break
+                        pairs.append((trinket_properties, self.image_generator.generate_image(trinket_properties['name'])))
+                if pairs:
+                    yield pairs
+                if cancelled():
+                    return
 
 def main():
     """
@@ -71,6 +122,7 @@ def main():
     """
     parser = argparse.ArgumentParser(description="Generate trinkets for Darkest Dungeon")
     parser.add_argument("-n", "--num_trinkets", type=int, default=1, help="Number of trinkets to generate (default: 1)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of trinket pipelines to run concurrently across the Ollama endpoints (default: 1)")
     args = parser.parse_args()
 
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -78,10 +130,12 @@ def main():
     
     trinket_generator = TrinketGenerator(config_path)
     
-    for i in range(args.num_trinkets):
-        generated_trinket = trinket_generator.generate_trinket()
+    for i, generated_trinket in enumerate(trinket_generator.generate_trinkets(args.num_trinkets, args.jobs)):
         print(f"\nGenerated Trinket {i+1}:")
         print(json.dumps(generated_trinket, indent=2))
+    trinket_generator.ai_manager.print_usage()
+    trinket_generator.residency.print_stats()
+    trinket_generator.image_generator.icon_writer.print_stats()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,10 +1,15 @@
 import os
+import gc
 import json
+import random
+import torch
 from diffusers import StableDiffusionPipeline, EulerDiscreteScheduler
 from scipy.ndimage import gaussian_filter
 import numpy as np
 from PIL import Image
 import cv2
+from IconWriter import IconWriter
+from IconScorer import IconScorer
 
 class TrinketImageGenerator:
     """
@@ -22,9 +27,14 @@ class TrinketImageGenerator:
             config_path (str): Path to the configuration file.
         """
         self.config = self._load_config(config_path)
+        self.image_settings = self.config.get('image_settings', {})
         self.model_path = self._get_model_path()
         self.save_dir = self._get_save_dir()
+        self.device = self._resolve_device(self.image_settings.get('device', 'auto'))
         self.pipe = None
+        self.offloaded = False
+        self.icon_writer = IconWriter(self.config.get('icon_settings'))
+        self.icon_scorer = IconScorer(self.image_settings.get('candidates'))
 
     def _load_config(self, config_path):
         """
@@ -67,46 +77,210 @@ class TrinketImageGenerator:
 
         This method handles the entire process of image generation,
         including pipeline initialization, image creation, background
-        removal, resizing, and saving.
+        removal, resizing, and saving. With more than one configured
+        candidate, that many seeds are rendered in one batched pipeline call
+        and the icon with the best IconScorer score is kept.
 
         Args:
             trinket_name (str): Name of the trinket to generate an image for.
+
+        Returns:
+            str: Path of the saved image.
+        """
+        self.load_pipeline()
+
+        num_candidates = max(1, int(self.image_settings.get('candidates', {}).get('count', 1)))
+        seeds = [random.randrange(2**31) for _ in range(num_candidates)]
+        # mps does not support seeded generators, so its noise is drawn on the CPU
+        generator_device = 'cpu' if self.device == 'mps' else self.device
+
+        prompt = f"{trinket_name}, 2D icon, Darkest Dungeon."
+        with torch.inference_mode():
+            images = self._run_pipeline(
+                prompt,
+                num_inference_steps=int(self.image_settings.get('num_inference_steps', 30)),
+                height=int(self.image_settings.get('height', 768)),
+                width=int(self.image_settings.get('width', 512)),
+                guidance_scale=float(self.image_settings.get('guidance_scale', 7.5)),
+                num_images_per_prompt=num_candidates,
+                generator=[torch.Generator(generator_device).manual_seed(seed) for seed in seeds],
+                safety_checker=None
+            ).images
+
+        icons = [self._resize_and_crop(self._remove_background(image.convert('RGBA')), 72, 144) for image in images]
+        best = 0
+        if num_candidates > 1:
+            best = self._pick_candidate(trinket_name, icons, seeds)
+
+        return self._save_image(icons[best], trinket_name)
+
+    def _run_pipeline(self, *args, **kwargs):
+        """
+        Run the pipeline, falling back to the eager UNet if compiling the UNet fails.
+
+        torch.compile only compiles on the first call (and again for new input
+        shapes), so a missing C++ toolchain shows up here rather than at load time.
+
+        Returns:
+            The pipeline output.
+        """
+        eager_unet = getattr(self.pipe.unet, '_orig_mod', None)
+        if eager_unet is None:
+            return self.pipe(*args, **kwargs)
+        try:
+            return self.pipe(*args, **kwargs)
+        except torch._dynamo.exc.TorchDynamoException as e:
+            print(f"Warning: compiling the UNet failed ({type(e).__name__}: {e}). Falling back to eager mode.")
+            self.pipe.unet = eager_unet
+            return self.pipe(*args, **kwargs)
+
+    def _pick_candidate(self, trinket_name, icons, seeds):
+        """
+        Score the candidate icons of a trinket, log the scores and pick the best one.
+
+        Args:
+            trinket_name (str): Name of the trinket, for logging.
+            icons (list): The processed candidate icons.
+            seeds (list): The seed of each candidate, for logging.
+
+        Returns:
+            int: Index of the best candidate.
+        """
+        best, scores = self.icon_scorer.pick_best(icons)
+        print(f"Icon candidates for {trinket_name}:")
+        for i, seed in enumerate(seeds):
+            marker = "*" if i == best else " "
+            print(f"  {marker} seed {seed:<11}{IconScorer.format_scores(scores, i)}")
+        min_score = float(self.image_settings.get('candidates', {}).get('min_score', 0.6))
+        if scores['total'][best] < min_score:
+            print(f"Warning: the best icon for {trinket_name} scores {scores['total'][best]:.2f}, "
+                  f"below {min_score:.2f}. Consider regenerating it.")
+        return best
+
+    def load_pipeline(self):
+        """
+        Make sure the pipeline is loaded and on its device, reloading it after an unload or offload.
         """
         if not self.pipe:
             self._initialize_pipeline()
+        elif self.offloaded:
+            self.pipe.to(self.device)
+            self.offloaded = False
 
-        prompt = f"{trinket_name}, 2D icon, Darkest Dungeon."
-        image = self.pipe(
-            prompt,
-            num_inference_steps=30,
-            height=768,
-            width=512,
-            guidance_scale=7.5,
-            safety_checker=None
-        ).images[0]
-
-        image_rgba = image.convert('RGBA')
-        image_no_bg = self._remove_background(image_rgba)
-        image_downsized = self._resize_and_crop(image_no_bg, 72, 144)
-        
-        self._save_image(image_downsized, trinket_name)
+    def offload_pipeline(self):
+        """
+        Move the pipeline weights to system memory to free the accelerator for other work.
+
+        On CPU there is nothing to offload to, so this unloads the pipeline instead.
+        """
+        if not self.pipe or self.offloaded:
+            return
+        if self.device == 'cpu':
+            self.unload_pipeline()
+            return
+        self.pipe.to('cpu')
+        self.offloaded = True
+        self._release_memory()
+
+    def unload_pipeline(self):
+        """
+        Drop the pipeline entirely; the next image loads it again from the checkpoint.
+
+        The icon writer is kept, so icons still queued from earlier batches are written and counted.
+        """
+        self.pipe = None
+        self.offloaded = False
+        self._release_memory()
+
+    def _release_memory(self):
+        gc.collect()
+        if self.device == 'cuda':
+            torch.cuda.empty_cache()
+
+    @staticmethod
+    def _resolve_device(device):
+        """
+        Resolve the configured device, picking the best available one for 'auto'.
+
+        Args:
+            device (str): 'auto', 'cuda', 'mps' or 'cpu'.
+
+        Returns:
+            str: The torch device to run the pipeline on.
+        """
+        if device != 'auto':
+            return device
+        if torch.cuda.is_available():
+            return 'cuda'
+        if torch.backends.mps.is_available():
+            return 'mps'
+        return 'cpu'
+
+    def _resolve_dtype(self):
+        """
+        Resolve the configured weight precision for the selected device.
+
+        With 'auto', CPUs that support bf16 matmuls (AVX512-BF16 or AMX) run
+        in bfloat16, everything else keeps the float32 weights.
+
+        Returns:
+            torch.dtype: The dtype to load the pipeline weights in.
+        """
+        dtype = self.image_settings.get('dtype', 'auto')
+        if dtype != 'auto':
+            return getattr(torch, dtype)
+        if self.device == 'cpu' and self._cpu_supports_bf16():
+            return torch.bfloat16
+        return torch.float32
+
+    @staticmethod
+    def _cpu_supports_bf16():
+        try:
+            return torch.ops.mkldnn._is_mkldnn_bf16_supported()
+        except (AttributeError, RuntimeError):
+            return False
 
     def _initialize_pipeline(self):
         """
         Initialize the Stable Diffusion pipeline.
 
-        This method sets up the model and scheduler for image generation.
+        This method sets up the model and scheduler for image generation on
+        the configured device. On CPU it also applies the 'cpu' image
+        settings: thread count, attention slicing, channels-last memory
+        layout and optionally torch.compile of the UNet.
         """
         try:
-            self.pipe = StableDiffusionPipeline.from_single_file(self.model_path)
-            self.pipe.to("cuda")
+            if self.device == 'cpu':
+                num_threads = int(self.image_settings.get('cpu', {}).get('num_threads', 0))
+                if num_threads > 0:
+                    torch.set_num_threads(num_threads)
+            dtype = self._resolve_dtype()
+            self.pipe = StableDiffusionPipeline.from_single_file(self.model_path, torch_dtype=dtype)
+            self.pipe.to(self.device)
             scheduler = EulerDiscreteScheduler(beta_start=0.00085, beta_end=0.012, beta_schedule="scaled_linear")
             self.pipe.scheduler = scheduler
+            if self.device == 'cpu':
+                self._optimize_cpu_pipeline()
+            print(f"Stable Diffusion pipeline loaded on {self.device} ({str(dtype).replace('torch.', '')}, {torch.get_num_threads()} threads)")
         except OSError as e:
             print(f"Error loading Stable Diffusion model: {e}")
             print("Skipping image generation.")
             raise
 
+    def _optimize_cpu_pipeline(self):
+        """
+        Apply the CPU-specific optimizations from the 'cpu' image settings.
+        """
+        cpu_settings = self.image_settings.get('cpu', {})
+        if cpu_settings.get('attention_slicing', True):
+            self.pipe.enable_attention_slicing()
+        if cpu_settings.get('channels_last', True):
+            self.pipe.unet.to(memory_format=torch.channels_last)
+            self.pipe.vae.to(memory_format=torch.channels_last)
+        if cpu_settings.get('compile', False):
+            # Compilation happens on the first call and needs a C++ toolchain; _run_pipeline falls back to eager mode if it fails
+            self.pipe.unet = torch.compile(self.pipe.unet, mode=cpu_settings.get('compile_mode', 'default'))
+
     @staticmethod
     def _remove_background(image, tolerance=15, blur_radius=3):
         """
@@ -172,19 +346,28 @@ class TrinketImageGenerator:
 
     def _save_image(self, image, trinket_name):
         """
-        Save the generated trinket image.
+        Queue the generated trinket image to be encoded and saved by the icon writer.
+
+        The file is written in the background; call icon_writer.flush() to
+        wait until every queued image is on disk.
 
         Args:
             image (PIL.Image): Processed trinket image to save.
             trinket_name (str): Name of the trinket for file naming.
+
+        Returns:
+            str: Path of the image.
         """
         sanitized_name = trinket_name.replace(" ", "_").replace("'", "").lower()
         img_name = f"inv_trinket+{sanitized_name}.png"
-        image.save(os.path.join(self.save_dir, img_name), format='PNG')
+        img_path = os.path.join(self.save_dir, img_name)
+        self.icon_writer.submit(image, img_path)
+        return img_path
 
 if __name__ == "__main__":
     script_dir = os.path.dirname(os.path.abspath(__file__))
     config_path = os.path.join(script_dir, "config.json")
 
     generator = TrinketImageGenerator(config_path)
-    generator.generate_image("Echopearl")
\ No newline at end of file
+    generator.generate_image("Echopearl")
+    generator.icon_writer.close()
\ No newline at end of file
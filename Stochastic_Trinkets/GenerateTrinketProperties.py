@@ -1,8 +1,16 @@
 import json
 import os
-import ollama
 import ast
 import re
+import queue
+import random
+import threading
+import contextvars
+import http.client
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from OllamaTransport import EndpointPool, CancelToken, RequestCancelled
+from ParseTrinketFiles import ConfigManager, EffectTypeManager
 
 class TrinketDataLoader:
     """
@@ -20,9 +28,12 @@ class TrinketDataLoader:
             config_path (str): Path to the configuration JSON file.
         """
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.config_path = config_path
         self.config = self.load_config(config_path)
         self.file_paths = self.config['file_paths']['mod_resources']
         self.ollama_settings = self.config['ollama_settings']
+        self._effect_type_manager = None
+        self._prompt_tables = {}
 
     def load_config(self, config_path):
         """
@@ -49,17 +60,71 @@ class TrinketDataLoader:
             data = json.load(file)
         return list({entry['id'] for entry in data['entries']})
 
+    @property
+    def effect_type_manager(self):
+        """
+        The EffectTypeManager backing conditional effects, created on first use.
+        """
+        if self._effect_type_manager is None:
+            self._effect_type_manager = EffectTypeManager(ConfigManager(self.config_path))
+        return self._effect_type_manager
+
+    def conditional_effects_enabled(self):
+        """
+        Check whether conditional effects such as 'Damage (Melee)' should be generated.
+
+        Returns:
+            bool: The 'conditional_effects' trinket setting.
+        """
+        return bool(self.config['trinket_settings'].get('conditional_effects', False))
+
     def get_effect_names(self):
         """
         Retrieve effect names from the trinket effects JSON file.
 
+        If conditional effects are enabled, the list also contains a
+        'Name (Condition)' variant for every condition that vanilla trinkets
+        apply to the same stat.
+
         Returns:
             list: A list of trinket effect names.
         """
         trinket_effects_filepath = os.path.join(self.script_dir, self.file_paths['trinket_effects_json'])
         with open(trinket_effects_filepath, 'r') as file:
             json_data = json.load(file)
-        return [effect['name'] for effect in json_data['effects'] if 'name' in effect]
+        effect_names = [effect['name'] for effect in json_data['effects'] if 'name' in effect]
+        if self.conditional_effects_enabled():
+            effect_names += [f"{name} ({condition})" for name in effect_names
+                             for condition in self.effect_type_manager.get_conditions(name)]
+        return effect_names
+
+    def get_effect_bounds(self):
+        """
+        Retrieve the allowed value range of each effect from the trinket effects JSON file.
+
+        Conditional variants allow the range of their base effect, widened
+        towards the range vanilla trinkets use for the same stat under that
+        condition. Each side widens by at most 'conditional_bound_factor' - 1
+        times its own magnitude, so rare vanilla outliers such as +75% damage
+        at Death's Door do not become the allowed range.
+
+        Returns:
+            dict: A mapping of effect names to (minimum, maximum) tuples.
+        """
+        trinket_effects_filepath = os.path.join(self.script_dir, self.file_paths['trinket_effects_json'])
+        with open(trinket_effects_filepath, 'r') as file:
+            json_data = json.load(file)
+        effect_bounds = {effect['name']: (effect['minimum'], effect['maximum']) for effect in json_data['effects'] if 'name' in effect}
+        if self.conditional_effects_enabled():
+            widening = float(self.config['trinket_settings'].get('conditional_bound_factor', 1.5)) - 1
+            for name, (low, high) in list(effect_bounds.items()):
+                for condition in self.effect_type_manager.get_conditions(name):
+                    vanilla_low, vanilla_high = self.effect_type_manager.get_vanilla_bounds(name, condition)
+                    effect_bounds[f"{name} ({condition})"] = (
+                        min(low, max(vanilla_low, round(low - widening * abs(low)))),
+                        max(high, min(vanilla_high, round(high + widening * abs(high)))),
+                    )
+        return effect_bounds
 
     def get_hero_classes(self):
         """
@@ -85,6 +150,70 @@ class TrinketDataLoader:
             properties = json.load(file)
         return list(properties["rarity"].keys())
 
+    def compact_prompts_enabled(self):
+        """
+        Check whether prompts should embed the compact tables instead of the raw resource files.
+
+        Returns:
+            bool: The 'compact_prompts' trinket setting.
+        """
+        return bool(self.config['trinket_settings'].get('compact_prompts', True))
+
+    def get_bounds_table(self):
+        """
+        Get the allowed range of every effect as a compact 'name:min..max' table, computed once.
+
+        Returns:
+            str: The table, e.g. 'Accuracy:-15..20; Bleed Resist:-25..40'.
+        """
+        if 'bounds' not in self._prompt_tables:
+            self._prompt_tables['bounds'] = "; ".join(
+                f"{name}:{low:g}..{high:g}" for name, (low, high) in self.get_effect_bounds().items())
+        return self._prompt_tables['bounds']
+
+    def get_bounds_json(self):
+        """
+        Get the allowed range of every effect in the format of trinket_effects.json, computed once.
+
+        Unlike the raw file, this includes the conditional variants when they are enabled.
+
+        Returns:
+            str: A JSON string with spaces after commas and colons.
+        """
+        if 'bounds_json' not in self._prompt_tables:
+            effects = [{'name': name, 'minimum': low, 'maximum': high} for name, (low, high) in self.get_effect_bounds().items()]
+            json_string = json.dumps({'effects': effects}, separators=(',', ':'))
+            self._prompt_tables['bounds_json'] = re.sub(r'([,:])(?![\d\s])', r'\1 ', json_string)
+        return self._prompt_tables['bounds_json']
+
+    def get_name_examples(self):
+        """
+        Get the vanilla trinket ids shown to the namer as examples, computed once.
+
+        With compact prompts, at most 'namer_examples' ids are sampled with a
+        fixed seed, taking ids with different first words before repeating
+        one (many ids share prefixes like 'ancestors_' or 'the_'). The order
+        is stable across runs, so the namer's role model is not recreated.
+
+        Returns:
+            str: The space-separated ids.
+        """
+        if 'names' not in self._prompt_tables:
+            unique_ids = sorted(self.get_unique_ids())
+            if self.compact_prompts_enabled():
+                count = int(self.config['trinket_settings'].get('namer_examples', 80))
+                groups = defaultdict(list)
+                for trinket_id in unique_ids:
+                    groups[trinket_id.split('_')[0]].append(trinket_id)
+                rng = random.Random(0)
+                for ids in groups.values():
+                    rng.shuffle(ids)
+                # Take the n-th id of every prefix group before any group's (n+1)-th
+                ranked = sorted(unique_ids, key=lambda trinket_id: (groups[trinket_id.split('_')[0]].index(trinket_id), rng.random()))
+                unique_ids = ranked[:count]
+            self._prompt_tables['names'] = " ".join(unique_ids)
+        return self._prompt_tables['names']
+
     def load_json_to_string(self, filename):
         """
         Load a JSON file and convert it to a formatted string.
@@ -101,12 +230,136 @@ class TrinketDataLoader:
         json_string = json.dumps(data, separators=(',', ':'))
         return re.sub(r'([,:])(?![\d\s])', r'\1 ', json_string)
 
+class VocabularyValidator:
+    """
+    A stream validator for roles that must answer with one word from a known list.
+
+    Called with the response text received so far, it tells the stream to stop
+    as soon as the text can no longer become an allowed value, or once it is a
+    complete allowed value that no other allowed value extends.
+    """
+
+    def __init__(self, allowed_values):
+        """
+        Initialize the VocabularyValidator.
+
+        Args:
+            allowed_values (iterable): The allowed answers, in lower case.
+        """
+        self.allowed_values = set(allowed_values)
+
+    @staticmethod
+    def normalize(text):
+        """
+        Normalize a response the same way the role validation does.
+
+        Args:
+            text (str): The raw response text.
+
+        Returns:
+            str: The response without quotes and surrounding whitespace, in lower case.
+        """
+        return text.replace('"', "").strip().lower()
+
+    def __call__(self, text):
+        """
+        Decide whether the stream should stop.
+
+        Args:
+            text (str): The response text received so far.
+
+        Returns:
+            bool: True if generation should be aborted.
+        """
+        prefix = self.normalize(text)
+        extensions = [value for value in self.allowed_values if value.startswith(prefix)]
+        if not extensions:
+            print(f'Aborting response, no allowed value starts with: {prefix}')
+            return True
+        return extensions == [prefix]
+
+    def is_complete(self, text):
+        """
+        Check whether a stopped stream ended on a complete allowed value rather than being aborted.
+
+        Args:
+            text (str): The response text received before the stream stopped.
+
+        Returns:
+            bool: True if the text is an allowed value.
+        """
+        return self.normalize(text) in self.allowed_values
+
+class RoleModelSlot:
+    """
+    Tracks which system prompt a role model currently holds on one endpoint.
+
+    Requests with the same system prompt share the model and can run
+    concurrently; a request with a different prompt waits until the model is
+    idle and then recreates it. Concurrent hedged candidates therefore skip
+    the create round trip, while concurrent pipelines never overwrite each
+    other's prompt. The prompt is forgotten once the model is idle, since
+    another process (e.g. the pool daemon) may recreate the same role name on
+    the same server, so the next request creates the model again.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.modelfile = None
+        self.users = 0
+        self.creating = False
+
+    @contextmanager
+    def use(self, modelfile, create):
+        """
+        Hold the role model with the given modelfile, creating it if needed.
+
+        The create round trip runs without holding the slot's lock; requests
+        for the same modelfile wait for it to finish, then share the model.
+
+        Args:
+            modelfile (str): The modelfile the role model must hold.
+            create (callable): Creates the role model from the modelfile on the endpoint.
+        """
+        with self._condition:
+            while self.creating or (self.users and self.modelfile != modelfile):
+                self._condition.wait()
+            must_create = self.modelfile != modelfile
+            if must_create:
+                self.modelfile = modelfile
+                self.creating = True
+            self.users += 1
+
+        if must_create:
+            try:
+                create()
+            except BaseException:
+                with self._condition:
+                    self.creating = False
+                    self.users -= 1
+                    self.modelfile = None
+                    self._condition.notify_all()
+                raise
+            with self._condition:
+                self.creating = False
+                self._condition.notify_all()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.users -= 1
+                if not self.users:
+                    self.modelfile = None
+                self._condition.notify_all()
+
 class AIModelManager:
     """
     A class for managing AI model interactions using Ollama.
 
     This class handles the creation of system prompts and generation of responses
-    using specified AI models and settings.
+    using specified AI models and settings. Requests are sent through a pool of
+    Ollama endpoints, so roles or whole trinket pipelines can be spread across
+    several servers.
     """
 
     def __init__(self, ollama_settings):
@@ -117,6 +370,29 @@ class AIModelManager:
             ollama_settings (dict): A dictionary containing Ollama model settings.
         """
         self.ollama_settings = ollama_settings
+        self.transport_settings = ollama_settings.get('transport', {})
+        self.endpoint_pool = EndpointPool.from_settings(ollama_settings)
+        self._role_slots = {}
+        self._role_slots_lock = threading.Lock()
+        self.usage = defaultdict(Counter)
+        self._usage_lock = threading.Lock()
+        # Role models are unloaded after every reply unless a ResidencyManager keeps them resident for a phase
+        self.keep_alive = ollama_settings.get('keep_alive', 0)
+
+    @contextmanager
+    def pipeline(self):
+        """
+        Keep every request of one trinket pipeline on a single endpoint.
+
+        This only pins the endpoint when the transport 'routing' setting is
+        'pipeline'; with the default 'role' routing each request is routed
+        to the least-loaded endpoint on its own.
+        """
+        if self.transport_settings.get('routing', 'role') == 'pipeline':
+            with self.endpoint_pool.pinned():
+                yield
+        else:
+            yield
 
     def create_system_prompt(self, model_name, header, content):
         """
@@ -136,7 +412,7 @@ class AIModelManager:
         parameter_line = f"PARAMETER temperature {temperature}"
         return f"{from_line}\n{parameter_line}\n{header}{content}".strip()
 
-    def generate_response(self, model_name, system_prompt, user_content):
+    def generate_response(self, model_name, system_prompt, user_content, validator=None, cancel_token=None):
         """
         Generate a response using the specified model and system prompt.
 
@@ -144,18 +420,194 @@ class AIModelManager:
             model_name (str): The name of the model to use.
             system_prompt (str): The system prompt to use for the model.
             user_content (str): The user's input content.
+            validator (callable): Optional stream validator. If given, the response is
+                streamed and generation stops as soon as the validator returns True.
+            cancel_token (CancelToken): Optional token for aborting the request.
 
         Returns:
             str: The generated response from the AI model.
         """
-        model = self.ollama_settings[model_name]['model']
-        ollama.create(model=model_name, modelfile=system_prompt)
-        print(f'{model_name} model loaded')
-        response = ollama.chat(model=model_name, keep_alive=0, messages=[
-            {'role': 'user', 'content': user_content},
-        ])
+        timeout = self.ollama_settings[model_name].get('timeout')
+        timeout = float(timeout) if timeout is not None else None
+        options = self.get_role_options(model_name)
+        response_format = self.ollama_settings[model_name].get('format')
+
+        def chat(endpoint):
+            # The role model only exists on the endpoint it was created on, so create and chat together
+            def create():
+                endpoint.create(model_name, system_prompt, timeout=timeout, cancel_token=cancel_token)
+                print(f'{model_name} model loaded on {endpoint.url}')
+
+            with self._role_slot(endpoint, model_name).use(system_prompt, create):
+                return endpoint.chat(model_name, [
+                    {'role': 'user', 'content': user_content},
+                ], options=options, keep_alive=self.keep_alive, timeout=timeout, cancel_token=cancel_token,
+                    on_chunk=validator, format=response_format)
+
+        response = self.endpoint_pool.call(chat)
+        self._record_usage(model_name, response, validator)
         return response['message']['content']
 
+    def generate_hedged(self, model_name, system_prompt, user_content, parse, validator=None):
+        """
+        Generate a response with up to k concurrent candidates and keep the first valid one.
+
+        The role's 'hedge' setting gives the number of candidates k and the delay
+        in seconds before another candidate is started while none has answered.
+        A candidate that answers with an invalid reply immediately starts the
+        next one. Once a candidate passes validation the others are cancelled.
+        With the default k of 1 this is a single call to generate_response.
+
+        Args:
+            model_name (str): The name of the model to use.
+            system_prompt (str): The system prompt to use for the model.
+            user_content (str): The user's input content.
+            parse (callable): Validates a response, returning the parsed value or False.
+            validator (callable): Optional stream validator, see generate_response.
+
+        Returns:
+            The parsed value of the first valid candidate, or False if all k were invalid.
+        """
+        hedge = self.ollama_settings[model_name].get('hedge', {})
+        k = max(1, int(hedge.get('k', 1)))
+        delay = float(hedge.get('delay', 0))
+        if k == 1:
+            return parse(self.generate_response(model_name, system_prompt, user_content, validator))
+
+        cancel_token = CancelToken()
+        results = queue.Queue()
+        # Candidates run in the caller's context, so they keep its pipeline's endpoint pin
+        context = contextvars.copy_context()
+
+        def candidate():
+            try:
+                results.put(self.generate_response(model_name, system_prompt, user_content, validator, cancel_token))
+            except RequestCancelled:
+                results.put(None)
+            except Exception as e:
+                results.put(e)
+
+        launched = pending = 0
+        error = None
+        while launched < k or pending:
+            if launched < k and (pending == 0 or delay <= 0):
+                threading.Thread(target=context.copy().run, args=(candidate,), daemon=True).start()
+                launched += 1
+                pending += 1
+                continue
+            try:
+                result = results.get(timeout=delay if launched < k else None)
+            except queue.Empty:
+                # Nobody has answered within the hedging delay, so start another candidate
+                threading.Thread(target=context.copy().run, args=(candidate,), daemon=True).start()
+                launched += 1
+                pending += 1
+                continue
+
+            pending -= 1
+            if isinstance(result, Exception):
+                error = result
+                continue
+            parsed = parse(result) if result is not None else False
+            if parsed:
+                cancel_token.cancel()
+                return parsed
+
+        if error is not None:
+            raise error
+        return False
+
+    def _record_usage(self, model_name, response, validator=None):
+        """
+        Accumulate the call count and the token and time counters Ollama returns for a role.
+
+        A stream the validator stopped on a complete answer counts as
+        'early_stopped', any other stopped stream as 'aborted'.
+
+        Args:
+            model_name (str): The name of the model that was used.
+            response (dict): The chat response.
+            validator (callable): The stream validator of the call, if any.
+        """
+        with self._usage_lock:
+            usage = self.usage[model_name]
+            usage['calls'] += 1
+            if not response.get('done', True):
+                is_complete = getattr(validator, 'is_complete', None)
+                if is_complete is not None and is_complete(response['message']['content']):
+                    usage['early_stopped'] += 1
+                else:
+                    usage['aborted'] += 1
+            for key in ('prompt_eval_count', 'eval_count', 'prompt_eval_duration', 'eval_duration', 'total_duration'):
+                usage[key] += response.get(key, 0)
+
+    def print_usage(self):
+        """
+        Print the calls, prompt tokens and prefill time per role, from the counters Ollama returned,
+        along with how many streams were aborted or stopped early on a complete answer.
+        """
+        print(f"\n{'role':<28}{'calls':>7}{'prompt tokens/call':>20}{'prefill ms/call':>17}{'eval tokens/call':>18}"
+              f"{'aborted':>9}{'early stops':>13}")
+        for role, usage in sorted(self.usage.items()):
+            calls = usage['calls'] or 1
+            print(f"{role:<28}{usage['calls']:>7}{usage['prompt_eval_count'] / calls:>20.0f}"
+                  f"{usage['prompt_eval_duration'] / calls / 1e6:>17.0f}{usage['eval_count'] / calls:>18.0f}"
+                  f"{usage['aborted']:>9}{usage['early_stopped']:>13}")
+
+    def get_role_options(self, model_name):
+        """
+        Get the per-request generation options configured for a role.
+
+        Args:
+            model_name (str): The name of the model to use.
+
+        Returns:
+            dict: The 'num_predict' and 'stop' settings of the role, if any.
+        """
+        role_settings = self.ollama_settings[model_name]
+        options = {}
+        if 'num_predict' in role_settings:
+            options['num_predict'] = int(role_settings['num_predict'])
+        if 'stop' in role_settings:
+            options['stop'] = role_settings['stop']
+        return options
+
+    def get_loaded_footprint(self):
+        """
+        Measure the memory held by the role models currently loaded on the endpoints.
+
+        Returns:
+            dict: Total 'size' and 'size_vram' in bytes of the loaded role models.
+        """
+        footprint = Counter()
+        for endpoint in self.endpoint_pool.endpoints:
+            try:
+                models = endpoint.running_models()
+            except (OSError, ValueError, http.client.HTTPException):
+                continue
+            for model in models:
+                if model.get('name', '').split(':')[0] in self.ollama_settings:
+                    footprint['size'] += model.get('size', 0)
+                    footprint['size_vram'] += model.get('size_vram', 0)
+        return footprint
+
+    def unload_models(self):
+        """
+        Unload every role model this manager has created from its endpoint.
+        """
+        with self._role_slots_lock:
+            loaded = list(self._role_slots)
+        endpoints = {endpoint.url: endpoint for endpoint in self.endpoint_pool.endpoints}
+        for url, model_name in loaded:
+            try:
+                endpoints[url].unload(model_name)
+            except (OSError, ValueError, http.client.HTTPException) as e:
+                print(f"Could not unload {model_name} from {url}: {e}")
+
+    def _role_slot(self, endpoint, model_name):
+        with self._role_slots_lock:
+            return self._role_slots.setdefault((endpoint.url, model_name), RoleModelSlot())
+
 class TrinketPropertyGenerator:
     """
     A class for generating various properties of trinkets using AI models.
@@ -182,7 +634,6 @@ class TrinketPropertyGenerator:
         Returns:
             str: A generated trinket name.
         """
-        unique_ids = self.data_loader.get_unique_ids()
         header = (
             "SYSTEM "
             "You are tasked with deciding names of gamefiles in the video game Darkest Dungeon. "
@@ -191,7 +642,7 @@ class TrinketPropertyGenerator:
             "Favor darker themes, and avoid the word 'whisper'. "
             "Choose a name that is different but in the same format as any in the following list: "
         )
-        system_prompt = self.ai_manager.create_system_prompt('DD_trinket_namer', header, " ".join(unique_ids))
+        system_prompt = self.ai_manager.create_system_prompt('DD_trinket_namer', header, self.data_loader.get_name_examples())
         response = self.ai_manager.generate_response('DD_trinket_namer', system_prompt, 
             'Please suggest a unique trinket name. Avoid the word whisper. Answer only with ONE plausible name for the game file and NOTHING ELSE.')
         return response.replace('"', "")
@@ -217,14 +668,21 @@ class TrinketPropertyGenerator:
             f"Here is the list of all the class names in the game: "
         )
         system_prompt = self.ai_manager.create_system_prompt('DD_trinket_class_namer', header, " ".join(hero_classes))
-        
-        while True:
-            response = self.ai_manager.generate_response('DD_trinket_class_namer', system_prompt, 
-                'Please suggest the hero class for the trinket. Answer only with either every_class or a class name and NOTHING ELSE.')
-            gen_name = response.replace('"', "").lower()
+        validator = VocabularyValidator(hero_classes + ['every_class'])
+
+        def parse_class(response):
+            gen_name = VocabularyValidator.normalize(response)
             if gen_name in hero_classes or gen_name == 'every_class':
                 return gen_name
             print(f'Invalid class: {gen_name}')
+            return False
+        
+        while True:
+            gen_name = self.ai_manager.generate_hedged('DD_trinket_class_namer', system_prompt, 
+                'Please suggest the hero class for the trinket. Answer only with either every_class or a class name and NOTHING ELSE.',
+                parse_class, validator=validator)
+            if gen_name:
+                return gen_name
 
     def generate_rarity(self, trinket_name):
         """
@@ -246,12 +704,17 @@ class TrinketPropertyGenerator:
             f"Here is the list of all the possible rarities in the game: "
         )
         system_prompt = self.ai_manager.create_system_prompt('DD_trinket_rarity_namer', header, " ".join(trinket_rarities))
+        validator = VocabularyValidator(trinket_rarities)
+
+        def parse_rarity(response):
+            gen_name = VocabularyValidator.normalize(response)
+            return gen_name if gen_name in trinket_rarities else False
         
         while True:
-            response = self.ai_manager.generate_response('DD_trinket_rarity_namer', system_prompt, 
-                'Please suggest the rarity category for the trinket. Answer only with a valid rarity and NOTHING ELSE.')
-            gen_name = response.replace('"', "").lower()
-            if gen_name in trinket_rarities:
+            gen_name = self.ai_manager.generate_hedged('DD_trinket_rarity_namer', system_prompt, 
+                'Please suggest the rarity category for the trinket. Answer only with a valid rarity and NOTHING ELSE.',
+                parse_rarity, validator=validator)
+            if gen_name:
                 return gen_name
 
     def generate_stats(self, trinket_name, trinket_rarity, trinket_class):
@@ -280,15 +743,21 @@ class TrinketPropertyGenerator:
         )
         system_prompt = self.ai_manager.create_system_prompt('DD_trinket_stat_namer', header, " ".join(vanilla_stats))
         
-        while True:
-            response = self.ai_manager.generate_response('DD_trinket_stat_namer', system_prompt, 
-                'Please suggest a list of trinket stats. Answer ONLY with a python list with these stats and NOTHING ELSE.')
+        def parse_stats(response):
             print(response)
-            parsed_stats = self.parse_effects(response, vanilla_stats)
+            return self.parse_effects(response, vanilla_stats)
+        
+        while True:
+            parsed_stats = self.ai_manager.generate_hedged('DD_trinket_stat_namer', system_prompt, 
+                'Please suggest a list of trinket stats. Answer ONLY with a python list with these stats and NOTHING ELSE.',
+                parse_stats)
             if parsed_stats:
                 break
         
-        trinket_bounds = self.data_loader.load_json_to_string('trinket_effects_json')
+        if self.data_loader.compact_prompts_enabled():
+            bounds_section = f"TABLE OF THE MINIMUM AND MAXIMUM VALUES FOR EACH STAT (stat:minimum..maximum): {self.data_loader.get_bounds_table()}"
+        else:
+            bounds_section = f"JSON FILE DETAILING THE MAXIMUM AND MINIMUM MAGNITUDES FOR EACH STAT: {self.data_loader.get_bounds_json()}"
         header = (
             f"SYSTEM "
             f"You are tasked with tuning the values of the effects from trinkets in the video game Darkest Dungeon. "
@@ -301,26 +770,158 @@ class TrinketPropertyGenerator:
             f"Your task is to replace these symbols with specific numerical values within the allowed range for each stat. "
             f"The names of the stats that you write should be exactly the same as the ones provided by the user. "
             f"For each of those stats, choose concrete numerical values, not just ranges of values. "
-            f"The maximum and minimum magnitudes for each stat are given below in a json file. "
+            f"The maximum and minimum magnitudes for each stat are given below. "
             f"EXAMPLE: "
             f"user: STATS: {{'Bleed Resist': '-', 'Healing Received': '+', 'Stress': '-'}} Please answer ONLY with the completed dictionary and NOTHING ELSE. "
             f"expected output: {{'Bleed Resist': '-10', 'Healing Received': '+30', 'Stress': '-20'}} "
-            f"JSON FILE DETAILING THE MAXIMUM AND MINIMUM MAGNITUDES FOR EACH STAT: {trinket_bounds}"
+            f"{bounds_section}"
         )
         system_prompt = self.ai_manager.create_system_prompt('DD_trinket_stat_tuner', header, "")
-        response = self.ai_manager.generate_response('DD_trinket_stat_tuner', system_prompt, 
-            f'STATS: {parsed_stats} Please answer ONLY with the completed dictionary and NOTHING ELSE.')
-        
+        effect_bounds = self.data_loader.get_effect_bounds()
+        tuned_stats = self.ai_manager.generate_hedged('DD_trinket_stat_tuner', system_prompt,
+            f'STATS: {parsed_stats} Please answer ONLY with the completed dictionary and NOTHING ELSE.',
+            lambda response: self.parse_tuned_stats(response, parsed_stats, effect_bounds))
+        if tuned_stats:
+            return tuned_stats
+        print("Failed to process tuned stats. Using original parsed stats.")
+        return parsed_stats
+
+    def generate_combined(self, trinket_rarity=None):
+        """
+        Generate the name, class, rarity and tuned stats of a trinket in a single AI model call.
+
+        The reply is validated against the same hero classes, rarities, effect
+        names and effect bounds as the separate roles, and regenerated if invalid.
+
+        Args:
+            trinket_rarity (str): A fixed rarity for the trinket, or None to let the model choose one.
+
+        Returns:
+            dict: A dictionary with 'name', 'class', 'rarity' and 'stats' keys.
+        """
+        hero_classes = self.data_loader.get_hero_classes()
+        trinket_rarities = self.data_loader.get_trinket_rarities()
+        effect_bounds = self.data_loader.get_effect_bounds()
+        if self.data_loader.compact_prompts_enabled():
+            bounds_table = f"(stat:minimum..maximum) {self.data_loader.get_bounds_table()}"
+        else:
+            bounds_table = " ".join(f"{name}: {low} to {high};" for name, (low, high) in effect_bounds.items())
+        if trinket_rarity:
+            rarity_rule = f"The rarity of the trinket is {trinket_rarity}, write it exactly like that. "
+        else:
+            rarity_rule = f"Choose a rarity that fits the name of the trinket, from this list: {' '.join(trinket_rarities)}. "
+
+        header = (
+            f"SYSTEM "
+            f"You are tasked with designing trinkets for the video game Darkest Dungeon. "
+            f"Answer ONLY with a JSON object with the keys name, class, rarity and stats, and NOTHING ELSE. "
+            f"name: ONE plausible trinket name in line with the themes of the game (dark fantasy, lovecraftian). "
+            f"Favor darker themes, and avoid the word 'whisper'. "
+            f"Choose a name that is different but in the same format as any in the following list: {self.data_loader.get_name_examples()}. "
+            f"class: every_class if the trinket is generic, or the hero class it particularly suits, from this list: {' '.join(hero_classes)}. "
+            f"rarity: {rarity_rule}"
+            f"stats: an object with a minimum of 1 and a maximum of 5 stats representative of the trinket's name. "
+            f"Balance positive with negative effects and avoid repeating stats. "
+            f"More rare and class-specific trinkets have more potent effects (both positive and negative), whereas common trinkets are weaker. "
+            f"The keys are stat names and the values are signed whole numbers within the allowed range of the stat. "
+            f"EXAMPLE: {{\"name\": \"...\", \"class\": \"every_class\", \"rarity\": \"...\", \"stats\": {{\"Bleed Resist\": -10, \"Healing Received\": 30}}}} "
+            f"IMPORTANT: Each stat should be one of the following (WRITE THEM EXACTLY AS THEY APPEAR HERE), with its allowed range: "
+        )
+        system_prompt = self.ai_manager.create_system_prompt('DD_trinket_synthesizer', header, bounds_table)
+
+        while True:
+            response = self.ai_manager.generate_response('DD_trinket_synthesizer', system_prompt,
+                'Please design a new trinket. Answer ONLY with the JSON object and NOTHING ELSE.')
+            trinket = self.parse_combined(response, hero_classes, trinket_rarities, effect_bounds, trinket_rarity)
+            if trinket:
+                return trinket
+
+    def parse_combined(self, LLM_trinket, hero_classes, trinket_rarities, effect_bounds, trinket_rarity=None):
+        """
+        Parse and validate a combined trinket generated by the AI model.
+
+        Args:
+            LLM_trinket (str): The JSON object generated by the AI model.
+            hero_classes (list): A list of valid hero classes.
+            trinket_rarities (list): A list of valid rarities.
+            effect_bounds (dict): A mapping of valid effect names to (minimum, maximum) tuples.
+            trinket_rarity (str): The fixed rarity the trinket must have, or None.
+
+        Returns:
+            dict: The validated trinket, with stats in the same format as generate_stats, or False if invalid.
+        """
         try:
-            tuned_stats = ast.literal_eval(response)
-            if isinstance(tuned_stats, dict) and all(isinstance(v, (int, str)) for v in tuned_stats.values()):
-                return tuned_stats
-            else:
-                print("Invalid response format. Using original parsed stats.")
-                return parsed_stats
-        except:
-            print("Failed to process tuned stats. Using original parsed stats.")
-            return parsed_stats
+            data = json.loads(LLM_trinket)
+            name = data['name'].replace('"', "").strip()
+            trinket_class = data['class'].replace('"', "").strip().lower()
+            rarity = data['rarity'].replace('"', "").strip().lower()
+            stats = data['stats']
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+            print('Incorrect JSON format. Re-attempting...')
+            return False
+
+        if not name:
+            print('Empty trinket name. Re-attempting...')
+            return False
+        if trinket_class not in hero_classes and trinket_class != 'every_class':
+            print(f'Invalid class: {trinket_class}')
+            return False
+        if rarity != (trinket_rarity or rarity) or rarity not in trinket_rarities:
+            print(f'Invalid rarity: {rarity}')
+            return False
+        if not isinstance(stats, dict) or not 1 <= len(stats) <= 5:
+            print('Invalid number of stats. Re-attempting...')
+            return False
+
+        tuned_stats = {}
+        for stat, value in stats.items():
+            if stat not in effect_bounds:
+                print("Effect not in vanilla stats:", stat)
+                return False
+            try:
+                value = int(float(value))
+            except (TypeError, ValueError):
+                print(f"Invalid value '{value}' for stat '{stat}'. Re-attempting...")
+                return False
+            low, high = effect_bounds[stat]
+            if not low <= value <= high:
+                print(f"Value {value} for stat '{stat}' is outside of [{low}, {high}]. Re-attempting...")
+                return False
+            tuned_stats[stat] = f"{value:+d}"
+
+        return {
+            'name': name,
+            'class': trinket_class,
+            'rarity': rarity,
+            'stats': tuned_stats
+        }
+
+    def parse_tuned_stats(self, LLM_stats, requested_stats, effect_bounds):
+        """
+        Parse and validate the stat values tuned by the AI model.
+
+        Args:
+            LLM_stats (str): The python dictionary generated by the AI model.
+            requested_stats (dict): The stats the model was asked to tune, mapped to '+' or '-'.
+            effect_bounds (dict): A mapping of valid effect names to (minimum, maximum) tuples.
+
+        Returns:
+            dict: The tuned stats in the same format as parse_combined, or False if invalid.
+        """
+        try:
+            stats = ast.literal_eval(LLM_stats.strip())
+            tuned_stats = {}
+            for stat in requested_stats:
+                value = int(float(stats[stat]))
+                low, high = effect_bounds[stat]
+                if not low <= value <= high:
+                    print(f"Value {value} for stat '{stat}' is outside of [{low}, {high}].")
+                    return False
+                tuned_stats[stat] = f"{value:+d}"
+        except (ValueError, SyntaxError, TypeError, KeyError, json.JSONDecodeError):
+            print('Invalid tuned stats format.')
+            return False
+        return tuned_stats
 
     def parse_effects(self, LLM_effects, vanilla_stats):
         """
@@ -384,6 +985,31 @@ class TrinketFactory:
         Returns:
             dict: A dictionary containing all properties of the generated trinket.
         """
+        with self.property_generator.ai_manager.pipeline():
+            if self.get_synthesis_mode() == 'combined':
+                return self._create_trinket_combined()
+            return self._create_trinket()
+
+    def get_synthesis_mode(self):
+        """
+        Get the trinket synthesis mode based on the configuration setting.
+
+        Returns:
+            str: 'chain' for one AI model call per property, or 'combined' for a single call.
+        """
+        mode = self.config['trinket_settings'].get('synthesis_mode', 'chain').lower()
+        if mode not in ('chain', 'combined'):
+            print(f"Unrecognized synthesis mode: {mode}. Using 'chain' as default.")
+            return 'chain'
+        return mode
+
+    def _create_trinket_combined(self):
+        rarity_setting = self.config['trinket_settings']['rarity'].lower()
+        trinket = self.property_generator.generate_combined('stochastic' if rarity_setting == 'stochastic' else None)
+        print('Trinket ->', trinket)
+        return trinket
+
+    def _create_trinket(self):
         name = self.property_generator.generate_name()
         print('Trinket name ->', name)
 
@@ -0,0 +1,154 @@
+import os
+import json
+import argparse
+import numpy as np
+from PIL import Image
+
+DEFAULT_WEIGHTS = {'coverage': 1.0, 'centring': 1.0, 'edge_residue': 1.0, 'color_variance': 0.5}
+
+class IconScorer:
+    """
+    A class for scoring processed trinket icons, so bad renders can be rejected automatically.
+
+    Every icon gets four metrics in [0, 1], higher being better, computed for
+    all candidates at once on a stacked array:
+
+    - coverage: how close the share of opaque pixels is to 'target_coverage'.
+      Too little means background removal ate the subject, too much means
+      the background was left in.
+    - centring: how close the alpha-weighted centroid is to the crop centre.
+    - edge_residue: how few opaque pixels lie within 'border' pixels of the
+      crop edge, where leftover background and cut-off subjects show up.
+    - color_variance: the RGB standard deviation of the opaque pixels relative
+      to 'target_color_std', which rejects flat blobs.
+
+    The total is the weighted mean of the metrics.
+    """
+
+    def __init__(self, candidate_settings=None):
+        """
+        Initialize the IconScorer.
+
+        Args:
+            candidate_settings (dict): The 'candidates' section of the image settings.
+        """
+        settings = candidate_settings or {}
+        self.target_coverage = float(settings.get('target_coverage', 0.35))
+        self.border = int(settings.get('border', 4))
+        self.max_edge_residue = float(settings.get('max_edge_residue', 0.25))
+        self.target_color_std = float(settings.get('target_color_std', 40))
+        self.weights = {**DEFAULT_WEIGHTS, **settings.get('weights', {})}
+
+    def score(self, icons):
+        """
+        Score several icons of the same size.
+
+        Args:
+            icons (list): The processed icons as PIL images.
+
+        Returns:
+            dict: Arrays with one value per icon for every metric and for the 'total'.
+        """
+        data = np.stack([np.asarray(icon.convert('RGBA'), dtype=np.float32) for icon in icons])
+        alpha = data[..., 3] / 255
+        opaque = alpha > 0.5
+        _, height, width = alpha.shape
+
+        coverage = opaque.mean(axis=(1, 2))
+        scores = {'coverage': np.clip(1 - np.abs(coverage - self.target_coverage) / self.target_coverage, 0, 1)}
+
+        mass = alpha.sum(axis=(1, 2))
+        safe_mass = np.maximum(mass, 1e-6)
+        rows, columns = np.mgrid[0:height, 0:width]
+        offset_y = ((alpha * rows).sum(axis=(1, 2)) / safe_mass - (height - 1) / 2) / (height / 2)
+        offset_x = ((alpha * columns).sum(axis=(1, 2)) / safe_mass - (width - 1) / 2) / (width / 2)
+        centring = 1 - np.hypot(offset_x, offset_y) / np.sqrt(2)
+        scores['centring'] = np.where(mass > 0, np.clip(centring, 0, 1), 0)
+
+        border = np.ones((height, width), dtype=bool)
+        border[self.border:height - self.border, self.border:width - self.border] = False
+        residue = (opaque & border).sum(axis=(1, 2)) / border.sum()
+        scores['edge_residue'] = np.clip(1 - residue / self.max_edge_residue, 0, 1)
+
+        count = opaque.sum(axis=(1, 2))
+        safe_count = np.maximum(count, 1)[:, None]
+        rgb = data[..., :3] * opaque[..., None]
+        mean = rgb.sum(axis=(1, 2)) / safe_count
+        variance = ((data[..., :3] - mean[:, None, None, :]) ** 2 * opaque[..., None]).sum(axis=(1, 2)) / safe_count
+        color_std = np.sqrt(variance.mean(axis=1))
+        scores['color_variance'] = np.where(count > 0, np.clip(color_std / self.target_color_std, 0, 1), 0)
+
+        total_weight = sum(self.weights.values()) or 1
+        scores['total'] = sum(self.weights.get(metric, 0) * values for metric, values in scores.items()) / total_weight
+        return scores
+
+    def pick_best(self, icons):
+        """
+        Score several candidate icons and pick the best one.
+
+        Args:
+            icons (list): The processed candidate icons as PIL images.
+
+        Returns:
+            tuple: The index of the best icon and the score dict returned by score.
+        """
+        scores = self.score(icons)
+        return int(np.argmax(scores['total'])), scores
+
+    @staticmethod
+    def format_scores(scores, index):
+        """
+        Format the scores of one icon for logging.
+
+        Args:
+            scores (dict): The score dict returned by score.
+            index (int): The icon to format.
+
+        Returns:
+            str: e.g. 'total 0.82 (coverage 0.91, centring 0.95, edge_residue 1.00, color_variance 0.40)'.
+        """
+        metrics = ", ".join(f"{metric} {values[index]:.2f}" for metric, values in scores.items() if metric != 'total')
+        return f"total {scores['total'][index]:.2f} ({metrics})"
+
+def main():
+    """
+    Main function to score every icon in the mod output folder and list the worst ones for regeneration.
+    """
+    parser = argparse.ArgumentParser(description="Score the generated trinket icons and list the ones worth regenerating")
+    parser.add_argument("--worst", type=int, default=20, help="Number of lowest scoring icons to list (default: 20)")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(script_dir, 'config.json'), 'r') as config_file:
+        config = json.load(config_file)
+    icon_dir = os.path.join(script_dir, config['file_paths']['mod_output']['mod_output_trinket_images'])
+    candidate_settings = config.get('image_settings', {}).get('candidates', {})
+    scorer = IconScorer(candidate_settings)
+
+    names, icons = [], []
+    for name in sorted(os.listdir(icon_dir) if os.path.isdir(icon_dir) else []):
+        if name.startswith('inv_trinket+') and name.endswith('.png'):
+            with Image.open(os.path.join(icon_dir, name)) as icon:
+                icons.append(icon.convert('RGBA'))
+            names.append(name)
+    if not icons:
+        print(f"No trinket icons found in {icon_dir}.")
+        return
+
+    # Icons of other sizes (e.g. vanilla ones) are scored in their own stack
+    scores = [None] * len(icons)
+    for size in {icon.size for icon in icons}:
+        indices = [i for i, icon in enumerate(icons) if icon.size == size]
+        size_scores = scorer.score([icons[i] for i in indices])
+        for position, i in enumerate(indices):
+            scores[i] = (size_scores, position)
+
+    min_score = float(candidate_settings.get('min_score', 0.6))
+    ranked = sorted(range(len(icons)), key=lambda i: scores[i][0]['total'][scores[i][1]])
+    below = sum(scores[i][0]['total'][scores[i][1]] < min_score for i in ranked)
+    print(f"Scored {len(icons)} icons, {below} below the minimum score of {min_score:.2f}.")
+    for i in ranked[:args.worst]:
+        print(f"{names[i]:<48}{IconScorer.format_scores(*scores[i])}")
+
+if __name__ == "__main__":
+    main()
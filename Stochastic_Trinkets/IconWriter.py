@@ -0,0 +1,238 @@
+import io
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image, features
+
+class IconWriter:
+    """
+    A class for encoding and writing trinket icons and frames as small PNG files.
+
+    Icons are encoded with a configurable zlib compression level, optionally
+    quantized to a palette with per-entry alpha, and written without any
+    metadata chunks. A quantized image is only kept if its fully transparent
+    and fully opaque pixels are unchanged and its antialiased edges stay within
+    'max_alpha_error' of the original, otherwise the truecolor RGBA encoding
+    is used. Submitted icons are encoded in a thread pool, so the generation
+    thread only hands the image over; flush waits for all pending writes. The
+    pool is only started by the first submit, so a writer used for
+    synchronous writes alone never owns any threads.
+
+    'measure_baseline' additionally encodes every icon with the default PNG
+    settings to report the savings; it doubles the encode work and is meant
+    for benchmarks.
+    """
+
+    def __init__(self, icon_settings=None):
+        """
+        Initialize the IconWriter.
+
+        Args:
+            icon_settings (dict): The 'icon_settings' section of the config.
+        """
+        settings = icon_settings or {}
+        self.compress_level = int(settings.get('compress_level', 9))
+        self.optimize = settings.get('optimize', True)
+        self.quantize = settings.get('quantize', True)
+        self.colors = int(settings.get('colors', 256))
+        self.max_alpha_error = int(settings.get('max_alpha_error', 0))
+        self.measure_baseline = settings.get('measure_baseline', False)
+        self.quantize_method = Image.Quantize.LIBIMAGEQUANT if features.check('libimagequant') else Image.Quantize.FASTOCTREE
+
+        self.workers = max(1, int(settings.get('workers', 2)))
+        self._executor = None
+        self._pending = []
+        self._lock = threading.Lock()
+        self.stats = {'images': 0, 'quantized': 0, 'bytes': 0, 'baseline_bytes': 0, 'encode_time': 0.0}
+
+    def encode(self, image):
+        """
+        Encode an image as a PNG with the configured settings.
+
+        Args:
+            image (PIL.Image): The image to encode.
+
+        Returns:
+            tuple: The PNG bytes and whether the image was palette quantized.
+        """
+        image = image.convert('RGBA')
+        # A fresh image carries none of the source's text, ICC or EXIF chunks
+        image = Image.frombytes('RGBA', image.size, image.tobytes())
+
+        if self.quantize:
+            quantized = self._snap_palette_alpha(image.quantize(self.colors, method=self.quantize_method))
+            if self._alpha_preserved(image, quantized):
+                return self._save_png(quantized), True
+        return self._save_png(image), False
+
+    def _save_png(self, image):
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG', compress_level=self.compress_level, optimize=self.optimize)
+        return buffer.getvalue()
+
+    def _snap_palette_alpha(self, quantized):
+        # The quantizer averages alpha within a colour cluster, so nearly solid entries are snapped back to 0 or 255
+        palette = np.array(quantized.getpalette(rawmode='RGBA'), dtype=np.uint8).reshape(-1, 4)
+        alpha = palette[:, 3]
+        alpha[alpha >= 255 - self.max_alpha_error] = 255
+        alpha[alpha <= self.max_alpha_error] = 0
+        quantized.putpalette(palette.tobytes(), rawmode='RGBA')
+        return quantized
+
+    def _alpha_preserved(self, original, quantized):
+        # Fully transparent and fully opaque pixels must stay exact; antialiased edges may drift by max_alpha_error
+        alpha = np.asarray(original.getchannel('A'), dtype=np.int16)
+        error = np.abs(alpha - np.asarray(quantized.convert('RGBA').getchannel('A'), dtype=np.int16))
+        solid = (alpha == 0) | (alpha == 255)
+        return not error[solid].any() and error.max() <= self.max_alpha_error
+
+    def write(self, image, path):
+        """
+        Encode an image and atomically write it to a file.
+
+        Args:
+            image (PIL.Image): The image to write.
+            path (str): Destination path.
+
+        Returns:
+            int: The size of the written file in bytes.
+        """
+        start = time.perf_counter()
+        data, quantized = self.encode(image)
+        elapsed = time.perf_counter() - start
+        baseline = len(self._default_png(image)) if self.measure_baseline else 0
+        self.store(data, path)
+
+        with self._lock:
+            self.stats['images'] += 1
+            self.stats['quantized'] += quantized
+            self.stats['bytes'] += len(data)
+            self.stats['baseline_bytes'] += baseline
+            self.stats['encode_time'] += elapsed
+        return len(data)
+
+    @staticmethod
+    def store(data, path):
+        """
+        Atomically write encoded bytes to a file.
+
+        Args:
+            data (bytes): The encoded image.
+            path (str): Destination path.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _default_png(image):
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def submit(self, image, path):
+        """
+        Queue an image to be encoded and written in the background.
+
+        Args:
+            image (PIL.Image): The image to write. It must not be modified afterwards.
+            path (str): Destination path.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the size of the written file.
+        """
+        future = self.executor.submit(self.write, image, path)
+        with self._lock:
+            self._pending = [pending for pending in self._pending if not pending.done()]
+            self._pending.append(future)
+        return future
+
+    @property
+    def executor(self):
+        """
+        The thread pool that encodes submitted icons, started on first use.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="icon-writer")
+            return self._executor
+
+    def flush(self):
+        """
+        Wait until every queued icon has been written, re-raising the first error.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def print_stats(self):
+        """
+        Print the number of icons written, their size and the encode time.
+        """
+        stats = self.stats
+        if not stats['images']:
+            return
+        print(f"Wrote {stats['images']} icons ({stats['quantized']} palette quantized), {stats['bytes'] / 1024:.1f} KiB, "
+              f"{1000 * stats['encode_time'] / stats['images']:.1f} ms encode time per icon.")
+        if stats['baseline_bytes']:
+            saved = stats['baseline_bytes'] - stats['bytes']
+            print(f"Saved {saved / 1024:.1f} KiB ({saved / stats['baseline_bytes']:.0%}) against default PNG settings.")
+
+def main():
+    """
+    Main function to re-encode every icon in the mod output folder and report the savings.
+    """
+    parser = argparse.ArgumentParser(description="Re-encode the generated trinket icons with the configured PNG settings")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the savings without rewriting the files")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(script_dir, 'config.json'), 'r') as config_file:
+        config = json.load(config_file)
+    icon_dir = os.path.join(script_dir, config['file_paths']['mod_output']['mod_output_trinket_images'])
+    writer = IconWriter(config.get('icon_settings', {}))
+    paths = [os.path.join(icon_dir, name) for name in sorted(os.listdir(icon_dir)) if name.endswith('.png')]
+
+    def recompress(path):
+        with Image.open(path) as image:
+            image.load()
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        data, _ = writer.encode(image)
+        elapsed = time.perf_counter() - start
+        # Files that are already smaller than the re-encoded version are left alone
+        if len(data) >= size:
+            return size, size, elapsed
+        if not args.dry_run:
+            writer.store(data, path)
+        return size, len(data), elapsed
+
+    start = time.perf_counter()
+    results = list(writer.executor.map(recompress, paths))
+    writer.close()
+    elapsed = time.perf_counter() - start
+
+    before = sum(result[0] for result in results)
+    after = sum(result[1] for result in results)
+    encode_time = sum(result[2] for result in results)
+    print(f"{'Would re-encode' if args.dry_run else 'Re-encoded'} {len(paths)} icons in {elapsed:.2f}s "
+          f"({1000 * encode_time / max(1, len(paths)):.1f} ms encode time per icon).")
+    if before:
+        print(f"{before / 1024:.1f} KiB -> {after / 1024:.1f} KiB, saved {(before - after) / 1024:.1f} KiB ({(before - after) / before:.0%}).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+import json
+import time
+import socket
+import threading
+import contextvars
+import http.client
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+DEFAULT_HOST = "http://localhost:11434"
+
+class RequestCancelled(Exception):
+    """
+    Raised when an in-flight request is aborted through its CancelToken.
+    """
+
+class EndpointUnreachable(ConnectionError):
+    """
+    Raised when a connection to an endpoint cannot be opened, including connect timeouts.
+    """
+
+class CancelToken:
+    """
+    A handle for aborting in-flight requests from another thread.
+
+    Requests register the connection they are using with the token. Cancelling
+    the token shuts those sockets down, which wakes up any blocking read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connections = {}
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Cancel every request currently registered with this token.
+        """
+        with self._lock:
+            self.cancelled = True
+            connections = list(self._connections.items())
+        for connection, sock in connections:
+            _shutdown_connection(connection, sock)
+
+    def _register(self, connection):
+        # The socket is kept as well, since http.client drops connection.sock once a
+        # 'Connection: close' response starts while the response still reads from it
+        with self._lock:
+            if self.cancelled:
+                raise RequestCancelled()
+            self._connections[connection] = connection.sock
+
+    def _unregister(self, connection):
+        with self._lock:
+            self._connections.pop(connection, None)
+
+def _shutdown_connection(connection, sock=None):
+    sock = sock or connection.sock
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    connection.close()
+
+class OllamaEndpoint:
+    """
+    A single Ollama server with a persistent pool of keep-alive HTTP connections.
+
+    This class speaks the Ollama REST API directly, so every request can carry
+    its own timeout and CancelToken.
+    """
+
+    def __init__(self, url, pool_size=4, connect_timeout=5.0, request_timeout=300.0):
+        """
+        Initialize the OllamaEndpoint.
+
+        Args:
+            url (str): Base URL of the Ollama server, e.g. http://localhost:11434.
+            pool_size (int): Maximum number of concurrent connections to this server.
+            connect_timeout (float): Timeout in seconds for opening a connection.
+            request_timeout (float): Default total timeout in seconds for one request.
+        """
+        parts = urlsplit(url if "://" in url else f"http://{url}")
+        self.url = f"{parts.scheme}://{parts.netloc}"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._idle = []
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.healthy = True
+        self.last_health_check = 0.0
+
+    def __repr__(self):
+        return f"OllamaEndpoint({self.url!r}, in_flight={self.in_flight}, healthy={self.healthy})"
+
+    def create(self, model, modelfile, timeout=None, cancel_token=None):
+        """
+        Create (or overwrite) a model on this server from a modelfile.
+
+        Args:
+            model (str): Name of the model to create.
+            modelfile (str): Contents of the modelfile.
+            timeout (float): Total timeout in seconds, or None for the endpoint default.
+            cancel_token (CancelToken): Optional token for aborting the request.
+
+        Returns:
+            dict: The server's final status response.
+        """
+        payload = {"model": model, "name": model, "modelfile": modelfile, "stream": False}
+        return self.request("POST", "/api/create", payload, timeout, cancel_token)
+
+    def chat(self, model, messages, options=None, keep_alive=None, timeout=None, cancel_token=None, on_chunk=None, format=None):
+        """
+        Send a chat request to this server.
+
+        Args:
+            model (str): Name of the model to chat with.
+            messages (list): Chat messages in Ollama format.
+            options (dict): Optional model options such as temperature or num_predict.
+            keep_alive (int | str): How long the server should keep the model loaded afterwards.
+            timeout (float): Total timeout in seconds, or None for the endpoint default.
+            cancel_token (CancelToken): Optional token for aborting the request.
+            on_chunk (callable): If given, the reply is streamed and on_chunk is called with
+                the content received so far after every chunk. Returning True aborts generation.
+            format (str | dict): Optional structured output format, 'json' or a JSON schema.
+
+        Returns:
+            dict: The chat response, including 'message' and the eval counters. Aborted
+                streams have 'done' set to False and no counters.
+        """
+        payload = {"model": model, "messages": messages, "stream": on_chunk is not None}
+        if options:
+            payload["options"] = options
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        if format is not None:
+            payload["format"] = format
+        if on_chunk is None:
+            return self.request("POST", "/api/chat", payload, timeout, cancel_token)
+
+        parts = []
+        result = {"done": False}
+
+        def on_line(line):
+            parts.append(line.get("message", {}).get("content", ""))
+            if line.get("done"):
+                result.update(line)
+                return False
+            return on_chunk("".join(parts))
+
+        self.request("POST", "/api/chat", payload, timeout, cancel_token, on_line)
+        result["message"] = {"role": "assistant", "content": "".join(parts)}
+        return result
+
+    def running_models(self, timeout=5.0):
+        """
+        List the models currently loaded on this server.
+
+        Args:
+            timeout (float): Timeout in seconds for the request.
+
+        Returns:
+            list: Ollama's /api/ps entries, each with 'name', 'size' and 'size_vram' in bytes.
+        """
+        return self.request("GET", "/api/ps", None, timeout).get("models", [])
+
+    def unload(self, model, timeout=None):
+        """
+        Ask the server to unload a model right away.
+
+        Args:
+            model (str): Name of the model to unload.
+            timeout (float): Total timeout in seconds, or None for the endpoint default.
+        """
+        self.request("POST", "/api/generate", {"model": model, "keep_alive": 0, "stream": False}, timeout)
+
+    def check_health(self, timeout=2.0):
+        """
+        Probe the server and update its health flag.
+
+        Args:
+            timeout (float): Timeout in seconds for the probe.
+
+        Returns:
+            bool: Whether the server answered.
+        """
+        try:
+            self.request("GET", "/api/version", None, timeout)
+            self.healthy = True
+        except (OSError, http.client.HTTPException, ValueError):
+            self.healthy = False
+        self.last_health_check = time.monotonic()
+        return self.healthy
+
+    def request(self, method, path, payload=None, timeout=None, cancel_token=None, on_line=None):
+        """
+        Send one JSON request over a pooled connection.
+
+        Args:
+            method (str): HTTP method.
+            path (str): Request path on the server.
+            payload (dict): JSON body, or None.
+            timeout (float): Total timeout in seconds, or None for the endpoint default.
+            cancel_token (CancelToken): Optional token for aborting the request.
+            on_line (callable): For streamed responses, called with each decoded
+                JSON line. Returning True drops the connection and ends the stream.
+
+        Returns:
+            dict: The decoded JSON response, or an empty dict for streamed responses.
+
+        Raises:
+            RequestCancelled: If the token was cancelled.
+            TimeoutError: If the request did not finish in time.
+            EndpointUnreachable: If no connection to the server could be opened.
+            ConnectionError: If the server answered with an error.
+        """
+        deadline = time.monotonic() + (timeout or self.request_timeout)
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+
+        with self._slots:
+            connection, reused = self._checkout()
+            try:
+                return self._send(connection, method, path, body, headers, deadline, cancel_token, on_line)
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # A reused keep-alive connection may have been closed by the server; retry once on a fresh one
+                if not reused or (cancel_token and cancel_token.cancelled):
+                    raise
+            connection, _ = self._checkout(fresh=True)
+            return self._send(connection, method, path, body, headers, deadline, cancel_token, on_line)
+
+    def _send(self, connection, method, path, body, headers, deadline, cancel_token, on_line=None):
+        stopped = False
+        try:
+            self._set_timeout(connection, deadline)
+            sock = connection.sock
+            if cancel_token:
+                cancel_token._register(connection)
+            connection.request(method, path, body=body, headers=headers)
+            self._set_timeout(connection, deadline)
+            response = connection.getresponse()
+            if on_line is None or response.status >= 400:
+                data = response.read()
+            else:
+                data = b""
+                while not stopped:
+                    line = response.readline()
+                    if not line:
+                        break
+                    if line.strip():
+                        stopped = bool(on_line(json.loads(line)))
+                    self._set_timeout(connection, deadline)
+            if cancel_token and cancel_token.cancelled and not stopped:
+                # Shutting the socket down ends the read cleanly, so a cancelled reply looks complete
+                raise RequestCancelled()
+        except RequestCancelled:
+            connection.close()
+            raise
+        except OSError as e:
+            connection.close()
+            if cancel_token and cancel_token.cancelled:
+                raise RequestCancelled() from e
+            if isinstance(e, socket.timeout):
+                raise TimeoutError(f"Request to {self.url}{path} timed out") from e
+            raise
+        except http.client.HTTPException:
+            connection.close()
+            if cancel_token and cancel_token.cancelled:
+                raise RequestCancelled()
+            raise
+        finally:
+            if cancel_token:
+                cancel_token._unregister(connection)
+
+        if stopped or response.will_close:
+            # Dropping the connection mid-stream is what makes the server stop generating
+            _shutdown_connection(connection, sock)
+            response.close()
+        else:
+            self._checkin(connection)
+
+        if response.status >= 400:
+            raise ConnectionError(f"{self.url}{path} answered {response.status}: {data.decode('utf-8', 'replace')}")
+        self.completed += 1
+        return json.loads(data) if data else {}
+
+    def _set_timeout(self, connection, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout()
+        if connection.sock is None:
+            connection.timeout = min(remaining, self.connect_timeout)
+            try:
+                connection.connect()
+            except OSError as e:
+                # Kept apart from read timeouts, which mean the server is up but slow
+                raise EndpointUnreachable(f"Could not connect to {self.url}: {e}") from e
+        connection.sock.settimeout(remaining)
+
+    def _track(self, delta):
+        # Load is counted by EndpointPool, once per call or pinned pipeline, not per HTTP request
+        with self._lock:
+            self.in_flight += delta
+
+    def _checkout(self, fresh=False):
+        with self._lock:
+            if self._idle and not fresh:
+                return self._idle.pop(), True
+        return self.connection_class(self.host, self.port, timeout=self.connect_timeout), False
+
+    def _checkin(self, connection):
+        with self._lock:
+            self._idle.append(connection)
+
+    def close(self):
+        """
+        Close every idle pooled connection.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+class EndpointPool:
+    """
+    A set of Ollama endpoints with health checks and least-loaded routing.
+
+    Requests are routed to the healthy endpoint with the fewest requests in
+    flight. An endpoint that fails to connect is marked unhealthy and the
+    request fails over to the next one; unhealthy endpoints are probed again
+    once the health check interval has passed.
+    """
+
+    def __init__(self, endpoints, health_check_interval=30.0):
+        """
+        Initialize the EndpointPool.
+
+        Args:
+            endpoints (list): OllamaEndpoint instances to route between.
+            health_check_interval (float): Seconds before an unhealthy endpoint is probed again.
+        """
+        if not endpoints:
+            raise ValueError("EndpointPool needs at least one endpoint.")
+        self.endpoints = endpoints
+        self.health_check_interval = health_check_interval
+        self._lock = threading.Lock()
+        # A context variable rather than a thread local, so threads started with a copy of the context keep the pin
+        self._pinned = contextvars.ContextVar('pinned_endpoint', default=None)
+
+    @classmethod
+    def from_settings(cls, ollama_settings):
+        """
+        Create an EndpointPool from the 'endpoints' and 'transport' entries of the Ollama settings.
+
+        Args:
+            ollama_settings (dict): The 'ollama_settings' section of the config.
+
+        Returns:
+            EndpointPool: A pool over the configured endpoints (localhost if none are listed).
+        """
+        transport = ollama_settings.get('transport', {})
+        endpoints = [
+            OllamaEndpoint(
+                url,
+                pool_size=int(transport.get('pool_size', 4)),
+                connect_timeout=float(transport.get('connect_timeout', 5)),
+                request_timeout=float(transport.get('request_timeout', 300))
+            )
+            for url in ollama_settings.get('endpoints', [DEFAULT_HOST])
+        ]
+        return cls(endpoints, health_check_interval=float(transport.get('health_check_interval', 30)))
+
+    def select(self, exclude=()):
+        """
+        Pick the least-loaded healthy endpoint.
+
+        Args:
+            exclude (iterable): Endpoints that should not be picked.
+
+        Returns:
+            OllamaEndpoint: The selected endpoint.
+
+        Raises:
+            ConnectionError: If no endpoint is reachable.
+        """
+        pinned = self._pinned.get()
+        if pinned is not None and pinned.healthy and pinned not in exclude:
+            return pinned
+
+        now = time.monotonic()
+        with self._lock:
+            due = [e for e in self.endpoints if not e.healthy and e not in exclude and now - e.last_health_check >= self.health_check_interval]
+            for endpoint in due:
+                # Claimed under the lock, so concurrent selects do not probe the same endpoint in parallel
+                endpoint.last_health_check = now
+        for endpoint in due:
+            endpoint.check_health()
+
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.healthy and e not in exclude]
+            if not candidates:
+                raise ConnectionError(f"No healthy Ollama endpoint among {[e.url for e in self.endpoints]}")
+            return min(candidates, key=lambda e: (e.in_flight, e.completed))
+
+    def call(self, fn):
+        """
+        Run fn(endpoint) on the least-loaded endpoint, failing over on connection errors.
+
+        Failed or timed out connects fail over, but a read timeout does not: the
+        server accepted the request, and sending it elsewhere would only add load.
+
+        Args:
+            fn (callable): Function that performs the requests on the given endpoint.
+
+        Returns:
+            The return value of fn.
+        """
+        tried = []
+        while True:
+            endpoint = self.select(exclude=tried)
+            # Count the call as load for its whole duration, including any time fn spends waiting on locks.
+            # A pinned pipeline is already counted once for all of its calls.
+            tracked = 0 if endpoint is self._pinned.get() else 1
+            endpoint._track(tracked)
+            try:
+                return fn(endpoint)
+            except (EndpointUnreachable, ConnectionRefusedError, ConnectionResetError, http.client.RemoteDisconnected, socket.gaierror) as e:
+                print(f"Ollama endpoint {endpoint.url} failed ({e}). Failing over.")
+                endpoint.healthy = False
+                endpoint.last_health_check = time.monotonic()
+                tried.append(endpoint)
+                if len(tried) == len(self.endpoints):
+                    raise ConnectionError(f"All Ollama endpoints failed, last error: {e}") from e
+            finally:
+                endpoint._track(-tracked)
+
+    @contextmanager
+    def pinned(self):
+        """
+        Route every request made in the current context to one endpoint.
+
+        This covers the current thread and any thread started with a copy of
+        its context, such as hedged candidates.
+
+        Used to keep a whole trinket pipeline on the same server while
+        other pipelines run on the remaining endpoints.
+        """
+        endpoint = self.select()
+        token = self._pinned.set(endpoint)
+        endpoint._track(1)
+        try:
+            yield endpoint
+        finally:
+            endpoint._track(-1)
+            self._pinned.reset(token)
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.close()
@@ -2,9 +2,12 @@ import json
 import os
 import ast
 import re
+import pickle
+from collections import Counter, defaultdict
 import xml.etree.ElementTree as ET
 import xml.dom.minidom as minidom
-import shutil
+from PIL import Image
+from IconWriter import IconWriter
 
 class ConfigManager:
     def __init__(self, config_path):
@@ -18,15 +21,106 @@ class ConfigManager:
         return os.path.join(os.path.dirname(os.path.abspath(__file__)), 
                             self.config['file_paths'][category][file_name])
 
+class VanillaBuffIndex:
+    # Bump when the layout of the pickled index changes
+    VERSION = 1
+    SOURCES = {'trinket': 'vanilla_trinket_buffs_json', 'all': 'vanilla_all_buffs_json'}
+
+    def __init__(self, config_manager):
+        self.index_path = config_manager.get_file_path('mod_resources', 'vanilla_buff_index')
+        self.source_paths = {source: config_manager.get_file_path('mod_resources', key) for source, key in self.SOURCES.items()}
+        self.ranges, self.rule_types, self.rule_data = self._load_or_build()
+
+    def _signature(self):
+        signature = {}
+        for source, path in self.source_paths.items():
+            stat = os.stat(path)
+            signature[source] = (stat.st_size, stat.st_mtime_ns)
+        return signature
+
+    def _load_or_build(self):
+        signature = self._signature()
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'rb') as file:
+                    cached = pickle.load(file)
+                if cached['version'] == self.VERSION and cached['signature'] == signature:
+                    return cached['ranges'], cached['rule_types'], cached['rule_data']
+                print(f"Vanilla buff index {self.index_path} is stale. Rebuilding.")
+            except Exception as e:
+                # A stale or foreign pickle can fail in many ways (missing modules, other layouts); the JSON is the source of truth
+                print(f"Error reading {self.index_path} ({type(e).__name__}: {e}). Rebuilding.")
+
+        ranges, rule_types, rule_data = self._build()
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            pickle.dump({'version': self.VERSION, 'signature': signature, 'ranges': ranges,
+                         'rule_types': rule_types, 'rule_data': rule_data}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.index_path)
+        return ranges, rule_types, rule_data
+
+    def _build(self):
+        # ranges[source][(stat_type, stat_sub_type, rule_type)] -> (count, min, max)
+        # rule_types[source][(stat_type, stat_sub_type)] -> {rule_type: count}
+        # rule_data[source][(stat_type, stat_sub_type, rule_type)] -> most common (float, string) rule data
+        ranges, rule_types, rule_data = {}, {}, {}
+        for source, path in self.source_paths.items():
+            with open(path, 'r') as file:
+                buffs = json.load(file)['buffs']
+
+            amounts = defaultdict(list)
+            data_counts = defaultdict(Counter)
+            for buff in buffs:
+                key = (buff['stat_type'], buff['stat_sub_type'], buff['rule_type'])
+                amounts[key].append(buff['amount'])
+                data = buff.get('rule_data', {})
+                data_counts[key][(data.get('float', 0), data.get('string', ""))] += 1
+
+            ranges[source] = {key: (len(values), min(values), max(values)) for key, values in amounts.items()}
+            rule_types[source] = defaultdict(dict)
+            for (stat_type, stat_sub_type, rule_type), (count, _, _) in ranges[source].items():
+                rule_types[source][(stat_type, stat_sub_type)][rule_type] = count
+            rule_types[source] = dict(rule_types[source])
+            rule_data[source] = {key: counts.most_common(1)[0][0] for key, counts in data_counts.items()}
+        return ranges, rule_types, rule_data
+
+    def get_range(self, stat_type, stat_sub_type, rule_type="always", source='trinket'):
+        entry = self.ranges[source].get((stat_type, stat_sub_type, rule_type))
+        return (entry[1], entry[2]) if entry else None
+
+    def get_rule_types(self, stat_type, stat_sub_type, source='trinket'):
+        return self.rule_types[source].get((stat_type, stat_sub_type), {})
+
+    def get_rule_data(self, stat_type, stat_sub_type, rule_type, source='trinket'):
+        data = self.rule_data[source].get((stat_type, stat_sub_type, rule_type))
+        if data is None:
+            return None
+        return {"float": data[0], "string": data[1]}
+
 class EffectTypeManager:
     def __init__(self, config_manager):
+        self.config_manager = config_manager
         self.effect_types = self._load_effect_types(config_manager)
+        self.effect_conditions = self._load_effect_conditions(config_manager)
+        self._buff_index = None
 
     def _load_effect_types(self, config_manager):
         effect_types_path = config_manager.get_file_path('mod_resources', 'effect_types_json')
         with open(effect_types_path, 'r') as file:
             return json.load(file)
 
+    def _load_effect_conditions(self, config_manager):
+        effect_conditions_path = config_manager.get_file_path('mod_resources', 'effect_conditions_json')
+        with open(effect_conditions_path, 'r') as file:
+            return json.load(file)
+
+    @property
+    def buff_index(self):
+        # Built (or loaded from its pickle) on first use only
+        if self._buff_index is None:
+            self._buff_index = VanillaBuffIndex(self.config_manager)
+        return self._buff_index
+
     def get_effect_entry(self, effect_name, detail_key):
         if effect_name in self.effect_types:
             effect_details = self.effect_types[effect_name]
@@ -35,18 +129,78 @@ class EffectTypeManager:
                     return effect_details[0][detail_key]
         return None
 
+    def get_condition_entry(self, condition_name, detail_key):
+        condition_details = self.effect_conditions.get(condition_name)
+        if condition_details and detail_key in condition_details[0]:
+            return condition_details[0][detail_key]
+        return None
+
+    @staticmethod
+    def split_condition(LLM_buff):
+        # "Damage (Melee)" -> ("Damage", "Melee"); "Damage" -> ("Damage", None)
+        match = re.match(r'^(.*?)\s*\((.+)\)$', LLM_buff)
+        if match:
+            return match.group(1), match.group(2)
+        return LLM_buff, None
+
+    def get_buff_key(self, effect_name):
+        stat_type = self.get_effect_entry(effect_name, 'stat_type')
+        stat_sub_type = "damage_low" if effect_name == 'Damage' else self.get_effect_entry(effect_name, 'stat_subtype')
+        return stat_type, stat_sub_type
+
+    def get_conditions(self, effect_name):
+        # Conditions with a vanilla trinket buff of the same stat to take the rule data from
+        stat_type, stat_sub_type = self.get_buff_key(effect_name)
+        vanilla_rule_types = self.buff_index.get_rule_types(stat_type, stat_sub_type)
+        return [condition for condition in self.effect_conditions
+                if self.get_condition_entry(condition, 'rule_type') in vanilla_rule_types]
+
+    def get_vanilla_bounds(self, effect_name, condition_name=None):
+        # Vanilla trinket range of an effect in the same units as trinket_effects.json
+        stat_type, stat_sub_type = self.get_buff_key(effect_name)
+        rule_type = self.get_condition_entry(condition_name, 'rule_type') if condition_name else "always"
+        bounds = self.buff_index.get_range(stat_type, stat_sub_type, rule_type)
+        if bounds is None:
+            return None
+        scale = self.get_amount_scale(effect_name)
+        return tuple(sorted(round(amount * scale, 2) for amount in bounds))
+
+    def get_amount_scale(self, effect_name):
+        # Factor from a buff amount to trinket_effects.json units, the inverse of TrinketProcessor._calculate_amount
+        scale = 100 if self.get_effect_entry(effect_name, 'magnitude_type') == "percent" else 1
+        return -scale if effect_name == 'Death Blow' else scale
+
+    def get_rule(self, effect_name, condition_name):
+        if condition_name is None:
+            return "always", {"float": 0, "string": ""}
+        rule_type = self.get_condition_entry(condition_name, 'rule_type')
+        if rule_type is None:
+            print(f"Warning: Unknown condition '{condition_name}' for buff '{effect_name}'. Using 'always'.")
+            return "always", {"float": 0, "string": ""}
+        stat_type, stat_sub_type = self.get_buff_key(effect_name)
+        rule_data = (self.buff_index.get_rule_data(stat_type, stat_sub_type, rule_type)
+                     or self.get_condition_entry(condition_name, 'rule_data')
+                     or {"float": 0, "string": ""})
+        return rule_type, rule_data
+
 class TrinketProcessor:
-    def __init__(self, config_manager, effect_type_manager):
+    def __init__(self, config_manager, effect_type_manager, icon_writer=None):
         self.config_manager = config_manager
         self.effect_type_manager = effect_type_manager
+        self._rarity_prices = None
+        self._icon_writer = icon_writer
 
     def parse_gen_trinket_buffs(self, LLM_buffs_dict_string, LLM_trinket_name):
         modded_json_filepath = self.config_manager.get_file_path('mod_output', 'mod_output_trinket_buffs')
+        buff_list = self.build_buffs(ast.literal_eval(LLM_buffs_dict_string), LLM_trinket_name)
+        self._append_entries_to_json(buff_list, modded_json_filepath, "buffs")
+        return [e["id"] for e in buff_list]
+
+    def build_buffs(self, LLM_buffs_dict, LLM_trinket_name):
         buff_list = []
-        LLM_buffs_dict = ast.literal_eval(LLM_buffs_dict_string)
-        
         for i, (LLM_buff, value) in enumerate(LLM_buffs_dict.items(), 1):
-            buff = self._create_buff(LLM_buff, value, LLM_trinket_name, i)
+            LLM_buff, condition = self.effect_type_manager.split_condition(LLM_buff)
+            buff = self._create_buff(LLM_buff, value, LLM_trinket_name, i, condition)
             buff_list.append(buff)
             
             if LLM_buff == 'Damage':
@@ -54,20 +208,20 @@ class TrinketProcessor:
                 buff2['id'] = f"TRINKET_{LLM_trinket_name.replace(' ', '_').replace("'", '').lower()}_BUFF{i+1}"
                 buff2['stat_sub_type'] = "damage_high"
                 buff_list.append(buff2)
+        return buff_list
 
-        self._append_entries_to_json(buff_list, modded_json_filepath, "buffs")
-        return [e["id"] for e in buff_list]
-
-    def _create_buff(self, LLM_buff, value, LLM_trinket_name, index):
+    def _create_buff(self, LLM_buff, value, LLM_trinket_name, index, condition=None):
+        stat_type, stat_sub_type = self.effect_type_manager.get_buff_key(LLM_buff)
+        rule_type, rule_data = self.effect_type_manager.get_rule(LLM_buff, condition)
         buff = {
             'id': f"TRINKET_{LLM_trinket_name.replace(' ', '_')}_BUFF{index}",
-            'stat_type': self.effect_type_manager.get_effect_entry(LLM_buff, 'stat_type'),
-            'stat_sub_type': "damage_low" if LLM_buff == 'Damage' else self.effect_type_manager.get_effect_entry(LLM_buff, 'stat_subtype'),
+            'stat_type': stat_type,
+            'stat_sub_type': stat_sub_type,
             'amount': self._calculate_amount(LLM_buff, value),
             'remove_if_not_active': False,
-            'rule_type': "always",
+            'rule_type': rule_type,
             'is_false_rule': False,
-            'rule_data': {"float": 0, "string": ""}
+            'rule_data': rule_data
         }
         return buff
 
@@ -108,24 +262,8 @@ class TrinketProcessor:
 
     def parse_gen_trinket_entry(self, trinket_name, trinket_class, trinket_rarity, trinket_buffs):
         modded_entries_filepath = self.config_manager.get_file_path('mod_output', 'mod_output_trinket_entries')
-        trinket_properties_filepath = self.config_manager.get_file_path('mod_resources', 'trinket_properties_json')
-        
-        with open(trinket_properties_filepath, 'r') as file:
-            properties = json.load(file)
-        
-        rarities_dict = properties["rarity"]
-        
-        # Check if the rarity exists in vanilla rarities
-        try:
-            vanilla_rarities_path = self.config_manager.get_file_path('mod_resources', 'vanilla_rarities_trinkets_json')
-            with open(vanilla_rarities_path, 'r') as file:
-                vanilla_rarities = json.load(file)
-            
-            if not any(rarity['id'] == trinket_rarity for rarity in vanilla_rarities['rarities']):
-                self._add_new_rarity(trinket_rarity)
-                self._add_rarity_string(trinket_rarity)
-        except (KeyError, FileNotFoundError):
-            # If the vanilla rarities file is not specified or not found, always add the new rarity
+
+        if not self.is_vanilla_rarity(trinket_rarity):
             self._add_new_rarity(trinket_rarity)
             self._add_rarity_string(trinket_rarity)
         
@@ -133,7 +271,18 @@ class TrinketProcessor:
         if trinket_rarity.lower() == "stochastic":
             self._copy_stochastic_rarity_image()
         
-        trinket_entry = {
+        trinket_entry = self.build_entry(trinket_name, trinket_class, trinket_rarity, trinket_buffs)
+        self._append_entries_to_json([trinket_entry], modded_entries_filepath, "entries")
+
+    def build_entry(self, trinket_name, trinket_class, trinket_rarity, trinket_buffs):
+        if self._rarity_prices is None:
+            trinket_properties_filepath = self.config_manager.get_file_path('mod_resources', 'trinket_properties_json')
+            with open(trinket_properties_filepath, 'r') as file:
+                self._rarity_prices = json.load(file)["rarity"]
+        
+        rarities_dict = self._rarity_prices
+        
+        return {
             "id": trinket_name.replace(" ", "_").replace("'", "").lower(),
             "buffs": trinket_buffs,
             "hero_class_requirements": [] if trinket_class == 'every_class' else [trinket_class],
@@ -142,8 +291,17 @@ class TrinketProcessor:
             "limit": 1,
             "origin_dungeon": ""
         }
-        
-        self._append_entries_to_json([trinket_entry], modded_entries_filepath, "entries")
+
+    def is_vanilla_rarity(self, trinket_rarity):
+        # Check if the rarity exists in vanilla rarities
+        try:
+            vanilla_rarities_path = self.config_manager.get_file_path('mod_resources', 'vanilla_rarities_trinkets_json')
+            with open(vanilla_rarities_path, 'r') as file:
+                vanilla_rarities = json.load(file)
+            return any(rarity['id'] == trinket_rarity for rarity in vanilla_rarities['rarities'])
+        except (KeyError, FileNotFoundError):
+            # If the vanilla rarities file is not specified or not found, always add the new rarity
+            return False
 
     def _add_new_rarity(self, rarity):
         modded_rarities_path = self.config_manager.get_file_path('mod_output', 'mod_output_trinket_rarities')
@@ -171,10 +329,7 @@ class TrinketProcessor:
     def _add_rarity_color(self, rarity_id):
         colors_file_path = self.config_manager.get_file_path('mod_output', 'mod_output_colors')
         
-        # Read the color from config.json
-        color = self.config_manager.config['trinket_settings']['color']
-        
-        color_line = f'colour: .id "{rarity_id}"           .rgba {color}\n'
+        color_line = self.get_color_line(rarity_id)
 
         if not os.path.exists(colors_file_path):
             # Create the file and add the color line
@@ -190,24 +345,33 @@ class TrinketProcessor:
                 with open(colors_file_path, 'a') as file:
                     file.write(color_line)
 
+    def get_color_line(self, rarity_id):
+        # Read the color from config.json
+        color = self.config_manager.config['trinket_settings']['color']
+        return f'colour: .id "{rarity_id}"           .rgba {color}\n'
+
     def _add_rarity_string(self, rarity):
         string_file_manager = StringFileManager(self.config_manager)
         rarity_id = rarity.replace(" ", "_").lower()
         string_file_manager.generate_string_file(rarity_id, rarity.title(), is_rarity=True)
 
-    def _copy_stochastic_rarity_image(self):
+    def _copy_stochastic_rarity_image(self, destination_folder=None):
         source_path = self.config_manager.get_file_path('mod_resources', 'iridescent_frame')
-        destination_folder = self.config_manager.get_file_path('mod_output', 'mod_output_trinket_images')
+        destination_folder = destination_folder or self.config_manager.get_file_path('mod_output', 'mod_output_trinket_images')
         destination_path = os.path.join(destination_folder, "rarity_stochastic.png")
 
-        # Create the destination folder if it doesn't exist
-        os.makedirs(destination_folder, exist_ok=True)
-
-        # Copy the file
-        shutil.copy2(source_path, destination_path)
-        print(f"Copied stochastic rarity image to: {destination_path}")
+        # Re-encode the frame with the icon settings instead of copying it byte for byte.
+        # The write is synchronous, so the writer never starts its thread pool.
+        if self._icon_writer is None:
+            self._icon_writer = IconWriter(self.config_manager.config.get('icon_settings'))
+        with Image.open(source_path) as frame:
+            size = self._icon_writer.write(frame, destination_path)
+        print(f"Wrote stochastic rarity image to: {destination_path} ({size} bytes, source {os.path.getsize(source_path)} bytes)")
 
 class StringFileManager:
+    LANGUAGES = ["english", "french", "german", "spanish", "brazilian", "russian", 
+                 "polish", "czech", "italian", "schinese", "koreanb", "koreana", "japanese"]
+
     def __init__(self, config_manager):
         self.config_manager = config_manager
 
@@ -222,33 +386,49 @@ class StringFileManager:
         for language in root.findall('language'):
             lang_id = language.get('id')
             
-            if is_rarity:
-                entry_id = f"trinket_rarity_{entry_id}"
-            else:
-                entry_id = f"str_inventory_title_trinket{entry_id}"
+            string_id = self.get_string_id(entry_id, is_rarity)
 
             # Check if the entry already exists
-            existing_entry = language.find(f".//entry[@id='{entry_id}']")
+            existing_entry = language.find(f".//entry[@id='{string_id}']")
             if existing_entry is not None:
                 existing_entry.text = self._translate(entry_text, lang_id)
                 continue
 
-            new_entry = ET.Element("entry", id=entry_id)
+            new_entry = ET.Element("entry", id=string_id)
             new_entry.text = self._translate(entry_text, lang_id)
             language.append(new_entry)
 
         self._write_xml_to_file(root, output_file_path)
 
-    def _translate(self, text, lang_id):
-        # Implement translation logic here
-        # For now, we'll just return the original text
-        return text
+    @staticmethod
+    def get_string_id(entry_id, is_rarity=False):
+        if is_rarity:
+            return f"trinket_rarity_{entry_id}"
+        return f"str_inventory_title_trinket{entry_id}"
+
+    def write_string_table(self, entries, file_path, translations=None):
+        # Stream a whole string table in the same layout as _write_xml_to_file.
+        # entries is a list of (entry_id, entry_text, is_rarity) tuples, and translations
+        # maps each language id to {entry_text: translation}, e.g. from TrinketTranslator.translate_all.
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<root>\n')
+            for lang_id in self.LANGUAGES:
+                f.write(f'  <language id="{lang_id}">\n')
+                for entry_id, entry_text, is_rarity in entries:
+                    text = self._translate(entry_text, lang_id, translations).replace(']]>', ']]]]><![CDATA[>')
+                    f.write(f'    <entry id="{self.get_string_id(entry_id, is_rarity)}"><![CDATA[{text}]]></entry>\n')
+                f.write('  </language>\n')
+            f.write('</root>\n')
+
+    def _translate(self, text, lang_id, translations=None):
+        # Names without a translation stay in English
+        if not translations:
+            return text
+        return translations.get(lang_id, {}).get(text, text)
 
     def _create_new_xml_structure(self):
         root = ET.Element("root")
-        languages = ["english", "french", "german", "spanish", "brazilian", "russian", 
-                     "polish", "czech", "italian", "schinese", "koreanb", "koreana", "japanese"]
-        for lang in languages:
+        for lang in self.LANGUAGES:
             ET.SubElement(root, "language", id=lang)
         return root
 
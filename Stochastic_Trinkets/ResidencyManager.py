@@ -0,0 +1,253 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+import torch
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MB = 1024 * 1024
+
+def get_rss():
+    """
+    Get the resident set size of this process.
+
+    Returns:
+        int: RSS in bytes, or 0 if it cannot be measured on this platform.
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+def get_total_memory():
+    """
+    Get the physical memory of this machine.
+
+    Returns:
+        int: Total memory in bytes, or 0 if it cannot be measured on this platform.
+    """
+    if psutil is not None:
+        return psutil.virtual_memory().total
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, AttributeError):
+        return 0
+
+class MemorySampler:
+    """
+    A background thread that tracks the peak RSS of this process while it runs.
+
+    The peak reported by the OS only ever grows over the lifetime of the
+    process, so phases are measured by sampling instead.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = get_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, get_rss())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, get_rss())
+
+class ResidencyManager:
+    """
+    A class for coordinating the memory used by the LLM and diffusion stages.
+
+    Work is grouped into phases: all text generation for a batch of trinkets,
+    then all of its images. Before each phase the manager compares the
+    measured footprints of both stages with the configured memory budget. When
+    both fit they stay resident, and the role models are kept loaded for the
+    whole text phase instead of being unloaded after every reply. When they do
+    not fit, the stage that is not needed is released first: the diffusion
+    pipeline is offloaded to system memory before a text phase, and the role
+    models are unloaded from Ollama before an image phase.
+
+    On CPU the pipeline already lives in system memory, and reloading it from
+    the checkpoint costs far more than the memory it frees, so with the 'auto'
+    policy it is only unloaded when the measured RSS plus the LLM footprint
+    would exceed the budget.
+    """
+
+    def __init__(self, residency_settings, image_generator, ai_manager):
+        """
+        Initialize the ResidencyManager.
+
+        Args:
+            residency_settings (dict): The 'residency_settings' section of the config.
+            image_generator (TrinketImageGenerator): Owner of the diffusion pipeline.
+            ai_manager (AIModelManager): Owner of the Ollama role models.
+        """
+        self.settings = residency_settings
+        self.image_generator = image_generator
+        self.ai_manager = ai_manager
+        self.batch_size = max(1, int(residency_settings.get('phase_batch_size', 8)))
+        self.policy = residency_settings.get('diffusion_policy', 'auto')
+        if self.policy not in ('auto', 'resident', 'offload', 'unload'):
+            raise ValueError(f"Unrecognized diffusion policy: {self.policy}. Expected 'auto', 'resident', 'offload' or 'unload'.")
+
+        self.on_accelerator = image_generator.device != 'cpu'
+        self.budget = int(residency_settings.get('memory_budget_mb', 0)) * MB or self._detect_budget()
+        # Estimates until each stage has been measured once
+        self.footprints = {
+            'llm': int(residency_settings.get('llm_footprint_mb', 6000)) * MB,
+            'diffusion': int(residency_settings.get('diffusion_footprint_mb', 4000)) * MB,
+        }
+        # The keep-alive of the role models during a text phase; None keeps the AIModelManager's own setting
+        self.llm_keep_alive = residency_settings.get('llm_keep_alive')
+        self.phases = []
+
+    def _detect_budget(self):
+        # Both stages compete for VRAM when the pipeline runs on the GPU, and for RAM otherwise
+        if self.image_generator.device == 'cuda':
+            return torch.cuda.get_device_properties(0).total_memory
+        return get_total_memory()
+
+    def both_fit(self):
+        """
+        Check whether the LLM and diffusion stages fit in the budget together.
+
+        Returns:
+            bool: True if both can stay resident, or if the budget is unknown.
+        """
+        if self.policy == 'resident' or not self.budget:
+            return True
+        return self.footprints['llm'] + self.footprints['diffusion'] <= self.budget * self._headroom()
+
+    def rss_fits_llm(self):
+        """
+        Check whether the LLM fits next to this process at its current, measured RSS.
+
+        Returns:
+            bool: True if the RSS plus the LLM footprint stays within the budget, or if the budget is unknown.
+        """
+        if not self.budget:
+            return True
+        return get_rss() + self.footprints['llm'] <= self.budget * self._headroom()
+
+    def _headroom(self):
+        return float(self.settings.get('headroom', 0.9))
+
+    @contextmanager
+    def text_phase(self):
+        """
+        Run a block of LLM work, releasing the diffusion pipeline first if both stages do not fit.
+        """
+        actions = []
+        if self.image_generator.pipe is not None:
+            if self.policy == 'auto' and not self.on_accelerator:
+                if not self.rss_fits_llm():
+                    self.image_generator.unload_pipeline()
+                    actions.append('unloaded diffusion')
+            elif not self.both_fit():
+                if self.policy == 'unload':
+                    self.image_generator.unload_pipeline()
+                    actions.append('unloaded diffusion')
+                else:
+                    self.image_generator.offload_pipeline()
+                    actions.append('offloaded diffusion')
+
+        previous_keep_alive = self.ai_manager.keep_alive
+        if self.llm_keep_alive is not None:
+            self.ai_manager.keep_alive = self.llm_keep_alive
+        try:
+            with self._measure('text', actions):
+                yield
+        finally:
+            self.ai_manager.keep_alive = previous_keep_alive
+        self._measure_llm()
+
+    @contextmanager
+    def image_phase(self):
+        """
+        Run a block of image generation, unloading the role models first if both stages do not fit.
+        """
+        actions = []
+        if not self.both_fit():
+            self.ai_manager.unload_models()
+            actions.append('unloaded LLM')
+
+        with self._measure('image', actions) as phase:
+            first_load = self.image_generator.pipe is None
+            before = self._diffusion_usage()
+            self.image_generator.load_pipeline()
+            if first_load:
+                self.footprints['diffusion'] = max(self._diffusion_usage() - before, 0) or self.footprints['diffusion']
+                actions.append('loaded diffusion')
+            yield phase
+
+    def _diffusion_usage(self):
+        if self.image_generator.device == 'cuda':
+            return torch.cuda.memory_allocated()
+        return get_rss()
+
+    def _measure_llm(self):
+        footprint = self.ai_manager.get_loaded_footprint()
+        measured = footprint['size_vram'] if self.on_accelerator else footprint['size'] - footprint['size_vram']
+        if measured:
+            self.footprints['llm'] = measured
+
+    @contextmanager
+    def _measure(self, name, actions):
+        if self.image_generator.device == 'cuda':
+            torch.cuda.reset_peak_memory_stats()
+        stats = {'phase': name, 'actions': actions, 'rss_start': get_rss()}
+        start = time.perf_counter()
+        with MemorySampler(float(self.settings.get('sample_interval', 0.05))) as sampler:
+            try:
+                yield stats
+            finally:
+                stats['duration'] = time.perf_counter() - start
+        stats['rss_end'] = get_rss()
+        stats['rss_peak'] = sampler.peak
+        if self.image_generator.device == 'cuda':
+            stats['gpu_peak'] = torch.cuda.max_memory_allocated()
+        self.phases.append(stats)
+
+    def get_stats(self):
+        """
+        Summarize the recorded phases.
+
+        Returns:
+            dict: Per phase name, the number of phases, total duration and peak memory in bytes.
+        """
+        summary = {}
+        for stats in self.phases:
+            phase = summary.setdefault(stats['phase'], {'count': 0, 'duration': 0.0, 'rss_peak': 0, 'gpu_peak': 0})
+            phase['count'] += 1
+            phase['duration'] += stats['duration']
+            phase['rss_peak'] = max(phase['rss_peak'], stats['rss_peak'])
+            phase['gpu_peak'] = max(phase['gpu_peak'], stats.get('gpu_peak', 0))
+        return summary
+
+    def print_stats(self):
+        """
+        Print the memory and time of every phase and the measured stage footprints.
+        """
+        print(f"\nMemory budget {self.budget / MB:.0f} MB, measured footprints: "
+              f"LLM {self.footprints['llm'] / MB:.0f} MB, diffusion {self.footprints['diffusion'] / MB:.0f} MB")
+        print(f"{'phase':<8}{'time (s)':>10}{'RSS start':>11}{'RSS end':>10}{'RSS peak':>10}{'GPU peak':>10}  actions")
+        for stats in self.phases:
+            gpu_peak = f"{stats['gpu_peak'] / MB:.0f}" if 'gpu_peak' in stats else "-"
+            print(f"{stats['phase']:<8}{stats['duration']:>10.1f}{stats['rss_start'] / MB:>11.0f}{stats['rss_end'] / MB:>10.0f}"
+                  f"{stats['rss_peak'] / MB:>10.0f}{gpu_peak:>10}  {', '.join(stats['actions']) or '-'}")
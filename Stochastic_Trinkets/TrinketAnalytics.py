@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import argparse
+from collections import Counter
+import numpy as np
+from GenerateTrinketProperties import TrinketDataLoader
+from TrinketCatalog import TrinketCatalog
+
+VANILLA, GENERATED = 0, 1
+
+# Effects whose positive buff amounts hurt the hero; their contribution to the power score is negated.
+# Death Blow is not listed: its stat is written to the game as a negative deathblow resist amount
+# (TrinketProcessor._calculate_amount), and get_amount_scale already carries that sign.
+HARMFUL_EFFECTS = ('Stress',)
+# Conditional buffs only apply part of the time, so they count for less than 'always' buffs
+CONDITIONAL_WEIGHT = 0.5
+QUANTILES = np.linspace(0, 1, 101)
+
+class TrinketBalanceAnalyzer:
+    """
+    A class for checking the balance of generated trinkets against the vanilla ones.
+
+    Vanilla and generated trinkets are loaded into columnar NumPy arrays: one
+    row per trinket (source, rarity, class) and one row per buff (trinket,
+    effect, condition, value in trinket_effects.json units). Power scores,
+    out-of-bounds counts and distribution distances are then computed over
+    whole columns at once, so the analysis stays fast on large catalogs.
+    """
+
+    def __init__(self, config_path, catalog=None):
+        """
+        Initialize the TrinketBalanceAnalyzer.
+
+        Args:
+            config_path (str): Path to the configuration file.
+            catalog (TrinketCatalog): The catalog of generated trinkets, or None to open the configured one.
+        """
+        self.data_loader = TrinketDataLoader(config_path)
+        self.effect_type_manager = self.data_loader.effect_type_manager
+        self.catalog = catalog or TrinketCatalog(config_path)
+
+        self.effect_bounds = self.data_loader.get_effect_bounds()
+        self.effects = [name for name in self.effect_bounds if not self.effect_type_manager.split_condition(name)[1]]
+        self.effect_index = {name: index for index, name in enumerate(self.effects)}
+        self.rarities, self.classes = [], []
+
+        low, high = np.array([self.effect_bounds[name] for name in self.effects], dtype=float).T
+        self.effect_scale = np.maximum(np.maximum(np.abs(low), np.abs(high)), 1.0)
+        # Scores follow the sign of the buff amount the game applies, so a positive Death Blow stat scores as harmful
+        amount_sign = np.sign([self.effect_type_manager.get_amount_scale(name) for name in self.effects])
+        self.effect_orientation = amount_sign * np.where(np.isin(self.effects, HARMFUL_EFFECTS), -1.0, 1.0)
+
+    def _intern(self, vocabulary, value):
+        try:
+            return vocabulary.index(value)
+        except ValueError:
+            vocabulary.append(value)
+            return len(vocabulary) - 1
+
+    def load(self):
+        """
+        Load the vanilla trinkets and the catalog into columnar arrays.
+
+        Returns:
+            float: The time taken in seconds.
+        """
+        start = time.perf_counter()
+        trinkets = {'slug': [], 'source': [], 'rarity': [], 'class': []}
+        buffs = {'trinket': [], 'effect': [], 'conditional': [], 'value': [], 'sign': [], 'key': []}
+        self.unmapped_vanilla_buffs = 0
+        # Generated stats naming no known effect, e.g. hallucinated or misspelled ones, as (trinket, key) pairs
+        self.unknown_effects = []
+
+        self._load_vanilla(trinkets, buffs)
+        self._load_generated(trinkets, buffs)
+
+        self.trinket_slug = trinkets['slug']
+        self.trinket_source = np.array(trinkets['source'], dtype=np.int8)
+        self.trinket_rarity = np.array(trinkets['rarity'], dtype=np.int32)
+        self.trinket_class = np.array(trinkets['class'], dtype=np.int32)
+
+        self.buff_trinket = np.array(buffs['trinket'], dtype=np.int32)
+        self.buff_effect = np.array(buffs['effect'], dtype=np.int32)
+        self.buff_conditional = np.array(buffs['conditional'], dtype=bool)
+        self.buff_value = np.array(buffs['value'], dtype=float)
+        self.buff_sign = np.array(buffs['sign'], dtype=np.int8)
+        self.buff_key = np.array(buffs['key'], dtype=object)
+        self.buff_source = self.trinket_source[self.buff_trinket]
+        return time.perf_counter() - start
+
+    def _load_vanilla(self, trinkets, buffs):
+        config_manager = self.effect_type_manager.config_manager
+        with open(config_manager.get_file_path('mod_resources', 'vanilla_trinket_buffs_json'), 'r') as file:
+            vanilla_buffs = {buff['id']: buff for buff in json.load(file)['buffs']}
+        with open(config_manager.get_file_path('mod_resources', 'vanilla_trinket_entries_json'), 'r') as file:
+            vanilla_entries = json.load(file)['entries']
+
+        # Damage buffs come in low/high pairs and get_buff_key maps Damage to damage_low, so damage_high is skipped
+        buff_effects = {self.effect_type_manager.get_buff_key(name): name for name in self.effects}
+        scales = {name: self.effect_type_manager.get_amount_scale(name) for name in self.effects}
+
+        for entry in vanilla_entries:
+            trinket = len(trinkets['slug'])
+            classes = entry['hero_class_requirements']
+            trinkets['slug'].append(entry['id'])
+            trinkets['source'].append(VANILLA)
+            trinkets['rarity'].append(self._intern(self.rarities, entry['rarity']))
+            trinkets['class'].append(self._intern(self.classes, classes[0] if classes else 'every_class'))
+
+            for buff_id in entry['buffs']:
+                buff = vanilla_buffs.get(buff_id)
+                effect = buff and buff_effects.get((buff['stat_type'], buff['stat_sub_type']))
+                if effect is None:
+                    self.unmapped_vanilla_buffs += buff is not None and buff['stat_sub_type'] != 'damage_high'
+                    continue
+                value = buff['amount'] * scales[effect]
+                self._add_buff(buffs, trinket, effect, buff['rule_type'] != 'always', value, 1 if value >= 0 else -1, None)
+
+    def _load_generated(self, trinkets, buffs):
+        split_condition = self.effect_type_manager.split_condition
+        for slug, trinket_class, rarity, stats in self.catalog.connection.execute(
+                "SELECT slug, class, rarity, stats FROM trinkets ORDER BY id"):
+            trinket = len(trinkets['slug'])
+            trinkets['slug'].append(slug)
+            trinkets['source'].append(GENERATED)
+            trinkets['rarity'].append(self._intern(self.rarities, rarity))
+            trinkets['class'].append(self._intern(self.classes, trinket_class))
+
+            for key, value in json.loads(stats).items():
+                effect, condition = split_condition(key)
+                if effect not in self.effect_index:
+                    self.unknown_effects.append((trinket, key))
+                    continue
+                text = str(value).strip()
+                try:
+                    number = float(text)
+                except ValueError:
+                    # Sign-only or otherwise malformed values are kept as NaN so they show up as out of bounds
+                    number = np.nan
+                self._add_buff(buffs, trinket, effect, condition is not None, number, -1 if text.startswith('-') else 1, key)
+
+    def _add_buff(self, buffs, trinket, effect, conditional, value, sign, key):
+        buffs['trinket'].append(trinket)
+        buffs['effect'].append(self.effect_index[effect])
+        buffs['conditional'].append(conditional)
+        buffs['value'].append(value)
+        buffs['sign'].append(sign)
+        buffs['key'].append(key)
+
+    def get_buff_bounds(self):
+        """
+        Get the allowed range of every buff row.
+
+        Conditional keys use their widened bounds when conditional effects are
+        enabled, and the range of their base effect otherwise.
+
+        Returns:
+            tuple: Arrays of the lower and upper bound of each buff.
+        """
+        low = np.empty(len(self.buff_value))
+        high = np.empty(len(self.buff_value))
+        base_low, base_high = np.array([self.effect_bounds[name] for name in self.effects], dtype=float).T
+        low[:], high[:] = base_low[self.buff_effect], base_high[self.buff_effect]
+
+        conditional = np.flatnonzero(self.buff_conditional & (self.buff_source == GENERATED))
+        if len(conditional):
+            keys, inverse = np.unique(self.buff_key[conditional].astype(str), return_inverse=True)
+            key_bounds = np.array([self.effect_bounds.get(key, (np.nan, np.nan)) for key in keys], dtype=float)
+            known = ~np.isnan(key_bounds[inverse, 0])
+            low[conditional[known]] = key_bounds[inverse[known], 0]
+            high[conditional[known]] = key_bounds[inverse[known], 1]
+        return low, high
+
+    def get_out_of_bounds(self):
+        """
+        Find the generated buffs whose value is outside the allowed range or is not a number.
+
+        Returns:
+            numpy.ndarray: Boolean mask over the buff rows.
+        """
+        low, high = self.get_buff_bounds()
+        with np.errstate(invalid='ignore'):
+            outside = (self.buff_value < low) | (self.buff_value > high) | np.isnan(self.buff_value)
+        return outside & (self.buff_source == GENERATED)
+
+    def get_power_scores(self):
+        """
+        Compute a power score for every trinket.
+
+        Each buff contributes its value relative to the widest bound of its
+        effect, negated for harmful effects and weighted down when conditional.
+
+        Returns:
+            numpy.ndarray: The power score of each trinket.
+        """
+        value = np.nan_to_num(self.buff_value)
+        contribution = (value / self.effect_scale[self.buff_effect] * self.effect_orientation[self.buff_effect]
+                        * np.where(self.buff_conditional, CONDITIONAL_WEIGHT, 1.0))
+        return np.bincount(self.buff_trinket, weights=contribution, minlength=len(self.trinket_slug))
+
+    @staticmethod
+    def distribution_distances(sample, reference):
+        """
+        Compare two score distributions.
+
+        Args:
+            sample (numpy.ndarray): Scores of the generated trinkets.
+            reference (numpy.ndarray): Scores of the vanilla trinkets.
+
+        Returns:
+            tuple: The Wasserstein-1 distance and the Kolmogorov-Smirnov statistic.
+        """
+        if not len(sample) or not len(reference):
+            return np.nan, np.nan
+        wasserstein = np.mean(np.abs(np.quantile(sample, QUANTILES) - np.quantile(reference, QUANTILES)))
+        sample, reference = np.sort(sample), np.sort(reference)
+        points = np.concatenate([sample, reference])
+        sample_cdf = np.searchsorted(sample, points, side='right') / len(sample)
+        reference_cdf = np.searchsorted(reference, points, side='right') / len(reference)
+        return wasserstein, np.max(np.abs(sample_cdf - reference_cdf))
+
+    def analyze(self):
+        """
+        Compute the balance report over the loaded arrays.
+
+        Returns:
+            dict: Per-rarity and per-class power statistics, out-of-bounds counts per effect and effect usage distance.
+        """
+        power = self.get_power_scores()
+        vanilla = self.trinket_source == VANILLA
+        generated = ~vanilla
+        shop_rarities = [self.rarities.index(r) for r in self.data_loader.get_trinket_rarities() if r in self.rarities]
+        shop_vanilla = vanilla & np.isin(self.trinket_rarity, shop_rarities)
+
+        rarities = []
+        for rarity in np.unique(self.trinket_rarity[generated]):
+            sample = power[generated & (self.trinket_rarity == rarity)]
+            reference = power[vanilla & (self.trinket_rarity == rarity)]
+            reference_name = self.rarities[rarity]
+            if not len(reference):
+                reference, reference_name = power[shop_vanilla], "vanilla shop rarities"
+            wasserstein, ks = self.distribution_distances(sample, reference)
+            rarities.append({
+                'rarity': self.rarities[rarity], 'count': len(sample), 'reference': reference_name,
+                'mean': sample.mean(), 'median': np.median(sample), 'reference_mean': reference.mean(),
+                'reference_median': np.median(reference), 'wasserstein': wasserstein, 'ks': ks,
+            })
+
+        class_counts = np.bincount(self.trinket_class[generated], minlength=len(self.classes))
+        class_power = np.bincount(self.trinket_class[generated], weights=power[generated], minlength=len(self.classes))
+        classes = [{'class': self.classes[c], 'count': int(class_counts[c]), 'mean': class_power[c] / class_counts[c]}
+                   for c in np.flatnonzero(class_counts)]
+
+        out_of_bounds = self.get_out_of_bounds()
+        oob_counts = np.bincount(self.buff_effect[out_of_bounds], minlength=len(self.effects))
+        oob_trinkets = np.unique(self.buff_trinket[out_of_bounds])
+        unknown_trinkets = np.unique([trinket for trinket, _ in self.unknown_effects]).astype(np.int32)
+
+        usage = [np.bincount(self.buff_effect[self.buff_source == source], minlength=len(self.effects)).astype(float)
+                 for source in (VANILLA, GENERATED)]
+        usage = [counts / counts.sum() if counts.sum() else counts for counts in usage]
+
+        return {
+            'vanilla_trinkets': int(vanilla.sum()),
+            'generated_trinkets': int(generated.sum()),
+            'unmapped_vanilla_buffs': self.unmapped_vanilla_buffs,
+            'rarities': rarities,
+            'classes': classes,
+            'out_of_bounds': {self.effects[e]: int(oob_counts[e]) for e in np.flatnonzero(oob_counts)},
+            'out_of_bounds_trinkets': len(oob_trinkets),
+            'unknown_effects': dict(Counter(key for _, key in self.unknown_effects)),
+            'unknown_effect_trinkets': len(unknown_trinkets),
+            'invalid_trinkets': len(np.union1d(oob_trinkets, unknown_trinkets)),
+            'effect_usage_distance': 0.5 * np.abs(usage[0] - usage[1]).sum(),
+        }
+
+    def fix_out_of_bounds(self, dry_run=False):
+        """
+        Clamp every out-of-bounds generated stat into its allowed range and update the catalog.
+
+        Values that are not numbers, e.g. a bare '+', are replaced by half of
+        the bound on the side of their sign, clamped into the allowed range for
+        effects whose range does not include zero (e.g. Protection 5..25).
+        Unknown effects cannot be clamped and are left for the report.
+
+        Args:
+            dry_run (bool): Only report the changes without writing them.
+
+        Returns:
+            dict: The fixed stats of each changed trinket, keyed by trinket id.
+        """
+        out_of_bounds = self.get_out_of_bounds()
+        low, high = self.get_buff_bounds()
+        fallback = np.clip(np.where(self.buff_sign < 0, low / 2, high / 2), low, high)
+        fixed_values = np.rint(np.where(np.isnan(self.buff_value), fallback, np.clip(self.buff_value, low, high)))
+        # Stats are written as integers, so rounding must not step over a fractional bound
+        fixed_values = np.clip(fixed_values, np.ceil(low), np.floor(high))
+
+        fixes = {}
+        for row in np.flatnonzero(out_of_bounds):
+            slug = self.trinket_slug[self.buff_trinket[row]]
+            fixes.setdefault(slug, {})[self.buff_key[row]] = f"{int(fixed_values[row]):+d}"
+
+        if not dry_run:
+            for slug, stats in fixes.items():
+                trinket = self.catalog.get_trinket(slug)
+                trinket['stats'].update(stats)
+                self.catalog.add_trinket(trinket, trinket.pop('image_path'), replace=True)
+            self.buff_value[out_of_bounds] = fixed_values[out_of_bounds]
+        return fixes
+
+def print_report(report, elapsed):
+    print(f"Analysed {report['vanilla_trinkets']} vanilla and {report['generated_trinkets']} generated trinkets "
+          f"in {elapsed * 1000:.0f} ms ({report['unmapped_vanilla_buffs']} vanilla buffs have no matching effect).")
+
+    print("\nPower score per rarity (generated vs vanilla):")
+    print(f"  {'rarity':<14}{'count':>7}{'mean':>8}{'median':>8}{'ref mean':>10}{'ref median':>12}{'W1':>7}{'KS':>6}  reference")
+    for row in report['rarities']:
+        print(f"  {row['rarity']:<14}{row['count']:>7}{row['mean']:>8.2f}{row['median']:>8.2f}{row['reference_mean']:>10.2f}"
+              f"{row['reference_median']:>12.2f}{row['wasserstein']:>7.2f}{row['ks']:>6.2f}  {row['reference']}")
+
+    print("\nMean power score per class:")
+    for row in report['classes']:
+        print(f"  {row['class']:<16}{row['count']:>7}{row['mean']:>8.2f}")
+
+    print(f"\nEffect usage distance to vanilla (total variation): {report['effect_usage_distance']:.3f}")
+    print(f"Out-of-bounds stats: {sum(report['out_of_bounds'].values())} in {report['out_of_bounds_trinkets']} trinkets")
+    for effect, count in sorted(report['out_of_bounds'].items(), key=lambda item: -item[1]):
+        print(f"  {effect:<24}{count:>6}")
+    print(f"Unknown effects: {sum(report['unknown_effects'].values())} in {report['unknown_effect_trinkets']} trinkets")
+    for effect, count in sorted(report['unknown_effects'].items(), key=lambda item: -item[1]):
+        print(f"  {effect:<24}{count:>6}")
+    print(f"Invalid trinkets: {report['invalid_trinkets']} of {report['generated_trinkets']}")
+
+def main():
+    """
+    Main function to report on the balance of the catalog, or fix its out-of-bounds stats.
+    """
+    parser = argparse.ArgumentParser(description="Analyse the balance of generated trinkets against the vanilla ones")
+    parser.add_argument("action", choices=["report", "fix"], help="Print the balance report, or clamp out-of-bounds stats")
+    parser.add_argument("--dry-run", action="store_true", help="With 'fix', only list the stats that would change")
+    parser.add_argument("--export", action="store_true", help="With 'fix', regenerate the mod files afterwards")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    analyzer = TrinketBalanceAnalyzer(os.path.join(script_dir, 'config.json'))
+
+    start = time.perf_counter()
+    analyzer.load()
+    if args.action == 'report':
+        report = analyzer.analyze()
+        print_report(report, time.perf_counter() - start)
+    else:
+        fixes = analyzer.fix_out_of_bounds(dry_run=args.dry_run)
+        for slug, stats in fixes.items():
+            print(f"{slug}: {stats}")
+        print(f"{'Would fix' if args.dry_run else 'Fixed'} {len(fixes)} trinkets in {time.perf_counter() - start:.2f}s.")
+        if fixes and args.export and not args.dry_run:
+            analyzer.catalog.export_mod_files()
+    analyzer.catalog.close()
+
+if __name__ == "__main__":
+    main()
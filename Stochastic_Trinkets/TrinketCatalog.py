@@ -0,0 +1,322 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+from ParseTrinketFiles import ConfigManager, EffectTypeManager, TrinketProcessor, StringFileManager
+from TrinketLocalization import TrinketTranslator
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trinkets (
+    id INTEGER PRIMARY KEY,
+    slug TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    class TEXT NOT NULL,
+    rarity TEXT NOT NULL,
+    stats TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    image_path TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trinkets_rarity ON trinkets (rarity);
+CREATE INDEX IF NOT EXISTS trinkets_class ON trinkets (class);
+CREATE TABLE IF NOT EXISTS buffs (
+    trinket_id INTEGER NOT NULL REFERENCES trinkets (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    buff_id TEXT NOT NULL,
+    buff TEXT NOT NULL,
+    PRIMARY KEY (trinket_id, position)
+) WITHOUT ROWID;
+"""
+
+class TrinketCatalog:
+    """
+    A class for storing generated trinkets in an embedded SQLite catalog.
+
+    The catalog is the source of truth for everything that has been generated:
+    name, class, rarity, stats, buffs, entry and image path of each trinket.
+    The game files in the mod output folder are regenerated from it in bulk
+    by export_mod_files, instead of being rewritten on every append.
+    """
+
+    def __init__(self, config_path, catalog_path=None, ai_manager=None):
+        """
+        Initialize the TrinketCatalog and create its tables if needed.
+
+        Args:
+            config_path (str): Path to the configuration file.
+            catalog_path (str): Path of the SQLite database, or None for the configured one.
+            ai_manager (AIModelManager): Used to translate new names on export. Without it,
+                only translations that are already cached are written.
+        """
+        self.config_manager = ConfigManager(config_path)
+        self.effect_type_manager = EffectTypeManager(self.config_manager)
+        self.trinket_processor = TrinketProcessor(self.config_manager, self.effect_type_manager)
+        self.string_file_manager = StringFileManager(self.config_manager)
+        self.translator = TrinketTranslator.from_config(self.config_manager, ai_manager)
+        self._output_dir = None
+
+        self.catalog_path = catalog_path or self.config_manager.get_file_path('catalog', 'catalog_db')
+        self.connection = sqlite3.connect(self.catalog_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    @staticmethod
+    def get_slug(trinket_name):
+        """
+        Get the trinket id used by the game files for a trinket name.
+
+        Args:
+            trinket_name (str): The name of the trinket.
+
+        Returns:
+            str: The trinket id, e.g. 'crow_wingfeather'.
+        """
+        return trinket_name.replace(" ", "_").replace("'", "").lower()
+
+    def add_trinket(self, trinket_properties, image_path=None, replace=False):
+        """
+        Record a generated trinket, its buffs and its entry in a single transaction.
+
+        A trinket with the same id replaces the previous one. Unless the
+        replacement is intended, e.g. when fixing a trinket's stats, this
+        prints a warning, since it usually means the namer repeated a name.
+
+        Args:
+            trinket_properties (dict): The generated properties ('name', 'class', 'rarity', 'stats').
+            image_path (str): Path of the trinket's icon, if one was generated.
+            replace (bool): Whether the trinket is meant to replace an existing one.
+
+        Returns:
+            list: The ids of the trinket's buffs.
+        """
+        name = trinket_properties['name']
+        buffs = self.trinket_processor.build_buffs(trinket_properties['stats'], name)
+        buff_ids = [buff['id'] for buff in buffs]
+        entry = self.trinket_processor.build_entry(name, trinket_properties['class'], trinket_properties['rarity'], buff_ids)
+
+        with self.connection:
+            if not replace:
+                previous = self.connection.execute(
+                    "SELECT name, class, rarity FROM trinkets WHERE slug = ?", (entry['id'],)).fetchone()
+                if previous:
+                    print(f"Warning: {name} replaces the earlier trinket {previous[0]} ({previous[2]}, {previous[1]}) "
+                          f"with the same id '{entry['id']}'.")
+            trinket_id = self.connection.execute(
+                "INSERT INTO trinkets (slug, name, class, rarity, stats, entry, image_path, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (slug) DO UPDATE SET name = excluded.name, class = excluded.class, rarity = excluded.rarity, "
+                "stats = excluded.stats, entry = excluded.entry, image_path = excluded.image_path, created_at = excluded.created_at "
+                "RETURNING id",
+                (entry['id'], name, trinket_properties['class'], trinket_properties['rarity'],
+                 json.dumps(trinket_properties['stats']), json.dumps(entry), image_path, time.time())
+            ).fetchone()[0]
+            self.connection.execute("DELETE FROM buffs WHERE trinket_id = ?", (trinket_id,))
+            self.connection.executemany(
+                "INSERT INTO buffs (trinket_id, position, buff_id, buff) VALUES (?, ?, ?, ?)",
+                [(trinket_id, position, buff['id'], json.dumps(buff)) for position, buff in enumerate(buffs)]
+            )
+        return buff_ids
+
+    def get_trinket(self, slug):
+        """
+        Look up a trinket by its id.
+
+        Args:
+            slug (str): The trinket id.
+
+        Returns:
+            dict: The trinket's name, class, rarity, stats and image path, or None.
+        """
+        row = self.connection.execute(
+            "SELECT name, class, rarity, stats, image_path FROM trinkets WHERE slug = ?", (slug,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'name': row[0], 'class': row[1], 'rarity': row[2], 'stats': json.loads(row[3]), 'image_path': row[4]}
+
+    def count(self, rarity=None, trinket_class=None):
+        """
+        Count the trinkets in the catalog.
+
+        Args:
+            rarity (str): Only count trinkets of this rarity.
+            trinket_class (str): Only count trinkets of this hero class.
+
+        Returns:
+            int: The number of matching trinkets.
+        """
+        where, params = self._filter(rarity, trinket_class)
+        return self.connection.execute(f"SELECT COUNT(*) FROM trinkets{where}", params).fetchone()[0]
+
+    @staticmethod
+    def _filter(rarity, trinket_class, prefix=""):
+        clauses, params = [], []
+        if rarity:
+            clauses.append(f"{prefix}rarity = ?")
+            params.append(rarity)
+        if trinket_class:
+            clauses.append(f"{prefix}class = ?")
+            params.append(trinket_class)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def export_mod_files(self, rarity=None, trinket_class=None, output_dir=None):
+        """
+        Regenerate the buffs, entries, rarities, colours and string table files from the catalog.
+
+        Every file is written in one streaming pass over the catalog. With a
+        rarity or class filter only the matching trinkets are exported, e.g.
+        to ship a single rarity. Filtered exports need a separate output
+        folder: written to the live mod folder, they would drop every other
+        generated trinket from the mod.
+
+        Args:
+            rarity (str): Only export trinkets of this rarity.
+            trinket_class (str): Only export trinkets of this hero class.
+            output_dir (str): Folder to write a copy of the mod tree to, icons included,
+                or None for the configured mod output files.
+
+        Returns:
+            int: The number of exported trinkets.
+
+        Raises:
+            ValueError: If a filter is given without an output folder.
+        """
+        if (rarity or trinket_class) and output_dir is None:
+            raise ValueError("Filtered exports would drop the other trinkets from the mod. Pass an output_dir.")
+        self._output_dir = output_dir
+        try:
+            where, params = self._filter(rarity, trinket_class)
+            rarities = [row[0] for row in self.connection.execute(f"SELECT DISTINCT rarity FROM trinkets{where}", params)]
+            new_rarities = [r for r in rarities if not self.trinket_processor.is_vanilla_rarity(r)]
+
+            self._export_buffs(rarity, trinket_class)
+            exported = self._export_entries(where, params)
+            self._export_rarities(new_rarities)
+            self._export_string_table(where, params, new_rarities)
+
+            icon_dir = os.path.dirname(self._output_path('mod_output_trinket_images', 'rarity_stochastic.png'))
+            if output_dir is not None:
+                self._export_icons(where, params, icon_dir)
+            if 'stochastic' in rarities:
+                self.trinket_processor._copy_stochastic_rarity_image(icon_dir)
+        finally:
+            self._output_dir = None
+        return exported
+
+    def _output_path(self, file_name, child=None):
+        # Outside the live mod folder, the mod tree below deploy_settings.mod_root is mirrored into the output folder
+        path = self.config_manager.get_file_path('mod_output', file_name)
+        if child is not None:
+            path = os.path.join(path, child)
+        if self._output_dir is not None:
+            mod_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), self.config_manager.config['deploy_settings']['mod_root'])
+            path = os.path.join(self._output_dir, os.path.relpath(path, mod_root))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def _export_icons(self, where, params, icon_dir):
+        for (image_path,) in self.connection.execute(f"SELECT image_path FROM trinkets{where} ORDER BY id", params):
+            if image_path and os.path.exists(image_path):
+                shutil.copy2(image_path, os.path.join(icon_dir, os.path.basename(image_path)))
+
+    @staticmethod
+    def _write_json_list(file, key, items):
+        # Streams {key: [...]} with one compact JSON item per line; items are already serialized
+        file.write(f'{{\n   "{key}": [')
+        first = True
+        for item in items:
+            file.write("\n      " if first else ",\n      ")
+            file.write(item)
+            first = False
+        file.write("\n   ]\n}" if not first else "]\n}")
+
+    def _export_buffs(self, rarity, trinket_class):
+        # The mod's base.buffs.json replaces the game's, so it starts with all the vanilla buffs
+        vanilla_buffs_path = self.config_manager.get_file_path('mod_resources', 'vanilla_all_buffs_json')
+        with open(vanilla_buffs_path, 'r') as file:
+            vanilla_buffs = json.load(file)['buffs']
+
+        where, params = self._filter(rarity, trinket_class, prefix="t.")
+        cursor = self.connection.execute(
+            f"SELECT b.buff FROM buffs b JOIN trinkets t ON t.id = b.trinket_id{where} ORDER BY t.id, b.position", params)
+
+        def buffs():
+            for buff in vanilla_buffs:
+                yield json.dumps(buff)
+            for (buff,) in cursor:
+                yield buff
+
+        with open(self._output_path('mod_output_trinket_buffs'), 'w') as file:
+            self._write_json_list(file, "buffs", buffs())
+
+    def _export_entries(self, where, params):
+        cursor = self.connection.execute(f"SELECT entry FROM trinkets{where} ORDER BY id", params)
+        exported = 0
+
+        def entries():
+            nonlocal exported
+            for (entry,) in cursor:
+                exported += 1
+                yield entry
+
+        with open(self._output_path('mod_output_trinket_entries'), 'w') as file:
+            self._write_json_list(file, "entries", entries())
+        return exported
+
+    def _export_rarities(self, new_rarities):
+        rarities_path = self._output_path('mod_output_trinket_rarities')
+        colors_path = self._output_path('mod_output_colors')
+        for path in (rarities_path, colors_path):
+            if os.path.exists(path):
+                os.remove(path)
+        if not new_rarities:
+            return
+
+        rarity_ids = [rarity.replace(" ", "_").lower() for rarity in new_rarities]
+        with open(rarities_path, 'w') as file:
+            json.dump({"rarities": [{"id": rarity_id, "award_category": "universal"} for rarity_id in rarity_ids]}, file, indent=3)
+        with open(colors_path, 'w') as file:
+            file.writelines(self.trinket_processor.get_color_line(rarity_id) for rarity_id in rarity_ids)
+
+    def _export_string_table(self, where, params, new_rarities):
+        entries = [(slug, name, False) for slug, name in
+                   self.connection.execute(f"SELECT slug, name FROM trinkets{where} ORDER BY id", params)]
+        entries += [(rarity.replace(" ", "_").lower(), rarity.title(), True) for rarity in new_rarities]
+        translations = self.translator.translate_all([text for _, text, _ in entries])
+        self.string_file_manager.write_string_table(entries, self._output_path('mod_output_string_table'), translations)
+
+    def close(self):
+        self.connection.close()
+        self.translator.close()
+
+def main():
+    """
+    Main function to export the catalog to the mod output files, or show its size.
+    """
+    parser = argparse.ArgumentParser(description="Manage the catalog of generated trinkets")
+    parser.add_argument("action", choices=["export", "count"], help="Regenerate the mod files from the catalog, or count its trinkets")
+    parser.add_argument("--rarity", help="Only include trinkets of this rarity")
+    parser.add_argument("--class", dest="trinket_class", help="Only include trinkets of this hero class")
+    parser.add_argument("--output-dir", help="Export a copy of the mod tree to this folder instead of the live mod folder "
+                                             "(required with --rarity or --class)")
+    args = parser.parse_args()
+    if args.action == 'export' and (args.rarity or args.trinket_class) and not args.output_dir:
+        parser.error("filtered exports need --output-dir, or they would drop the other trinkets from the mod")
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    catalog = TrinketCatalog(os.path.join(script_dir, 'config.json'))
+
+    if args.action == 'export':
+        start = time.perf_counter()
+        exported = catalog.export_mod_files(args.rarity, args.trinket_class, args.output_dir)
+        print(f"Exported {exported} trinkets in {time.perf_counter() - start:.2f}s.")
+    else:
+        print(catalog.count(args.rarity, args.trinket_class))
+    catalog.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import os
+import json
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ParseTrinketFiles import StringFileManager
+
+# Target language of each string table language id; koreana and koreanb share a translation
+LANGUAGE_NAMES = {
+    "french": "French", "german": "German", "spanish": "Spanish", "brazilian": "Brazilian Portuguese",
+    "russian": "Russian", "polish": "Polish", "czech": "Czech", "italian": "Italian",
+    "schinese": "Simplified Chinese", "koreanb": "Korean", "koreana": "Korean", "japanese": "Japanese",
+}
+
+class TranslationCache:
+    """
+    A persistent (text, language) cache of translated names.
+
+    The cache lives in its own SQLite file, so deleting the trinket catalog on
+    a reset does not throw away translations that were already paid for.
+    """
+
+    def __init__(self, cache_path):
+        """
+        Initialize the TranslationCache and create its table if needed.
+
+        Args:
+            cache_path (str): Path of the SQLite database.
+        """
+        self.connection = sqlite3.connect(cache_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS translations (text TEXT NOT NULL, language TEXT NOT NULL, "
+            "translation TEXT NOT NULL, PRIMARY KEY (text, language)) WITHOUT ROWID")
+        self._lock = threading.Lock()
+
+    def get_many(self, texts, language):
+        """
+        Look up the cached translations of several texts.
+
+        Args:
+            texts (list): The English texts.
+            language (str): The string table language id.
+
+        Returns:
+            dict: Mapping of the cached texts to their translations.
+        """
+        with self._lock:
+            cursor = self.connection.execute(
+                "SELECT t.text, t.translation FROM translations t JOIN json_each(?) j ON t.text = j.value "
+                "WHERE t.language = ?", (json.dumps(texts), language))
+            return dict(cursor.fetchall())
+
+    def put_many(self, translations, languages):
+        """
+        Store translations for one or more language ids sharing the same target language.
+
+        Args:
+            translations (dict): Mapping of English texts to their translations.
+            languages (list): The string table language ids to store them under.
+        """
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO translations (text, language, translation) VALUES (?, ?, ?)",
+                [(text, language, translation) for language in languages for text, translation in translations.items()])
+
+    def close(self):
+        self.connection.close()
+
+class TrinketTranslator:
+    """
+    A class for translating trinket and rarity names into every string table language.
+
+    Names are translated in batches: each request asks the translator role for
+    up to 'batch_size' names in one target language and must answer with a
+    JSON object mapping every English name to its translation. Replies are
+    validated name by name; names missing from a reply are retried once in a
+    batch of their own and otherwise left in English without being cached, so
+    a later run tries them again. Without an AI manager only the cache is used.
+    """
+
+    MODEL_NAME = 'DD_trinket_translator'
+
+    def __init__(self, cache, ai_manager=None):
+        """
+        Initialize the TrinketTranslator.
+
+        Args:
+            cache (TranslationCache): The persistent translation cache.
+            ai_manager (AIModelManager): Used to translate names missing from the cache, or None.
+        """
+        self.cache = cache
+        self.ai_manager = ai_manager
+        self._system_prompt = None
+
+    @classmethod
+    def from_config(cls, config_manager, ai_manager=None):
+        """
+        Create a TrinketTranslator using the configured cache file.
+
+        Args:
+            config_manager (ConfigManager): The configuration manager.
+            ai_manager (AIModelManager): Used to translate names missing from the cache, or None.
+
+        Returns:
+            TrinketTranslator: The translator.
+        """
+        if not config_manager.config.get('trinket_settings', {}).get('translate_names', True):
+            ai_manager = None
+        cache = TranslationCache(config_manager.get_file_path('catalog', 'translation_cache'))
+        return cls(cache, ai_manager)
+
+    def translate_all(self, texts):
+        """
+        Translate texts into every string table language.
+
+        Args:
+            texts (list): The English texts.
+
+        Returns:
+            dict: Mapping of language ids to {text: translation} dicts. English maps every text to itself,
+                and texts that could not be translated are missing from their language.
+        """
+        texts = list(dict.fromkeys(texts))
+        translations = {language: {} for language in StringFileManager.LANGUAGES}
+        translations['english'] = {text: text for text in texts}
+
+        targets = {}
+        for language, target in LANGUAGE_NAMES.items():
+            targets.setdefault(target, []).append(language)
+
+        work = []
+        for target, languages in targets.items():
+            cached = self.cache.get_many(texts, languages[0])
+            for language in languages:
+                translations[language].update(cached)
+            missing = [text for text in texts if text not in cached]
+            if missing and self.ai_manager is not None:
+                work.append((target, languages, missing))
+
+        if work:
+            workers = max(1, int(self.ai_manager.ollama_settings[self.MODEL_NAME].get('workers', 1)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [(languages, executor.submit(self._translate_missing, target, languages, missing))
+                           for target, languages, missing in work]
+                for languages, future in futures:
+                    translated = future.result()
+                    for language in languages:
+                        translations[language].update(translated)
+        return translations
+
+    def _translate_missing(self, target, languages, texts):
+        batch_size = max(1, int(self.ai_manager.ollama_settings[self.MODEL_NAME].get('batch_size', 40)))
+        translated = {}
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            result = self._translate_batch(target, batch)
+            retry = [text for text in batch if text not in result]
+            if retry:
+                result.update(self._translate_batch(target, retry))
+            self.cache.put_many(result, languages)
+            translated.update(result)
+        missing = len(texts) - len(translated)
+        if missing:
+            print(f"Warning: {missing} names could not be translated into {target}. Keeping them in English.")
+        return translated
+
+    def _translate_batch(self, target, texts):
+        try:
+            response = self.ai_manager.generate_response(
+                self.MODEL_NAME, self._get_system_prompt(), json.dumps({"language": target, "names": texts}))
+        except Exception as e:
+            print(f"Warning: translation request into {target} failed: {e}")
+            return {}
+        return self.parse_reply(response, texts)
+
+    def _get_system_prompt(self):
+        if self._system_prompt is None:
+            # The target language goes in the user message, so one role model serves every language
+            header = (
+                "SYSTEM "
+                "You translate item names from the video game Darkest Dungeon (dark fantasy, lovecraftian). "
+                "The user sends a JSON object with a target 'language' and a list of English 'names'. "
+                "Answer ONLY with a JSON object whose keys are exactly the given English names and whose values "
+                "are their translations into the target language, written in that language's script. "
+                "Keep each translation short and evocative, like the original name, and translate every name."
+            )
+            self._system_prompt = self.ai_manager.create_system_prompt(self.MODEL_NAME, header, "")
+        return self._system_prompt
+
+    @staticmethod
+    def parse_reply(response, texts):
+        """
+        Validate a translation reply.
+
+        Args:
+            response (str): The model's reply, expected to be a JSON object.
+            texts (list): The English names that were requested.
+
+        Returns:
+            dict: The valid translations in the reply, keyed by English name.
+        """
+        try:
+            reply = json.loads(response)
+        except (json.JSONDecodeError, TypeError):
+            return {}
+        if not isinstance(reply, dict):
+            return {}
+
+        valid = {}
+        for text in texts:
+            translation = reply.get(text)
+            if not isinstance(translation, str):
+                continue
+            translation = translation.strip().strip('"')
+            if not translation or '\n' in translation or len(translation) > 3 * len(text) + 20:
+                continue
+            valid[text] = translation
+        return valid
+
+    def close(self):
+        self.cache.close()
+
+def main():
+    """
+    Main function to translate every name in the trinket catalog ahead of the next export.
+    """
+    from GenerateTrinketProperties import TrinketDataLoader, AIModelManager
+    from TrinketCatalog import TrinketCatalog
+
+    parser = argparse.ArgumentParser(description="Translate the names in the trinket catalog into every game language")
+    parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    config_path = os.path.join(script_dir, 'config.json')
+    data_loader = TrinketDataLoader(config_path)
+    catalog = TrinketCatalog(config_path, ai_manager=AIModelManager(data_loader.ollama_settings))
+
+    texts = [name for (name,) in catalog.connection.execute("SELECT name FROM trinkets")]
+    texts += [rarity.title() for (rarity,) in catalog.connection.execute("SELECT DISTINCT rarity FROM trinkets")]
+    translations = catalog.translator.translate_all(texts)
+    for language, translated in translations.items():
+        print(f"{language}: {len(translated)}/{len(set(texts))} names translated")
+    catalog.close()
+
+if __name__ == "__main__":
+    main()
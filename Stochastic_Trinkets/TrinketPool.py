@@ -0,0 +1,305 @@
+import os
+import json
+import time
+import shutil
+import signal
+import sqlite3
+import argparse
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+POOL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pool (
+    slug TEXT PRIMARY KEY,
+    properties TEXT NOT NULL,
+    image_path TEXT,
+    created_at REAL NOT NULL
+);
+"""
+
+class TrinketPool:
+    """
+    A class for storing fully generated trinkets that have not been committed to the mod yet.
+
+    Pooled trinkets live in their own folder: properties in a small SQLite
+    database and icons next to it. Committing a trinket records it in the
+    trinket catalog, moves its icon into the mod's icon folder and removes it
+    from the pool, so no LLM or diffusion work is left at commit time.
+    """
+
+    def __init__(self, pool_dir):
+        """
+        Initialize the TrinketPool and create its database if needed.
+
+        Args:
+            pool_dir (str): Folder holding the pool database and the pooled icons.
+        """
+        self.pool_dir = pool_dir
+        self.icon_dir = os.path.join(pool_dir, 'icons')
+        os.makedirs(self.icon_dir, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(pool_dir, 'pool.sqlite3'), check_same_thread=False, timeout=30)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(POOL_SCHEMA)
+
+    def size(self):
+        return self.connection.execute("SELECT COUNT(*) FROM pool").fetchone()[0]
+
+    def oldest(self):
+        """
+        Get the creation time of the oldest pooled trinket.
+
+        Returns:
+            float: A UNIX timestamp, or None if the pool is empty.
+        """
+        return self.connection.execute("SELECT MIN(created_at) FROM pool").fetchone()[0]
+
+    def add(self, trinket_properties, image_path):
+        """
+        Add a generated trinket to the pool.
+
+        Args:
+            trinket_properties (dict): The generated properties ('name', 'class', 'rarity', 'stats').
+            image_path (str): Path of its icon inside the pool's icon folder, if one was generated.
+        """
+        slug = trinket_properties['name'].replace(" ", "_").replace("'", "").lower()
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pool (slug, properties, image_path, created_at) VALUES (?, ?, ?, ?)",
+                (slug, json.dumps(trinket_properties), image_path, time.time()))
+
+    def commit(self, count, catalog, icon_dir):
+        """
+        Move the oldest pooled trinkets into the trinket catalog and the mod's icon folder.
+
+        Each trinket is committed on its own: the catalog row is recorded
+        first, the icon is moved last, and only then is the trinket removed
+        from the pool. If a commit stops half way, the trinket stays pooled
+        and the next commit finishes it instead of recording it twice. A pooled
+        trinket whose id is already taken by a different catalog trinket is
+        dropped from the pool.
+
+        Args:
+            count (int): Number of trinkets to commit.
+            catalog (TrinketCatalog): The catalog to record them in.
+            icon_dir (str): The mod's icon folder.
+
+        Returns:
+            list: The properties of the committed trinkets.
+        """
+        os.makedirs(icon_dir, exist_ok=True)
+        committed = []
+        while len(committed) < count:
+            with self.connection:
+                # Claim the row first, so a refill running at the same time cannot interleave
+                self.connection.execute("BEGIN IMMEDIATE")
+                row = self.connection.execute(
+                    "SELECT slug, properties, image_path FROM pool ORDER BY created_at, rowid LIMIT 1").fetchone()
+                if row is None:
+                    break
+                slug, properties, image_path = row
+                trinket_properties = json.loads(properties)
+                destination = os.path.join(icon_dir, os.path.basename(image_path)) if image_path else None
+
+                existing = catalog.get_trinket(slug)
+                # A matching catalog row means an earlier commit recorded this trinket but did not finish
+                taken = existing is not None and any(
+                    existing[key] != trinket_properties[key] for key in ('name', 'class', 'rarity', 'stats'))
+                if existing is None:
+                    catalog.add_trinket(trinket_properties, destination)
+                elif taken:
+                    print(f"Warning: dropping pooled trinket {trinket_properties['name']}, "
+                          f"the catalog already has {existing['name']} with the id '{slug}'.")
+                if image_path and os.path.exists(image_path):
+                    if taken:
+                        os.remove(image_path)
+                    else:
+                        move_file(image_path, destination)
+                self.connection.execute("DELETE FROM pool WHERE slug = ?", (slug,))
+            if not taken:
+                committed.append(trinket_properties)
+        return committed
+
+    def close(self):
+        self.connection.close()
+
+def move_file(source, destination):
+    try:
+        os.replace(source, destination)
+    except OSError:
+        # The pool and the mod folder are on different drives
+        shutil.move(source, destination)
+
+class TrinketPoolDaemon:
+    """
+    A long-running process that keeps the trinket pool topped up.
+
+    Whenever the pool is below its target size and the machine is idle, the
+    daemon generates a batch of trinkets with TrinketGenerator, with icons
+    written into the pool folder, and pre-translates their names so a later
+    commit only needs cached translations. The machine counts as idle when
+    system CPU use is below 'idle_cpu_percent' and none of the
+    'busy_processes' (e.g. the game) are running. During a refill most of the
+    CPU use is the daemon's own, so between trinkets it only checks for a stop
+    request and for busy processes. The daemon never opens the trinket
+    catalog, so commits do not compete with it for the database.
+    """
+
+    def __init__(self, config_path):
+        """
+        Initialize the TrinketPoolDaemon.
+
+        Args:
+            config_path (str): Path to the configuration file.
+        """
+        from GenerateTrinket import TrinketGenerator
+        from ParseTrinketFiles import ConfigManager
+        from TrinketLocalization import TrinketTranslator
+
+        self.generator = TrinketGenerator(config_path, use_catalog=False)
+        self.translator = TrinketTranslator.from_config(ConfigManager(config_path), self.generator.ai_manager)
+        self.settings = self.generator.data_loader.config.get('pool_settings', {})
+        self.pool = TrinketPool(get_pool_dir(config_path, self.settings))
+        self.generator.image_generator.save_dir = self.pool.icon_dir
+        self.target_size = int(self.settings.get('target_size', 20))
+        self.batch_size = int(self.settings.get('batch_size', 4))
+        self.stop_event = threading.Event()
+
+    def run(self):
+        """
+        Refill the pool until stopped with Ctrl+C or SIGTERM.
+        """
+        signal.signal(signal.SIGINT, lambda *_: self.stop_event.set())
+        signal.signal(signal.SIGTERM, lambda *_: self.stop_event.set())
+        lower_priority()
+        poll_interval = float(self.settings.get('poll_interval', 30))
+
+        print(f"Trinket pool daemon started with {self.pool.size()}/{self.target_size} trinkets pooled.")
+        while not self.stop_event.is_set():
+            missing = self.target_size - self.pool.size()
+            if missing > 0 and self.is_idle():
+                self.refill(min(missing, self.batch_size))
+                continue
+            self.stop_event.wait(poll_interval)
+        self.pool.close()
+        self.translator.close()
+        print("Trinket pool daemon stopped.")
+
+    def refill(self, count):
+        """
+        Generate trinkets into the pool.
+
+        Args:
+            count (int): Number of trinkets to generate.
+        """
+        start = time.perf_counter()
+        jobs = int(self.settings.get('jobs', 1))
+        pooled = 0
+        for batch in self.generator.generate_batches(count, jobs, cancel=self.should_yield):
+            # Only pool a trinket once its icon is on disk
+            self.generator.image_generator.icon_writer.flush()
+            self.translator.translate_all([properties['name'] for properties, _ in batch])
+            for trinket_properties, image_path in batch:
+                self.pool.add(trinket_properties, image_path)
+            pooled += len(batch)
+        stopped = " before being interrupted" if pooled < count else ""
+        print(f"Pooled {pooled} trinkets in {time.perf_counter() - start:.0f}s{stopped} ({self.pool.size()}/{self.target_size}).")
+
+    def should_yield(self):
+        """
+        Check between trinkets whether a refill has to stop.
+
+        Returns:
+            bool: True if the daemon is stopping or a busy process has started.
+        """
+        return self.stop_event.is_set() or self.busy_process_running()
+
+    def busy_process_running(self):
+        """
+        Check whether any of the configured 'busy_processes' is running.
+
+        Returns:
+            bool: True if one is running. Always False without psutil.
+        """
+        busy_processes = {name.lower() for name in self.settings.get('busy_processes', [])}
+        if psutil is None or not busy_processes:
+            return False
+        return any((process.info['name'] or '').lower() in busy_processes for process in psutil.process_iter(['name']))
+
+    def is_idle(self):
+        """
+        Check whether the machine is idle enough to generate trinkets.
+
+        Returns:
+            bool: True if CPU use is low and no busy process is running.
+        """
+        idle_cpu_percent = float(self.settings.get('idle_cpu_percent', 30))
+        if psutil is not None:
+            if self.busy_process_running():
+                return False
+            return psutil.cpu_percent(interval=1.0) < idle_cpu_percent
+        try:
+            return 100 * os.getloadavg()[0] / os.cpu_count() < idle_cpu_percent
+        except (AttributeError, OSError):
+            # No way to measure load on this platform, so refill whenever the pool is short
+            return True
+
+def lower_priority():
+    # Refills should never compete with the game or interactive work
+    if psutil is not None:
+        process = psutil.Process()
+        process.nice(psutil.BELOW_NORMAL_PRIORITY_CLASS if os.name == 'nt' else 19)
+    elif hasattr(os, 'nice'):
+        os.nice(19)
+
+def get_pool_dir(config_path, pool_settings):
+    base_dir = os.path.dirname(os.path.abspath(config_path))
+    return os.path.join(base_dir, pool_settings.get('pool_dir', 'trinket_pool'))
+
+def main():
+    """
+    Main function to run the pool daemon, commit pooled trinkets to the mod, or show the pool size.
+    """
+    parser = argparse.ArgumentParser(description="Keep a pool of pre-generated trinkets and commit them to the mod")
+    parser.add_argument("action", choices=["daemon", "commit", "status"], help="Refill the pool in the background, commit pooled trinkets, or show the pool size")
+    parser.add_argument("-k", "--count", type=int, default=None, help="Number of trinkets to commit (default: pool_settings.commit_count)")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    config_path = os.path.join(script_dir, 'config.json')
+
+    if args.action == 'daemon':
+        TrinketPoolDaemon(config_path).run()
+        return
+
+    with open(config_path, 'r') as config_file:
+        config = json.load(config_file)
+    pool_settings = config.get('pool_settings', {})
+    pool = TrinketPool(get_pool_dir(config_path, pool_settings))
+
+    if args.action == 'status':
+        oldest = pool.oldest()
+        age = f", oldest pooled {(time.time() - oldest) / 3600:.1f}h ago" if oldest else ""
+        print(f"{pool.size()}/{pool_settings.get('target_size', 20)} trinkets pooled{age}.")
+    else:
+        from TrinketCatalog import TrinketCatalog
+
+        start = time.perf_counter()
+        catalog = TrinketCatalog(config_path)
+        icon_dir = os.path.join(script_dir, config['file_paths']['mod_output']['mod_output_trinket_images'])
+        count = args.count if args.count is not None else int(pool_settings.get('commit_count', 3))
+        committed = pool.commit(count, catalog, icon_dir)
+        if committed:
+            catalog.export_mod_files()
+        catalog.close()
+        for trinket_properties in committed:
+            print(f"Committed {trinket_properties['name']} ({trinket_properties['rarity']}, {trinket_properties['class']})")
+        print(f"Committed {len(committed)} of {count} requested trinkets in {(time.perf_counter() - start) * 1000:.0f} ms, "
+              f"{pool.size()} left in the pool.")
+    pool.close()
+
+if __name__ == "__main__":
+    main()
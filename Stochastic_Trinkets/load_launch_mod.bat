@@ -1,7 +1,10 @@
 @echo off
 
-REM Copy files from the mod folder to the game directory
-xcopy "C:\Users\hecto\Documents\DD_MOD\DD_stochastic_mods\Stochastic_Trinkets\mod" "C:\Users\hecto\Documents\DD_MOD\DD_stochastic_mods\DarkestDungeon" /E /I /Y
+REM Commit pre-generated trinkets from the pool (kept topped up by start_trinket_pool.bat) into the mod files
+python "C:\Users\hecto\Documents\DD_MOD\DD_stochastic_mods\Stochastic_Trinkets\TrinketPool.py" commit
+
+REM Deploy new or changed files from the mod folder to the game directory
+python "C:\Users\hecto\Documents\DD_MOD\DD_stochastic_mods\Stochastic_Trinkets\DeployMod.py" deploy
 echo Game files moved to the game directory.
 
 REM Force CMD to run localization.bat
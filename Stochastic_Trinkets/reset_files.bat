@@ -3,12 +3,19 @@
 REM Change to the base directory
 cd /d "C:\Users\hecto\Documents\DD_MOD\DD_stochastic_mods"
 
-REM Copy files from the vanilla backup folder to the game directory
-xcopy "vanilla_backup" "DarkestDungeon" /E /I /Y
-
 REM Change to the Stochastic_Trinkets directory
 cd Stochastic_Trinkets
 
+REM Restore the game files touched by the mod deployment from the vanilla backup folder
+python DeployMod.py restore
+
+REM Delete the catalog of generated trinkets
+if exist "trinket_catalog.sqlite3" del "trinket_catalog.sqlite3"
+if exist "trinket_catalog.sqlite3-wal" del "trinket_catalog.sqlite3-wal"
+if exist "trinket_catalog.sqlite3-shm" del "trinket_catalog.sqlite3-shm"
+REM translation_cache.sqlite3 is kept, so names generated again are not translated again
+REM trinket_pool is kept too, since pooled trinkets have not been committed to the mod yet
+
 REM Erase contents of modded_trinkets.string_table.xml
 echo.> "mod\localization\modded_trinkets.string_table.xml"
 
@@ -27,4 +34,4 @@ copy /Y "vanilla_all_buffs.json" "mod\shared\buffs\base.buffs.json"
 REM Delete all files in the icons_equip folder
 del /Q "mod\panels\icons_equip\trinket\*.*"
 
-echo Vanilla files have been restored, mod files have been prepared, modded rarities file has been deleted, modded colours file has been deleted, and icons_equip folder has been cleared.
\ No newline at end of file
+echo Vanilla files have been restored, the trinket catalog has been deleted, mod files have been prepared, modded rarities file has been deleted, modded colours file has been deleted, and icons_equip folder has been cleared.
\ No newline at end of file
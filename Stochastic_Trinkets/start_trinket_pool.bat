@@ -0,0 +1,6 @@
+@echo off
+
+REM Keep the pool of pre-generated trinkets topped up in the background, at low priority
+cd /d "C:\Users\hecto\Documents\DD_MOD\DD_stochastic_mods\Stochastic_Trinkets"
+start "Trinket pool" /low python TrinketPool.py daemon
+echo Trinket pool daemon started.
\ No newline at end of file
@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
+
+# The scripts import each other by module name, as when they are run from the Stochastic_Trinkets folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        self.server.release.wait(5)
+        self._reply({"version": "stub"})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(self.path)
+        if self.path == "/api/chat":
+            self.server.chat_started.set()
+            self.server.release.wait(5)
+            if payload.get("stream"):
+                self._stream()
+                return
+            self._reply({"message": {"role": "assistant", "content": self.server.name}, "done": True,
+                         "prompt_eval_count": 10, "eval_count": 2})
+        else:
+            self._reply({"status": "success"})
+
+    def _reply(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self):
+        # Streams until the client drops the connection, like a long generation
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            for _ in range(100):
+                self.wfile.write(json.dumps({"message": {"content": "word "}, "done": False}).encode() + b"\n")
+                self.wfile.flush()
+                time.sleep(0.05)
+            self.wfile.write(json.dumps({"message": {"content": ""}, "done": True}).encode() + b"\n")
+        except OSError:
+            pass
+
+def start_stub(name):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllamaHandler)
+    server.daemon_threads = True
+    server.name = name
+    server.requests = []
+    server.chat_started = threading.Event()
+    server.release = threading.Event()
+    server.release.set()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@pytest.fixture
+def stubs():
+    """
+    Two local stand-ins for Ollama servers; each answers chats with its own name.
+    """
+    servers = [start_stub("first"), start_stub("second")]
+    yield servers
+    for server in servers:
+        server.release.set()
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture
+def config_path(tmp_path):
+    """
+    A copy of config.json whose catalog, translation cache and vanilla buff index live in tmp_path, out of the working tree.
+    """
+    with open(CONFIG_PATH, 'r') as file:
+        config = json.load(file)
+    config['file_paths']['catalog'] = {
+        'catalog_db': str(tmp_path / 'catalog.sqlite3'),
+        'translation_cache': str(tmp_path / 'translation_cache.sqlite3'),
+    }
+    config['file_paths']['mod_resources']['vanilla_buff_index'] = str(tmp_path / 'vanilla_buff_index.pickle')
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps(config))
+    return str(path)
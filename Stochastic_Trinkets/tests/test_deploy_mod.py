@@ -0,0 +1,95 @@
+import os
+import pytest
+from DeployMod import ModDeployer
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        file.write(content)
+
+def read(path):
+    with open(path, 'r') as file:
+        return file.read()
+
+@pytest.fixture
+def layout(tmp_path):
+    mod_root = tmp_path / 'mod'
+    game_dir = tmp_path / 'game'
+    backup_dir = tmp_path / 'vanilla_backup'
+    # A game file the mod replaces, with its vanilla copy in the backup, and a file only the mod ships
+    write(mod_root / 'shared' / 'buffs' / 'base.buffs.json', 'modded buffs')
+    write(mod_root / 'trinkets' / 'modded.rarities.trinkets.json', 'modded rarities')
+    write(game_dir / 'shared' / 'buffs' / 'base.buffs.json', 'vanilla buffs')
+    write(backup_dir / 'shared' / 'buffs' / 'base.buffs.json', 'vanilla buffs')
+    return tmp_path
+
+def make_deployer(layout, link_mode):
+    return ModDeployer(
+        mod_root=layout / 'mod',
+        source_paths=[layout / 'mod' / 'shared', layout / 'mod' / 'trinkets'],
+        game_dir=layout / 'game',
+        vanilla_backup_dir=layout / 'vanilla_backup',
+        manifest_path=layout / 'deploy_manifest.json',
+        link_mode=link_mode,
+    )
+
+@pytest.mark.parametrize('link_mode', ['auto', 'hardlink', 'copy'])
+def test_deploy_restore_round_trip(layout, link_mode):
+    deployer = make_deployer(layout, link_mode)
+    buffs = layout / 'game' / 'shared' / 'buffs' / 'base.buffs.json'
+    rarities = layout / 'game' / 'trinkets' / 'modded.rarities.trinkets.json'
+
+    assert deployer.deploy() == {'placed': 2, 'unchanged': 0, 'restored': 0}
+    assert read(buffs) == 'modded buffs'
+    assert read(rarities) == 'modded rarities'
+    assert deployer.deploy() == {'placed': 0, 'unchanged': 2, 'restored': 0}
+
+    assert deployer.restore() == {'restored': 1, 'removed': 1, 'kept': 0}
+    assert read(buffs) == 'vanilla buffs'
+    assert not rarities.exists()
+
+    # The restored file must not share its inode with the only vanilla backup
+    assert os.stat(buffs).st_nlink == 1
+    write(buffs, 'patched by the game')
+    assert read(layout / 'vanilla_backup' / 'shared' / 'buffs' / 'base.buffs.json') == 'vanilla buffs'
+
+def test_deploy_replaces_same_size_game_file(layout):
+    deployer = make_deployer(layout, 'copy')
+    deployer.deploy()
+    buffs = layout / 'game' / 'shared' / 'buffs' / 'base.buffs.json'
+    os.remove(buffs)
+    write(buffs, 'MODDED BUFFS')
+    os.utime(buffs, ns=(0, 0))
+
+    assert deployer.deploy() == {'placed': 1, 'unchanged': 1, 'restored': 0}
+    assert read(buffs) == 'modded buffs'
+
+def test_deploy_restores_removed_mod_files(layout):
+    deployer = make_deployer(layout, 'copy')
+    deployer.deploy()
+    os.remove(layout / 'mod' / 'shared' / 'buffs' / 'base.buffs.json')
+
+    assert deployer.deploy() == {'placed': 0, 'unchanged': 1, 'restored': 1}
+    assert read(layout / 'game' / 'shared' / 'buffs' / 'base.buffs.json') == 'vanilla buffs'
+
+def test_deploy_snapshots_game_files_missing_from_the_backup(layout):
+    os.remove(layout / 'vanilla_backup' / 'shared' / 'buffs' / 'base.buffs.json')
+    deployer = make_deployer(layout, 'copy')
+    deployer.deploy()
+    assert read(layout / 'vanilla_backup' / 'shared' / 'buffs' / 'base.buffs.json') == 'vanilla buffs'
+
+    assert deployer.restore() == {'restored': 1, 'removed': 1, 'kept': 0}
+    assert read(layout / 'game' / 'shared' / 'buffs' / 'base.buffs.json') == 'vanilla buffs'
+
+def test_restore_keeps_shipped_files_without_a_backup(layout):
+    deployer = make_deployer(layout, 'copy')
+    deployer.deploy()
+    # e.g. the backup folder was cleaned up after the deployment
+    os.remove(layout / 'vanilla_backup' / 'shared' / 'buffs' / 'base.buffs.json')
+
+    assert deployer.restore() == {'restored': 0, 'removed': 1, 'kept': 1}
+    assert (layout / 'game' / 'shared' / 'buffs' / 'base.buffs.json').exists()
+
+def test_auto_mode_does_not_hard_link(layout):
+    make_deployer(layout, 'auto').deploy()
+    assert os.stat(layout / 'game' / 'shared' / 'buffs' / 'base.buffs.json').st_nlink == 1
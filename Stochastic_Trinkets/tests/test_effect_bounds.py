@@ -0,0 +1,49 @@
+import json
+import pickle
+import pytest
+from GenerateTrinketProperties import TrinketDataLoader
+from ParseTrinketFiles import ConfigManager, VanillaBuffIndex
+
+@pytest.fixture
+def data_loader(config_path):
+    data_loader = TrinketDataLoader(config_path)
+    data_loader.config['trinket_settings']['conditional_effects'] = True
+    return data_loader
+
+def test_conditional_bounds_widen_by_at_most_the_factor(data_loader):
+    factor = data_loader.config['trinket_settings']['conditional_bound_factor']
+    effect_bounds = data_loader.get_effect_bounds()
+    split_condition = data_loader.effect_type_manager.split_condition
+
+    conditional = [name for name in effect_bounds if split_condition(name)[1]]
+    assert conditional
+    for name in conditional:
+        low, high = effect_bounds[name]
+        base_low, base_high = effect_bounds[split_condition(name)[0]]
+        assert low <= base_low and high >= base_high
+        assert low >= base_low - (factor - 1) * abs(base_low) - 0.5
+        assert high <= base_high + (factor - 1) * abs(base_high) + 0.5
+
+def test_raw_stat_tuner_bounds_include_conditional_effects(data_loader):
+    effects = json.loads(data_loader.get_bounds_json())['effects']
+    names = {effect['name'] for effect in effects}
+    assert names == set(data_loader.get_effect_bounds())
+    assert any('(' in name for name in names)
+
+@pytest.mark.parametrize('payload', [
+    b'not a pickle',
+    b'',
+    pickle.dumps(['a', 'list']),
+    # Unpickling needs a module that does not exist in the parser's process
+    b'cgone_module_xyz\nForeign\n)R.',
+])
+def test_unreadable_buff_index_is_rebuilt(config_path, payload):
+    config_manager = ConfigManager(config_path)
+    index_path = config_manager.get_file_path('mod_resources', 'vanilla_buff_index')
+    with open(index_path, 'wb') as file:
+        file.write(payload)
+
+    index = VanillaBuffIndex(config_manager)
+    assert index.ranges['trinket']
+    with open(index_path, 'rb') as file:
+        assert pickle.load(file)['version'] == VanillaBuffIndex.VERSION
@@ -0,0 +1,64 @@
+import re
+import numpy as np
+import pytest
+from PIL import Image
+from IconScorer import IconScorer
+
+WIDTH, HEIGHT = 72, 144
+
+def make_icon(centre=(0.5, 0.5), radius=(0.3, 0.3), textured=True, seed=0):
+    # An elliptical subject on a transparent background, at fractions of the icon size
+    y, x = np.mgrid[:HEIGHT, :WIDTH]
+    inside = ((x - centre[0] * WIDTH) / (radius[0] * WIDTH)) ** 2 + ((y - centre[1] * HEIGHT) / (radius[1] * HEIGHT)) ** 2 <= 1
+    rgba = np.zeros((HEIGHT, WIDTH, 4), dtype=np.uint8)
+    if textured:
+        rgba[..., :3] = np.random.default_rng(seed).integers(0, 256, (HEIGHT, WIDTH, 3))
+    else:
+        rgba[..., :3] = (120, 90, 60)
+    rgba[..., 3] = np.where(inside, 255, 0)
+    return Image.fromarray(rgba, 'RGBA')
+
+@pytest.fixture
+def scorer():
+    return IconScorer({'target_coverage': 0.35, 'border': 4, 'max_edge_residue': 0.25, 'target_color_std': 40})
+
+def test_scores_stay_in_range(scorer):
+    icons = [make_icon(), make_icon(centre=(0.2, 0.2)), make_icon(radius=(0.9, 0.9)), Image.new('RGBA', (WIDTH, HEIGHT))]
+    scores = scorer.score(icons)
+    for metric, values in scores.items():
+        assert values.shape == (len(icons),)
+        assert np.isfinite(values).all(), metric
+        assert ((values >= 0) & (values <= 1)).all(), metric
+
+def test_each_metric_penalises_its_defect(scorer):
+    good = make_icon()
+    scores = scorer.score([good, make_icon(centre=(0.25, 0.25)), make_icon(radius=(0.9, 0.9)), make_icon(textured=False)])
+    assert scores['centring'][0] > scores['centring'][1]
+    assert scores['edge_residue'][0] > scores['edge_residue'][2]
+    assert scores['coverage'][0] > scores['coverage'][2]
+    assert scores['color_variance'][0] > scores['color_variance'][3]
+
+def test_empty_icon_scores_zero(scorer):
+    scores = scorer.score([Image.new('RGBA', (WIDTH, HEIGHT))])
+    assert scores['coverage'][0] == 0
+    assert scores['centring'][0] == 0
+    assert scores['color_variance'][0] == 0
+
+@pytest.mark.parametrize("best", [0, 1, 2])
+def test_pick_best_finds_the_good_candidate(scorer, best):
+    icons = [make_icon(centre=(0.3, 0.25)), make_icon(radius=(0.9, 0.9), textured=False)]
+    icons.insert(best, make_icon(seed=best))
+    index, scores = scorer.pick_best(icons)
+    assert index == best
+    assert scores['total'][best] == scores['total'].max()
+
+def test_weights_decide_the_pick():
+    # Only centring counts, so the centred flat blob beats the textured off-centre icon
+    scorer = IconScorer({'weights': {'coverage': 0, 'centring': 1, 'edge_residue': 0, 'color_variance': 0}})
+    index, _ = scorer.pick_best([make_icon(centre=(0.3, 0.3)), make_icon(textured=False)])
+    assert index == 1
+
+def test_format_scores(scorer):
+    scores = scorer.score([make_icon(), make_icon(centre=(0.3, 0.3))])
+    assert re.fullmatch(r"total \d\.\d\d \(coverage \d\.\d\d, centring \d\.\d\d, edge_residue \d\.\d\d, color_variance \d\.\d\d\)",
+                        IconScorer.format_scores(scores, 1))
@@ -0,0 +1,73 @@
+import os
+import threading
+import numpy as np
+from PIL import Image
+from IconWriter import IconWriter
+
+def make_icon(size=64, hue=0):
+    # An opaque disc with an antialiased rim on a transparent background, like a cut-out trinket icon
+    y, x = np.mgrid[:size, :size]
+    distance = np.hypot(x - size / 2, y - size / 2)
+    alpha = np.clip((size / 3 - distance) * 128, 0, 255).astype(np.uint8)
+    rgba = np.zeros((size, size, 4), dtype=np.uint8)
+    rgba[..., 0] = (x * 4 + hue) % 256
+    rgba[..., 1] = (y * 4) % 256
+    rgba[..., 2] = 128
+    rgba[..., 3] = alpha
+    return Image.fromarray(rgba, 'RGBA')
+
+def icon_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith("icon-writer")]
+
+def test_quantized_round_trip_keeps_alpha(tmp_path):
+    writer = IconWriter({'quantize': True, 'colors': 256, 'max_alpha_error': 32})
+    icon = make_icon()
+    path = str(tmp_path / "icon.png")
+    writer.write(icon, path)
+
+    assert writer.stats['quantized'] == 1
+    with Image.open(path) as written:
+        assert written.mode == 'P'
+        alpha = np.asarray(written.convert('RGBA').getchannel('A'), dtype=np.int16)
+    original = np.asarray(icon.getchannel('A'), dtype=np.int16)
+    solid = (original == 0) | (original == 255)
+    assert (alpha[solid] == original[solid]).all()
+    assert np.abs(alpha - original).max() <= 32
+
+def test_alpha_drift_falls_back_to_truecolor(tmp_path):
+    writer = IconWriter({'quantize': True, 'colors': 2, 'max_alpha_error': 0})
+    path = str(tmp_path / "icon.png")
+    writer.write(make_icon(), path)
+
+    assert writer.stats['quantized'] == 0
+    with Image.open(path) as written:
+        assert written.mode == 'RGBA'
+        assert written.tobytes() == make_icon().tobytes()
+
+def test_submit_and_flush_write_every_file(tmp_path):
+    writer = IconWriter({'workers': 3})
+    paths = [str(tmp_path / "icons" / f"icon_{i}.png") for i in range(12)]
+    for i, path in enumerate(paths):
+        writer.submit(make_icon(hue=i * 20), path)
+    writer.flush()
+
+    assert all(os.path.exists(path) for path in paths)
+    assert not [name for name in os.listdir(tmp_path / "icons") if name.endswith(".tmp")]
+    assert writer.stats['images'] == len(paths)
+    writer.close()
+
+def test_synchronous_writes_start_no_threads(tmp_path):
+    before = len(icon_threads())
+    for i in range(3):
+        writer = IconWriter()
+        writer.write(make_icon(), str(tmp_path / f"icon_{i}.png"))
+        assert writer._executor is None
+    assert len(icon_threads()) == before
+    assert writer.stats['baseline_bytes'] == 0
+
+def test_close_stops_the_pool(tmp_path):
+    writer = IconWriter({'workers': 2})
+    writer.submit(make_icon(), str(tmp_path / "icon.png"))
+    writer.close()
+    assert writer._executor is None
+    assert not [thread for thread in icon_threads() if thread.is_alive()]
@@ -0,0 +1,122 @@
+import time
+import socket
+import threading
+import contextvars
+import http.client
+import pytest
+from OllamaTransport import OllamaEndpoint, EndpointPool, CancelToken, RequestCancelled
+
+def endpoint_for(server):
+    return OllamaEndpoint(server.url, request_timeout=10)
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def chat(endpoint):
+    return endpoint.chat("role", [{"role": "user", "content": "hi"}])
+
+def test_failover_to_healthy_endpoint(stubs):
+    dead = OllamaEndpoint(f"http://127.0.0.1:{closed_port()}", connect_timeout=1)
+    # The dead endpoint wins the routing tie, so the call has to fail over
+    pool = EndpointPool([dead, endpoint_for(stubs[0])], health_check_interval=60)
+
+    assert pool.call(chat)["message"]["content"] == "first"
+    assert not dead.healthy
+    assert pool.call(chat)["message"]["content"] == "first"
+
+class TimingOutConnection(http.client.HTTPConnection):
+    # Behaves like a remote box that is switched off: the connect never completes
+    def connect(self):
+        raise socket.timeout("timed out")
+
+def test_failover_on_connect_timeout(stubs):
+    dead = OllamaEndpoint("http://192.0.2.1:11434", connect_timeout=1)
+    dead.connection_class = TimingOutConnection
+    pool = EndpointPool([dead, endpoint_for(stubs[0])], health_check_interval=60)
+
+    assert pool.call(chat)["message"]["content"] == "first"
+    assert not dead.healthy
+
+def test_read_timeout_does_not_fail_over(stubs):
+    stubs[0].release.clear()
+    busy = OllamaEndpoint(stubs[0].url, request_timeout=0.5)
+    pool = EndpointPool([busy, endpoint_for(stubs[1])])
+
+    with pytest.raises(TimeoutError):
+        pool.call(chat)
+    assert busy.healthy
+    assert "/api/chat" not in stubs[1].requests
+
+def test_concurrent_selects_probe_once(stubs):
+    recovering = endpoint_for(stubs[0])
+    recovering.healthy = False
+    pool = EndpointPool([recovering, endpoint_for(stubs[1])], health_check_interval=1)
+
+    stubs[0].release.clear()
+    threads = [threading.Thread(target=pool.select) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    stubs[0].release.set()
+    for thread in threads:
+        thread.join(5)
+    assert stubs[0].requests.count("/api/version") == 1
+    assert recovering.healthy
+
+def test_all_endpoints_down():
+    pool = EndpointPool([OllamaEndpoint(f"http://127.0.0.1:{closed_port()}", connect_timeout=1)])
+    with pytest.raises(ConnectionError):
+        pool.call(chat)
+
+def test_cancel_aborts_stream(stubs):
+    endpoint = endpoint_for(stubs[0])
+    cancel_token = CancelToken()
+    threading.Timer(0.2, cancel_token.cancel).start()
+
+    start = time.monotonic()
+    with pytest.raises(RequestCancelled):
+        endpoint.chat("role", [{"role": "user", "content": "hi"}], cancel_token=cancel_token, on_chunk=lambda text: False)
+    assert time.monotonic() - start < 2
+
+def test_stream_validator_stops_generation(stubs):
+    endpoint = endpoint_for(stubs[0])
+    response = endpoint.chat("role", [{"role": "user", "content": "hi"}], on_chunk=lambda text: text.count("word") >= 3)
+    assert response["done"] is False
+    assert response["message"]["content"] == "word word word "
+
+def test_pinned_pipeline_stays_on_one_endpoint(stubs):
+    pool = EndpointPool([endpoint_for(server) for server in stubs])
+    with pool.pinned() as endpoint:
+        replies = {pool.call(chat)["message"]["content"] for _ in range(4)}
+        assert endpoint.in_flight == 1
+    assert len(replies) == 1
+    assert endpoint.in_flight == 0
+
+def test_in_flight_counted_once_per_call(stubs):
+    stubs[0].release.clear()
+    endpoint = endpoint_for(stubs[0])
+    pool = EndpointPool([endpoint])
+    worker = threading.Thread(target=pool.call, args=(chat,))
+    worker.start()
+    assert stubs[0].chat_started.wait(5)
+    assert endpoint.in_flight == 1
+
+    stubs[0].release.set()
+    worker.join(5)
+    assert endpoint.in_flight == 0
+    assert endpoint.completed == 1
+
+def test_pin_is_inherited_by_context_copies(stubs):
+    pool = EndpointPool([endpoint_for(server) for server in stubs])
+    replies = []
+    with pool.pinned():
+        pinned_reply = pool.call(chat)["message"]["content"]
+        context = contextvars.copy_context()
+        threads = [threading.Thread(target=context.copy().run, args=(lambda: replies.append(pool.call(chat)),)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+    assert replies and set(reply["message"]["content"] for reply in replies) == {pinned_reply}
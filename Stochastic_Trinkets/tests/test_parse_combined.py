@@ -0,0 +1,64 @@
+import json
+import pytest
+from GenerateTrinketProperties import TrinketPropertyGenerator
+
+HERO_CLASSES = ['crusader', 'vestal']
+RARITIES = ['common', 'rare']
+EFFECT_BOUNDS = {'Bleed Resist': (-20, 20), 'Healing Received': (-15, 30)}
+
+def parse(reply, trinket_rarity=None):
+    generator = TrinketPropertyGenerator(None, None)
+    return generator.parse_combined(reply, HERO_CLASSES, RARITIES, EFFECT_BOUNDS, trinket_rarity)
+
+def reply(**overrides):
+    trinket = {'name': 'Gnawed Reliquary', 'class': 'vestal', 'rarity': 'rare', 'stats': {'Bleed Resist': -10, 'Healing Received': 25}}
+    trinket.update(overrides)
+    return json.dumps(trinket)
+
+def test_valid_reply():
+    assert parse(reply()) == {
+        'name': 'Gnawed Reliquary',
+        'class': 'vestal',
+        'rarity': 'rare',
+        'stats': {'Bleed Resist': '-10', 'Healing Received': '+25'},
+    }
+
+def test_extra_keys_are_ignored():
+    assert parse(reply(description='A jar of teeth', flavour=3))['name'] == 'Gnawed Reliquary'
+
+def test_values_are_normalized():
+    trinket = parse(reply(name=' "Gnawed Reliquary" ', **{'class': ' Vestal '}, rarity='RARE', stats={'Bleed Resist': '12.7'}))
+    assert trinket['name'] == 'Gnawed Reliquary'
+    assert trinket['class'] == 'vestal'
+    assert trinket['rarity'] == 'rare'
+    assert trinket['stats'] == {'Bleed Resist': '+12'}
+
+@pytest.mark.parametrize('response', [
+    'Here is your trinket: {"name": "Gnawed Reliquary"}',
+    reply()[:-12],
+    '',
+    'null',
+    '["Gnawed Reliquary", "vestal", "rare"]',
+    json.dumps({'name': 'Gnawed Reliquary', 'class': 'vestal', 'rarity': 'rare'}),
+    reply(name=7),
+])
+def test_malformed_or_partial_replies_are_rejected(response):
+    assert parse(response) is False
+
+@pytest.mark.parametrize('overrides', [
+    {'name': '  '},
+    {'class': 'jester'},
+    {'rarity': 'legendary'},
+    {'stats': {}},
+    {'stats': ['Bleed Resist']},
+    {'stats': {'Luck': 5}},
+    {'stats': {'Bleed Resist': 'a lot'}},
+    {'stats': {'Healing Received': 31}},
+    {'stats': {'Healing Received': -16}},
+])
+def test_invalid_fields_are_rejected(overrides):
+    assert parse(reply(**overrides)) is False
+
+def test_fixed_rarity_must_match():
+    assert parse(reply(), trinket_rarity='common') is False
+    assert parse(reply(rarity='common'), trinket_rarity='common')['rarity'] == 'common'
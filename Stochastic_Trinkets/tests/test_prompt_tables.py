@@ -0,0 +1,84 @@
+import json
+import re
+import pytest
+from GenerateTrinketProperties import TrinketDataLoader
+from BenchmarkSynthesis import RecordedOllamaEndpoint
+
+def loader_with(config_path, **trinket_settings):
+    with open(config_path, 'r') as file:
+        config = json.load(file)
+    config['trinket_settings'].update(trinket_settings)
+    with open(config_path, 'w') as file:
+        json.dump(config, file)
+    return TrinketDataLoader(config_path)
+
+def test_name_examples_are_seeded(config_path):
+    first = loader_with(config_path, compact_prompts=True, namer_examples=40).get_name_examples()
+    second = TrinketDataLoader(config_path).get_name_examples()
+    assert first == second
+
+def test_name_examples_are_capped_and_spread_over_prefixes(config_path):
+    loader = loader_with(config_path, compact_prompts=True, namer_examples=25)
+    examples = loader.get_name_examples().split()
+    prefixes = {trinket_id.split('_')[0] for trinket_id in loader.get_unique_ids()}
+
+    assert len(examples) == 25
+    assert set(examples) <= set(loader.get_unique_ids())
+    # Every prefix gets its first example before any prefix gets a second one
+    first_round = examples[:min(len(examples), len(prefixes))]
+    assert len({trinket_id.split('_')[0] for trinket_id in first_round}) == len(first_round)
+
+def test_raw_prompts_list_every_name(config_path):
+    loader = loader_with(config_path, compact_prompts=False, namer_examples=25)
+    assert sorted(loader.get_name_examples().split()) == sorted(loader.get_unique_ids())
+
+def parse_bounds_table(table):
+    bounds = {}
+    for entry in table.split("; "):
+        match = re.fullmatch(r"(.+):(-?\d+(?:\.\d+)?)\.\.(-?\d+(?:\.\d+)?)", entry)
+        assert match, entry
+        bounds[match.group(1)] = (float(match.group(2)), float(match.group(3)))
+    return bounds
+
+def test_bounds_table_matches_effect_bounds(config_path):
+    loader = loader_with(config_path, conditional_effects=False)
+    bounds = parse_bounds_table(loader.get_bounds_table())
+    assert bounds == {name: (float(low), float(high)) for name, (low, high) in loader.get_effect_bounds().items()}
+    assert not any("(" in name for name in bounds)
+
+def test_bounds_table_lists_conditional_effects(config_path):
+    loader = loader_with(config_path, conditional_effects=True)
+    effect_bounds = loader.get_effect_bounds()
+    conditional = [name for name in effect_bounds if "(" in name]
+    assert conditional
+
+    bounds = parse_bounds_table(loader.get_bounds_table())
+    for name in conditional:
+        base = name[:name.index(" (")]
+        low, high = bounds[name]
+        assert (low, high) == (float(effect_bounds[name][0]), float(effect_bounds[name][1]))
+        assert low <= bounds[base][0] and high >= bounds[base][1]
+
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / 'recording.jsonl'
+    record = {'role': 'DD_trinket_namer', 'message': {'role': 'assistant', 'content': 'Drowned Bell'}, 'done': True,
+              'prompt_eval_count': 100, 'eval_count': 3, 'prompt_eval_duration': 1000, 'eval_duration': 10,
+              'total_duration': 2000, 'prompt_chars': 400}
+    path.write_text(json.dumps(record) + "\n")
+    return str(path)
+
+def test_replay_keeps_counters_of_unchanged_prompts(recording):
+    endpoint = RecordedOllamaEndpoint(recording, time_scale=0)
+    endpoint.create('DD_trinket_namer', "m" * 300)
+    response = endpoint.chat('DD_trinket_namer', [{'role': 'user', 'content': "u" * 100}])
+    assert response['prompt_eval_count'] == 100
+    assert endpoint.estimated_calls == 0
+
+def test_replay_marks_changed_prompts_as_estimated(recording):
+    endpoint = RecordedOllamaEndpoint(recording, time_scale=0)
+    endpoint.create('DD_trinket_namer', "m" * 100)
+    response = endpoint.chat('DD_trinket_namer', [{'role': 'user', 'content': "u" * 100}])
+    assert response['prompt_eval_count'] == 50
+    assert response['prompt_eval_duration'] == 500
+    assert endpoint.estimated_calls == 1
@@ -0,0 +1,86 @@
+from collections import Counter
+import pytest
+
+pytest.importorskip('torch')
+from ResidencyManager import ResidencyManager, MB, get_rss
+
+class FakeImageGenerator:
+    def __init__(self, device):
+        self.device = device
+        self.pipe = None
+        self.events = []
+
+    def load_pipeline(self):
+        if self.pipe is None:
+            self.events.append('load')
+        self.pipe = object()
+
+    def offload_pipeline(self):
+        self.events.append('offload')
+
+    def unload_pipeline(self):
+        self.events.append('unload')
+        self.pipe = None
+
+class FakeAIManager:
+    def __init__(self):
+        self.keep_alive = 0
+        self.unloads = 0
+
+    def unload_models(self):
+        self.unloads += 1
+
+    def get_loaded_footprint(self):
+        return Counter()
+
+def make_manager(device='cpu', **settings):
+    # The default estimates (6000 MB + 4000 MB) do not fit a 9000 MB budget
+    settings = {'memory_budget_mb': 9000, 'headroom': 1.0, 'llm_keep_alive': '10m', **settings}
+    return ResidencyManager(settings, FakeImageGenerator(device), FakeAIManager())
+
+def run_batches(manager, count=3):
+    for _ in range(count):
+        with manager.text_phase():
+            pass
+        with manager.image_phase():
+            pass
+
+def test_cpu_keeps_the_pipeline_resident_while_rss_allows():
+    manager = make_manager(memory_budget_mb=6000 + get_rss() // MB + 1000)
+    run_batches(manager)
+    assert manager.image_generator.events == ['load']
+
+def test_cpu_unloads_the_pipeline_when_rss_requires_it():
+    manager = make_manager(memory_budget_mb=6000)
+    run_batches(manager)
+    assert manager.image_generator.events == ['load', 'unload', 'load', 'unload', 'load']
+
+def test_accelerator_offloads_when_both_do_not_fit():
+    manager = make_manager(device='mps')
+    run_batches(manager, 2)
+    assert manager.image_generator.events == ['load', 'offload']
+    assert manager.ai_manager.unloads == 2
+
+def test_resident_policy_never_releases_anything():
+    manager = make_manager(diffusion_policy='resident', memory_budget_mb=1)
+    run_batches(manager)
+    assert manager.image_generator.events == ['load']
+    assert manager.ai_manager.unloads == 0
+
+def test_text_phase_uses_the_configured_keep_alive():
+    manager = make_manager()
+    with manager.text_phase():
+        assert manager.ai_manager.keep_alive == '10m'
+    assert manager.ai_manager.keep_alive == 0
+
+    manager = make_manager(llm_keep_alive=None)
+    manager.ai_manager.keep_alive = '30s'
+    with manager.text_phase():
+        assert manager.ai_manager.keep_alive == '30s'
+
+def test_phases_are_recorded():
+    manager = make_manager(memory_budget_mb=6000)
+    run_batches(manager, 1)
+    assert [stats['phase'] for stats in manager.phases] == ['text', 'image']
+    assert manager.phases[1]['actions'] == ['unloaded LLM', 'loaded diffusion']
+    assert manager.get_stats()['image']['count'] == 1
@@ -0,0 +1,117 @@
+import time
+import threading
+import pytest
+from GenerateTrinketProperties import AIModelManager, RoleModelSlot, TrinketPropertyGenerator
+
+def make_manager(stubs, k=1, routing='role'):
+    return AIModelManager({
+        'endpoints': [server.url for server in stubs],
+        'transport': {'routing': routing},
+        'DD_test_role': {'model': 'base', 'temperature': '0.5', 'hedge': {'k': k, 'delay': 0}},
+    })
+
+def count(server, path):
+    return server.requests.count(path)
+
+def test_role_model_recreated_once_idle(stubs):
+    manager = make_manager(stubs[:1])
+    prompt = manager.create_system_prompt('DD_test_role', "SYSTEM header ", "content")
+    manager.generate_response('DD_test_role', prompt, "hi")
+    manager.generate_response('DD_test_role', prompt, "hi")
+
+    # Another process may have recreated the role name in between, so nothing is reused once idle
+    assert count(stubs[0], '/api/create') == 2
+    assert count(stubs[0], '/api/chat') == 2
+
+def test_concurrent_hedged_candidates_share_the_role_model(stubs):
+    manager = make_manager(stubs[:1], k=3)
+    prompt = manager.create_system_prompt('DD_test_role', "SYSTEM header ", "content")
+    stubs[0].release.clear()
+    worker = threading.Thread(target=manager.generate_hedged, args=('DD_test_role', prompt, "hi", lambda reply: False))
+    worker.start()
+
+    deadline = time.monotonic() + 5
+    while count(stubs[0], '/api/chat') < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stubs[0].release.set()
+    worker.join(5)
+
+    assert count(stubs[0], '/api/chat') == 3
+    assert count(stubs[0], '/api/create') == 1
+
+def test_hedged_candidates_keep_the_pipeline_endpoint(stubs):
+    manager = make_manager(stubs, k=3, routing='pipeline')
+    prompt = manager.create_system_prompt('DD_test_role', "SYSTEM header ", "content")
+    with manager.pipeline():
+        replies = []
+        manager.generate_hedged('DD_test_role', prompt, "hi", lambda reply: replies.append(reply))
+
+    pinned = next(server for server in stubs if server.name == replies[0])
+    other = next(server for server in stubs if server is not pinned)
+    assert count(pinned, '/api/chat') == 3
+    assert other.requests == []
+
+def hold(slot, modelfile, create, entered=None, leave=None):
+    with slot.use(modelfile, create):
+        if entered is not None:
+            entered.set()
+        if leave is not None:
+            leave.wait(5)
+
+def test_create_runs_outside_the_slot_lock():
+    slot = RoleModelSlot()
+    creating, release, leave = threading.Event(), threading.Event(), threading.Event()
+    creates = []
+
+    def slow_create():
+        creates.append('slow')
+        creating.set()
+        release.wait(5)
+
+    first = threading.Thread(target=hold, args=(slot, "FROM a", slow_create, None, leave))
+    first.start()
+    assert creating.wait(5)
+    # A hung create must not block everyone else that touches the slot
+    assert slot._condition.acquire(timeout=1)
+    slot._condition.release()
+
+    shared = threading.Event()
+    second = threading.Thread(target=hold, args=(slot, "FROM a", lambda: creates.append('again'), shared))
+    second.start()
+    assert not shared.wait(0.2)
+    release.set()
+    assert shared.wait(5)
+    leave.set()
+    first.join(5)
+    second.join(5)
+
+    assert creates == ['slow']
+    assert slot.users == 0 and not slot.creating
+
+def test_failed_create_is_retried_by_the_next_request():
+    slot = RoleModelSlot()
+
+    def failing_create():
+        raise ConnectionError("create failed")
+
+    with pytest.raises(ConnectionError):
+        hold(slot, "FROM a", failing_create)
+    creates = []
+    hold(slot, "FROM a", lambda: creates.append(1))
+    assert creates == [1]
+
+BOUNDS = {'Bleed Resist': (-20, 20), 'Healing Received': (-15, 30)}
+REQUESTED = {'Bleed Resist': '-', 'Healing Received': '+'}
+
+@pytest.mark.parametrize('reply, expected', [
+    ("{'Bleed Resist': '-10', 'Healing Received': '+30'}", {'Bleed Resist': '-10', 'Healing Received': '+30'}),
+    ("{'Bleed Resist': -10, 'Healing Received': 12.0, 'Stress': '+5'}", {'Bleed Resist': '-10', 'Healing Received': '+12'}),
+    ("{'Bleed Resist': '-10', 'Healing Received': '+31'}", False),
+    ("{'Bleed Resist': '-10'}", False),
+    ("{'Bleed Resist': '-', 'Healing Received': '+'}", False),
+    ("Here is the completed dictionary you asked for.", False),
+    ("['Bleed Resist', 'Healing Received']", False),
+])
+def test_tuned_stats_are_checked_against_the_bounds(reply, expected):
+    generator = TrinketPropertyGenerator(None, None)
+    assert generator.parse_tuned_stats(reply, REQUESTED, BOUNDS) == expected
@@ -0,0 +1,62 @@
+import pytest
+from TrinketCatalog import TrinketCatalog
+from TrinketAnalytics import TrinketBalanceAnalyzer
+from ParseTrinketFiles import TrinketProcessor
+
+@pytest.fixture
+def analyzer(config_path):
+    catalog = TrinketCatalog(config_path)
+    # Sign-only values for effects whose range excludes zero, and plain out-of-range numbers
+    catalog.add_trinket({'name': "Ashen Reliquary", 'class': 'crusader', 'rarity': 'rare',
+                         'stats': {'Protection': '-', 'Scouting Chance': '+', 'Accuracy': '+90'}})
+    catalog.add_trinket({'name': "Drowned Bell", 'class': 'arbalest', 'rarity': 'stochastic',
+                         'stats': {'Trap Disarm Chance': '-', 'Stress': '-300', 'Protection': '+'}})
+    catalog.add_trinket({'name': "Gilded Maw", 'class': 'every_class', 'rarity': 'common', 'stats': {'Accuracy': '+5'}})
+    analyzer = TrinketBalanceAnalyzer(config_path, catalog)
+    analyzer.load()
+    yield analyzer
+    catalog.close()
+
+def test_fix_leaves_nothing_out_of_bounds(analyzer, config_path):
+    assert analyzer.get_out_of_bounds().sum() == 6
+    fixes = analyzer.fix_out_of_bounds()
+    assert set(fixes) == {'ashen_reliquary', 'drowned_bell'}
+    assert not analyzer.get_out_of_bounds().any()
+
+    # A fresh analysis of the rewritten catalog agrees
+    reloaded = TrinketBalanceAnalyzer(config_path, analyzer.catalog)
+    reloaded.load()
+    assert not reloaded.get_out_of_bounds().any()
+    assert reloaded.analyze()['out_of_bounds'] == {}
+
+def test_dry_run_leaves_the_catalog_alone(analyzer):
+    before = analyzer.catalog.get_trinket('drowned_bell')
+    assert analyzer.fix_out_of_bounds(dry_run=True)
+    assert analyzer.catalog.get_trinket('drowned_bell') == before
+
+def test_unknown_effects_count_as_invalid(config_path):
+    catalog = TrinketCatalog(config_path)
+    catalog.add_trinket({'name': "Lucky Knuckle", 'class': 'every_class', 'rarity': 'common', 'stats': {'Luck': '+5', 'Accuracy': '+5'}})
+    catalog.add_trinket({'name': "Bent Spyglass", 'class': 'every_class', 'rarity': 'common', 'stats': {'Acuracy': '+5'}})
+    catalog.add_trinket({'name': "Gilded Maw", 'class': 'every_class', 'rarity': 'common', 'stats': {'Accuracy': '+5'}})
+    analyzer = TrinketBalanceAnalyzer(config_path, catalog)
+    analyzer.load()
+    report = analyzer.analyze()
+    catalog.close()
+
+    assert report['unknown_effects'] == {'Luck': 1, 'Acuracy': 1}
+    assert report['unknown_effect_trinkets'] == 2
+    assert report['invalid_trinkets'] == 2
+
+def test_positive_death_blow_scores_as_harmful(config_path):
+    catalog = TrinketCatalog(config_path)
+    catalog.add_trinket({'name': "Gallows Rope", 'class': 'every_class', 'rarity': 'common', 'stats': {'Death Blow': '+10'}})
+    analyzer = TrinketBalanceAnalyzer(config_path, catalog)
+    analyzer.load()
+    power = dict(zip(analyzer.trinket_slug, analyzer.get_power_scores()))
+    processor = TrinketProcessor(analyzer.effect_type_manager.config_manager, analyzer.effect_type_manager)
+    catalog.close()
+
+    # '+10' is written as a deathblow resist amount of -0.1, which hurts the hero
+    assert processor._calculate_amount('Death Blow', '+10') == pytest.approx(-0.1)
+    assert power['gallows_rope'] < 0
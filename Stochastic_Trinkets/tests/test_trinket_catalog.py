@@ -0,0 +1,38 @@
+import os
+import json
+import pytest
+from TrinketCatalog import TrinketCatalog
+
+@pytest.fixture
+def catalog(config_path):
+    catalog = TrinketCatalog(config_path)
+    catalog.add_trinket({'name': "Ashen Reliquary", 'class': 'crusader', 'rarity': 'rare', 'stats': {'Accuracy': '+10'}})
+    catalog.add_trinket({'name': "Drowned Bell", 'class': 'arbalest', 'rarity': 'stochastic', 'stats': {'Stress': '-10'}})
+    yield catalog
+    catalog.close()
+
+def test_filtered_export_needs_an_output_dir(catalog):
+    with pytest.raises(ValueError):
+        catalog.export_mod_files(rarity='rare')
+
+def test_filtered_export_writes_a_separate_mod_tree(catalog, tmp_path):
+    live_entries = catalog.config_manager.get_file_path('mod_output', 'mod_output_trinket_entries')
+    live_mtime = os.path.getmtime(live_entries) if os.path.exists(live_entries) else None
+
+    output_dir = tmp_path / 'export'
+    assert catalog.export_mod_files(rarity='rare', output_dir=str(output_dir)) == 1
+
+    with open(output_dir / 'trinkets' / 'base.entries.trinkets.json', 'r') as file:
+        entries = json.load(file)['entries']
+    assert [entry['id'] for entry in entries] == ['ashen_reliquary']
+    assert (output_dir / 'shared' / 'buffs' / 'base.buffs.json').exists()
+    assert (output_dir / 'localization' / 'modded_trinkets.string_table.xml').exists()
+    assert (os.path.getmtime(live_entries) if os.path.exists(live_entries) else None) == live_mtime
+
+def test_same_name_replacement_is_logged(catalog, capsys):
+    catalog.add_trinket({'name': "Drowned Bell", 'class': 'crusader', 'rarity': 'rare', 'stats': {'Accuracy': '+5'}})
+    assert "replaces the earlier trinket Drowned Bell" in capsys.readouterr().out
+    assert catalog.count() == 2
+
+    catalog.add_trinket({'name': "Drowned Bell", 'class': 'crusader', 'rarity': 'rare', 'stats': {'Accuracy': '+6'}}, replace=True)
+    assert "replaces" not in capsys.readouterr().out
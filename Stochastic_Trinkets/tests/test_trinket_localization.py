@@ -0,0 +1,88 @@
+import json
+import pytest
+from TrinketLocalization import TranslationCache, TrinketTranslator, LANGUAGE_NAMES
+
+class FakeAIManager:
+    """
+    Answers translation requests from a script: reply(language, names) returns the reply text or raises.
+    """
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.requests = []
+        self.ollama_settings = {TrinketTranslator.MODEL_NAME: {'batch_size': 40, 'workers': 1}}
+
+    def create_system_prompt(self, model_name, header, content):
+        return header
+
+    def generate_response(self, model_name, system_prompt, user_content):
+        request = json.loads(user_content)
+        self.requests.append(request)
+        return self.reply(request['language'], request['names'])
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = TranslationCache(str(tmp_path / 'translation_cache.sqlite3'))
+    yield cache
+    cache.close()
+
+def test_cache_lookup_only_returns_requested_texts(cache):
+    cache.put_many({"Saint's Knuckle": "Phalange du saint", 'Rare': 'Rare', 'Ancestral Gold': 'Or ancestral'}, ['french'])
+    cache.put_many({"Saint's Knuckle": 'Heiliger Knöchel'}, ['german'])
+
+    assert cache.get_many(["Saint's Knuckle", 'Rare', 'Not Cached'], 'french') == {"Saint's Knuckle": "Phalange du saint", 'Rare': 'Rare'}
+    assert cache.get_many(["Saint's Knuckle"], 'german') == {"Saint's Knuckle": 'Heiliger Knöchel'}
+    assert cache.get_many([], 'french') == {}
+
+def test_cache_hit_skips_the_backend(cache):
+    texts = ['Rusted Key']
+    for target in set(LANGUAGE_NAMES.values()):
+        languages = [language for language, name in LANGUAGE_NAMES.items() if name == target]
+        cache.put_many({'Rusted Key': f'{target} key'}, languages)
+
+    def fail(language, names):
+        raise AssertionError("cached names must not be requested")
+
+    translations = TrinketTranslator(cache, FakeAIManager(fail)).translate_all(texts)
+    assert translations['english'] == {'Rusted Key': 'Rusted Key'}
+    assert translations['koreana'] == translations['koreanb'] == {'Rusted Key': 'Korean key'}
+
+def test_partial_batch_is_retried_and_the_rest_left_in_english(cache):
+    # 'Wretched Idol' is dropped from every reply, 'Black Candle' only from the first one
+    def reply(language, names):
+        if 'Rusted Key' in names:
+            return json.dumps({'Rusted Key': f'{language} key'})
+        return json.dumps({name: f'{language} {name.lower()}' for name in names if name != 'Wretched Idol'})
+
+    manager = FakeAIManager(reply)
+    translations = TrinketTranslator(cache, manager).translate_all(['Rusted Key', 'Black Candle', 'Wretched Idol'])
+
+    assert translations['french'] == {'Rusted Key': 'French key', 'Black Candle': 'French black candle'}
+    retry = [request['names'] for request in manager.requests if request['language'] == 'French'][1]
+    assert retry == ['Black Candle', 'Wretched Idol']
+    # The untranslated name is not cached, so the next run asks for it again
+    assert cache.get_many(['Black Candle', 'Wretched Idol'], 'french') == {'Black Candle': 'French black candle'}
+
+def test_failed_request_falls_back_to_english_without_caching(cache, capsys):
+    def reply(language, names):
+        raise ConnectionError("endpoint down")
+
+    translations = TrinketTranslator(cache, FakeAIManager(reply)).translate_all(['Rusted Key'])
+
+    assert translations['english'] == {'Rusted Key': 'Rusted Key'}
+    assert all(not translations[language] for language in LANGUAGE_NAMES)
+    assert cache.get_many(['Rusted Key'], 'french') == {}
+    assert "translation request into French failed" in capsys.readouterr().out
+
+@pytest.mark.parametrize('response, expected', [
+    ('{"Rusted Key": "Clé rouillée", "Extra": "x"}', {'Rusted Key': 'Clé rouillée'}),
+    ('{"Rusted Key": " \\"Clé rouillée\\" "}', {'Rusted Key': 'Clé rouillée'}),
+    ('Here you go: {"Rusted Key": "Clé rouillée"}', {}),
+    ('["Clé rouillée"]', {}),
+    ('{"Rusted Key": 7}', {}),
+    ('{"Rusted Key": ""}', {}),
+    ('{"Rusted Key": "Clé\\nrouillée"}', {}),
+    (json.dumps({'Rusted Key': 'x' * 100}), {}),
+])
+def test_reply_validation(response, expected):
+    assert TrinketTranslator.parse_reply(response, ['Rusted Key']) == expected
@@ -0,0 +1,102 @@
+import os
+import pytest
+from TrinketCatalog import TrinketCatalog
+from TrinketPool import TrinketPool
+
+def make_trinket(name, stat='+10'):
+    return {'name': name, 'class': 'crusader', 'rarity': 'rare', 'stats': {'Accuracy': stat}}
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = TrinketPool(str(tmp_path / 'pool'))
+    yield pool
+    pool.close()
+
+@pytest.fixture
+def catalog(config_path):
+    catalog = TrinketCatalog(config_path)
+    yield catalog
+    catalog.close()
+
+def add_with_icon(pool, trinket_properties):
+    image_path = os.path.join(pool.icon_dir, f"inv_trinket+{TrinketCatalog.get_slug(trinket_properties['name'])}.png")
+    with open(image_path, 'wb') as file:
+        file.write(b'icon')
+    pool.add(trinket_properties, image_path)
+    return image_path
+
+def test_add_replaces_the_same_name(pool):
+    add_with_icon(pool, make_trinket("Drowned Bell"))
+    add_with_icon(pool, make_trinket("Drowned Bell", '+5'))
+    add_with_icon(pool, make_trinket("Ashen Reliquary"))
+    assert pool.size() == 2
+    assert pool.oldest() is not None
+
+def test_commit_moves_icons_and_removes_rows(pool, catalog, tmp_path):
+    icon_dir = str(tmp_path / 'icons')
+    pooled_icons = [add_with_icon(pool, make_trinket(name)) for name in ("Drowned Bell", "Ashen Reliquary", "Gilded Maw")]
+
+    committed = pool.commit(2, catalog, icon_dir)
+
+    assert [trinket['name'] for trinket in committed] == ["Drowned Bell", "Ashen Reliquary"]
+    assert pool.size() == 1
+    for image_path in pooled_icons[:2]:
+        destination = os.path.join(icon_dir, os.path.basename(image_path))
+        assert not os.path.exists(image_path)
+        assert os.path.exists(destination)
+    assert catalog.get_trinket('drowned_bell')['image_path'] == os.path.join(icon_dir, os.path.basename(pooled_icons[0]))
+    assert os.path.exists(pooled_icons[2])
+
+def test_failed_catalog_write_leaves_the_trinket_pooled(pool, catalog, tmp_path, monkeypatch):
+    icon_dir = str(tmp_path / 'icons')
+    add_with_icon(pool, make_trinket("Drowned Bell"))
+    failing_icon = add_with_icon(pool, make_trinket("Ashen Reliquary"))
+    add_trinket = catalog.add_trinket
+
+    def flaky_add_trinket(trinket_properties, image_path=None, replace=False):
+        if trinket_properties['name'] == "Ashen Reliquary":
+            raise OSError("disk full")
+        return add_trinket(trinket_properties, image_path, replace)
+
+    monkeypatch.setattr(catalog, 'add_trinket', flaky_add_trinket)
+    with pytest.raises(OSError):
+        pool.commit(2, catalog, icon_dir)
+
+    # The first trinket is fully committed, the failing one is untouched
+    assert catalog.get_trinket('drowned_bell') is not None
+    assert catalog.get_trinket('ashen_reliquary') is None
+    assert pool.size() == 1
+    assert os.path.exists(failing_icon)
+    assert not os.path.exists(os.path.join(icon_dir, os.path.basename(failing_icon)))
+
+    monkeypatch.setattr(catalog, 'add_trinket', add_trinket)
+    assert [trinket['name'] for trinket in pool.commit(1, catalog, icon_dir)] == ["Ashen Reliquary"]
+    assert pool.size() == 0
+
+def test_interrupted_commit_is_finished_once(pool, catalog, tmp_path, capsys):
+    icon_dir = str(tmp_path / 'icons')
+    trinket = make_trinket("Drowned Bell")
+    image_path = add_with_icon(pool, trinket)
+    destination = os.path.join(icon_dir, os.path.basename(image_path))
+    # An earlier commit recorded the catalog row and stopped before moving the icon
+    catalog.add_trinket(trinket, destination)
+
+    assert pool.commit(1, catalog, icon_dir) == [trinket]
+    assert "replaces" not in capsys.readouterr().out
+    assert os.path.exists(destination)
+    assert pool.size() == 0
+    assert catalog.count() == 1
+
+def test_taken_id_is_dropped_from_the_pool(pool, catalog, tmp_path, capsys):
+    icon_dir = str(tmp_path / 'icons')
+    catalog.add_trinket(make_trinket("Drowned Bell", '+5'))
+    image_path = add_with_icon(pool, make_trinket("Drowned Bell"))
+    add_with_icon(pool, make_trinket("Ashen Reliquary"))
+
+    committed = pool.commit(1, catalog, icon_dir)
+
+    assert [trinket['name'] for trinket in committed] == ["Ashen Reliquary"]
+    assert "dropping pooled trinket Drowned Bell" in capsys.readouterr().out
+    assert catalog.get_trinket('drowned_bell')['stats'] == {'Accuracy': '+5'}
+    assert not os.path.exists(image_path)
+    assert pool.size() == 0
@@ -0,0 +1,42 @@
+from GenerateTrinketProperties import AIModelManager, VocabularyValidator
+
+def test_prefix_that_matches_nothing_aborts():
+    validator = VocabularyValidator(['crusader', 'vestal'])
+    assert not validator("cru")
+    assert validator("crux")
+    assert not validator.is_complete("crux")
+
+def test_complete_value_stops_the_stream():
+    validator = VocabularyValidator(['crusader', 'vestal'])
+    assert validator("crusader")
+    assert validator.is_complete("crusader")
+
+def test_value_extended_by_another_keeps_streaming():
+    validator = VocabularyValidator(['rare', 'rarest'])
+    assert not validator("rare")
+    assert validator("rarest")
+
+def test_case_quotes_and_whitespace_are_normalized():
+    validator = VocabularyValidator(['every_class'])
+    assert not validator('  "Every_')
+    assert validator(' "EVERY_CLASS"\n')
+    assert validator.is_complete(' "EVERY_CLASS"\n')
+
+def make_manager(stubs):
+    return AIModelManager({
+        'endpoints': [stubs[0].url],
+        'DD_test_role': {'model': 'base', 'temperature': '0.5'},
+    })
+
+def test_early_stop_on_a_complete_answer_is_not_an_abort(stubs):
+    # The stub streams "word word ...", so the stream stops right after the first complete word
+    manager = make_manager(stubs)
+    assert manager.generate_response('DD_test_role', "FROM base", "hi", VocabularyValidator(['word'])) == "word "
+    assert manager.usage['DD_test_role']['early_stopped'] == 1
+    assert manager.usage['DD_test_role']['aborted'] == 0
+
+def test_stream_that_cannot_match_is_an_abort(stubs):
+    manager = make_manager(stubs)
+    manager.generate_response('DD_test_role', "FROM base", "hi", VocabularyValidator(['crusader']))
+    assert manager.usage['DD_test_role']['aborted'] == 1
+    assert manager.usage['DD_test_role']['early_stopped'] == 0